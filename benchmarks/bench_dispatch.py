@@ -0,0 +1,117 @@
+"""Đo chi phí định tuyến một callback: chuỗi startswith + split cũ so với decode + kiểm tra nonce + tra bảng.
+
+Chỉ đo phần chọn handler (không gọi Bot API), trên hỗn hợp nút giống một lượt thi:
+bấm đáp án, Confirm, Next, cộng một phần nút cũ (đề trước) cần bị từ chối.
+Đo riêng decode (có / không cache) để thấy phần lớn chi phí nằm ở đâu.
+Lấy lượt nhanh nhất trong --repeat lượt để bớt nhiễu.
+Chạy: python benchmarks/bench_dispatch.py --taps 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import callback_data as cb
+
+LEGACY_ACTIONS = ('ans', 'next', 'back', 'img', 'confirm')
+
+
+class Session:
+    def __init__(self, nonce, size):
+        self.nonce = nonce
+        self.cursor = 0
+        self.question_ids = list(range(1, size + 1))
+
+
+def handled(*args):
+    return args
+
+
+def legacy_route(data, session, catalog):
+    """Như handle_callback trước đây: đọc câu hiện tại trước, rồi dò action bằng startswith."""
+    q = catalog[session.question_ids[session.cursor]]
+    if data.startswith('ans_'):
+        _, idx_str, opt = data.split('_')
+        idx = int(idx_str)
+        return handled('ans', catalog[session.question_ids[idx]], 1 << (ord(opt) - ord('A')))
+    elif data.startswith('next_'):
+        return handled('next', q)
+    elif data.startswith('back_'):
+        return handled('back', q)
+    elif data.startswith('img_'):
+        return handled('img', q)
+    elif data.startswith('confirm_'):
+        return handled('confirm', q)
+
+
+def on_answer(session, catalog, idx, mask):
+    return handled('ans', catalog[session.question_ids[idx]], mask)
+
+
+TABLE = {cb.ANSWER: on_answer}
+TABLE.update({action: (lambda session, catalog, idx, mask, _name=name: handled(_name, idx))
+              for action, name in zip((cb.NEXT, cb.BACK, cb.IMAGE, cb.CONFIRM), LEGACY_ACTIONS[1:])})
+
+
+def table_route(data, session, catalog, decode=cb.decode):
+    """Như handle_callback: nút cũ bị từ chối trước khi đụng catalog, rồi tra bảng QUIZ_ACTIONS."""
+    decoded = decode(data)
+    if decoded is None or decoded[1] != session.nonce or decoded[2] != session.cursor:
+        return None
+    action, _, idx, mask = decoded
+    handler = TABLE.get(action)
+    return handler and handler(session, catalog, idx, mask)
+
+
+def decode_only(data, session, catalog, decode=cb.decode):
+    return decode(data)
+
+
+def measure(label, route, taps, session, catalog, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in taps:
+            route(data, session, catalog)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>16}: {best / len(taps) * 1e9:7.0f} ns/tap | {len(taps) / best:,.0f} tap/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--taps', type=int, default=200_000)
+    parser.add_argument('--stale', type=float, default=0.1, help='tỉ lệ nút của đề cũ')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    catalog = {q_id: object() for q_id in range(1, 66)}
+    session = Session(cb.new_nonce(), 65)
+    kinds = [cb.ANSWER] * 4 + [cb.CONFIRM, cb.NEXT]
+    legacy, compact = [], []
+    for _ in range(args.taps):
+        action = rng.choice(kinds)
+        mask = 1 << rng.randrange(4) if action == cb.ANSWER else 0
+        nonce = session.nonce if rng.random() >= args.stale else session.nonce ^ 1
+        compact.append(cb.encode(action, nonce, session.cursor, mask))
+        name = LEGACY_ACTIONS[action]
+        legacy.append(f"ans_{session.cursor}_{chr(ord('A') + mask.bit_length() - 1)}" if action == cb.ANSWER
+                      else f"{name}_{session.cursor}")
+
+    print(f"callback_data: cũ tối đa {max(map(len, legacy))} byte, mới {len(compact[0])} byte "
+          f"(có nonce + version)")
+    measure('startswith', legacy_route, legacy, session, catalog, args.repeat)
+    measure('bảng', table_route, compact, session, catalog, args.repeat)
+    # Phần chênh lệch là decode: cache trúng (nút bấm lại) và trượt (nút chưa gặp)
+    measure('decode (cache)', decode_only, compact, session, catalog, args.repeat)
+    uncached = cb.decode.__wrapped__
+    measure('decode (no cache)', lambda data, s, c: uncached(data), compact, session, catalog, args.repeat)
+    measure('route (no cache)', lambda data, s, c: table_route(data, s, c, uncached), compact, session, catalog,
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Đo thời gian tạo đề theo kích thước pool (400 -> 100k): phải gần như không đổi.
+Đề "khó" (bốc theo trọng số) phải xem cả pool nên tăng tuyến tính; đo để biết mức trần.
+Đề theo blueprint bốc từ tag index nên cũng phải gần như không đổi.
+
+Chạy: python benchmarks/bench_exam.py --size 65
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from exam import DEFAULT_EXAM_SIZE, build_exam, parse_blueprint
+
+
+class FakeCatalog:
+    # Chỉ cần index ID + lookup như Catalog thật
+    def __init__(self, n):
+        self.ids = tuple(range(1, n + 1))
+        self._records = dict.fromkeys(self.ids, object())
+        self.tag_index = {f'tag{t}': self.ids[t::10] for t in range(10)}
+
+    def get(self, q_id):
+        return self._records.get(q_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=DEFAULT_EXAM_SIZE)
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    for n in (400, 4_000, 20_000, 100_000):
+        catalog = FakeCatalog(n)
+        start = time.perf_counter()
+        for seed in range(args.rounds):
+            build_exam(catalog, args.size, seed)
+        per_exam = (time.perf_counter() - start) / args.rounds
+        weight = {q_id: (q_id % 7 + 1) / 8 for q_id in catalog.ids}.__getitem__
+        rounds = max(1, args.rounds // 20)
+        start = time.perf_counter()
+        for seed in range(rounds):
+            build_exam(catalog, args.size, seed, weight)
+        per_hard = (time.perf_counter() - start) / rounds
+        blueprint = parse_blueprint(['tag0:30', 'tag1:20', 'tag2:20'])
+        start = time.perf_counter()
+        for seed in range(args.rounds):
+            build_exam(catalog, args.size, seed, blueprint=blueprint)
+        per_blueprint = (time.perf_counter() - start) / args.rounds
+        print(f"pool {n:>7}: {per_exam * 1e6:8.1f} µs / đề {args.size} câu | blueprint {per_blueprint * 1e6:8.1f} µs "
+              f"| đề khó {per_hard * 1e3:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Load test handler thật của bot: N user cùng làm đề 65 câu, Bot API giả, DB là bản sao quiz.db.
+
+Mỗi user (tuần tự, các user chạy song song): /create_exam 65 <seed> -> với mỗi câu bấm đáp án A,
+Confirm, Next -> Next ở câu cuối chấm điểm (end_quiz). Update đi qua Application.process_update
+như khi nhận từ Telegram.
+
+Báo cáo: thông lượng, latency p50/p90/p99 theo handler, số câu lệnh SQL, số call Bot API,
+bộ nhớ đỉnh (RSS; heap Python nếu --tracemalloc). Kết quả ghi ra JSON; --compare file JSON
+cũ để so sánh giữa các phiên bản.
+
+Chạy: python benchmarks/bench_handlers.py --users 50 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+
+import question_store
+from callback_data import ANSWER, CONFIRM, NEXT, encode
+from fake_bot_api import FakeBotAPI
+from migrations import migrate
+from bench_store import percentile
+
+EXAM_SIZE = 65
+
+
+class QueryCounter:
+    """Đếm câu lệnh SQL trên mọi connection mở qua question_store.connect."""
+
+    def __init__(self):
+        self.by_kind = collections.Counter()
+
+    def install(self):
+        original = question_store.connect
+
+        def connect(db_file):
+            conn = original(db_file)
+            conn.set_trace_callback(self.trace)
+            return conn
+
+        # Phải chạy trước khi import bot: các module khác làm `from question_store import connect`
+        question_store.connect = connect
+
+    def trace(self, statement):
+        self.by_kind[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def total(self):
+        return sum(self.by_kind.values())
+
+
+class Synth:
+    """Sinh update giống Telegram gửi cho một user."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.update_id = 0
+
+    def _next_id(self):
+        self.update_id += 1
+        return self.update_id
+
+    def command(self, user_id, text):
+        update_id = self._next_id()
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'U{user_id}'}
+        command = text.split()[0]
+        return Update.de_json({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'from': user,
+            'chat': {'id': user_id, 'type': 'private'}, 'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]}}, self.bot)
+
+    def callback(self, user_id, data, message_id):
+        update_id = self._next_id()
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'U{user_id}'}
+        return Update.de_json({'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': message_id, 'date': int(time.time()), 'text': '',
+                        'chat': {'id': user_id, 'type': 'private'}}}}, self.bot)
+
+
+async def take_exam(application, synth, user_id, latencies, sessions):
+    async def step(label, update):
+        start = time.perf_counter()
+        await application.process_update(update)
+        latencies[label].append(time.perf_counter() - start)
+
+    await step('create_exam_start', synth.command(user_id, f'/create_exam {EXAM_SIZE} {user_id}'))
+    message_id = user_id  # message chứa câu hỏi; API giả không kiểm tra
+    # Nút mang nonce của session như keyboard thật
+    nonce = sessions.get(user_id).nonce
+    for idx in range(EXAM_SIZE):
+        await step('handle_callback:ans', synth.callback(user_id, encode(ANSWER, nonce, idx, 1), message_id))
+        await step('handle_callback:confirm', synth.callback(user_id, encode(CONFIRM, nonce, idx), message_id))
+        label = 'handle_callback:next' if idx < EXAM_SIZE - 1 else 'handle_callback:next+end_quiz'
+        await step(label, synth.callback(user_id, encode(NEXT, nonce, idx), message_id))
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"{result['users']} user x {EXAM_SIZE} câu: {result['updates']} update trong {result['elapsed_s']:.2f}s "
+          f"({result['updates_per_s']:,.0f} update/s, {result['exams_per_s']:.2f} đề/s)")
+    print(f"{'handler':<32}{'n':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, s in result['handlers'].items():
+        print(f"{label:<32}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p90_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+    db = result['db']
+    print(f"SQL: {db['statements']} câu lệnh ({db['per_exam']:.1f}/đề) {db['by_kind']}")
+    print(f"Bot API: {result['api_calls']}")
+    memory = result['memory']
+    line = f"Bộ nhớ: RSS đỉnh {memory['peak_rss_kb'] / 1024:.1f} MB"
+    if memory.get('peak_traced_bytes') is not None:
+        line += f", heap Python đỉnh {memory['peak_traced_bytes'] / 2**20:.1f} MB"
+    print(line)
+
+
+def print_comparison(old, new):
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else 'n/a'
+
+    print(f"\nSo với {old.get('revision')} ({old.get('timestamp')}):")
+    print(f"  update/s: {old['updates_per_s']:,.0f} -> {new['updates_per_s']:,.0f} "
+          f"({delta(old['updates_per_s'], new['updates_per_s'])})")
+    for label, s in new['handlers'].items():
+        before = old['handlers'].get(label)
+        if before:
+            print(f"  {label:<32} p50 {delta(before['p50_ms'], s['p50_ms']):>8}  p99 {delta(before['p99_ms'], s['p99_ms']):>8}")
+    print(f"  SQL/đề: {old['db']['per_exam']:.1f} -> {new['db']['per_exam']:.1f}")
+    print(f"  RSS đỉnh: {old['memory']['peak_rss_kb']} -> {new['memory']['peak_rss_kb']} KB")
+
+
+async def run(args, queries):
+    import bot
+    from outbound import OutboundScheduler
+    # Log INFO mỗi update làm sai lệch số đo
+    logging.disable(logging.INFO)
+
+    api = await FakeBotAPI(latency=args.latency).start()
+    # Đo handler, không đo giới hạn gửi tin
+    scheduler = OutboundScheduler(global_rate=1e6, global_burst=1e6, chat_rate=1e6, chat_burst=1e6)
+    application = bot.build_application(os.environ['TOKEN'], base_url=api.base_url, rate_limiter=scheduler)
+    latencies = collections.defaultdict(list)
+    try:
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        if len(bot.catalog) < EXAM_SIZE:
+            raise SystemExit(f"Pool chỉ có {len(bot.catalog)} câu, cần ít nhất {EXAM_SIZE}")
+        synth = Synth(application.bot)
+        queries.by_kind.clear()
+        api.calls.clear()
+        if args.tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        users = range(1, args.users + 1)
+        await asyncio.gather(*(take_exam(application, synth, user_id, latencies, bot.sessions) for user_id in users))
+        elapsed = time.perf_counter() - start
+        peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        tracemalloc.stop()
+    finally:
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+        await api.stop()
+
+    updates = sum(len(v) for v in latencies.values())
+    api_calls = collections.Counter(method for _, method, _ in api.calls)
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'params': {'users': args.users, 'exam_size': EXAM_SIZE, 'latency_s': args.latency,
+                   'tracemalloc': args.tracemalloc},
+        'users': args.users,
+        'updates': updates,
+        'elapsed_s': elapsed,
+        'updates_per_s': updates / elapsed,
+        'exams_per_s': args.users / elapsed,
+        'handlers': {label: summarize(samples) for label, samples in latencies.items()},
+        'db': {'statements': queries.total(), 'per_exam': queries.total() / args.users,
+               'by_kind': dict(queries.by_kind.most_common())},
+        'api_calls': dict(api_calls.most_common()),
+        'memory': {'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   'peak_traced_bytes': peak_traced},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ mỗi call của API giả (giây)')
+    parser.add_argument('--tracemalloc', action='store_true', help='đo heap Python đỉnh (chậm hơn vài lần, đừng so latency với lần chạy không bật)')
+    parser.add_argument('--output', help='ghi kết quả JSON ra file này')
+    parser.add_argument('--compare', help='file JSON kết quả cũ để so sánh')
+    args = parser.parse_args()
+
+    queries = QueryCounter()
+    queries.install()
+    # bot.py dùng quiz.db và images/ theo thư mục hiện tại: chạy trên bản sao
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix='bench_handlers_')
+    shutil.copy(os.path.join(ROOT, 'quiz.db'), workdir)
+    os.symlink(os.path.abspath(os.path.join(ROOT, 'images')), os.path.join(workdir, 'images'))
+    os.chdir(workdir)
+    # Bản sao quiz.db có thể còn schema cũ; bot.main() cũng migrate trước khi chạy
+    migrate('quiz.db')
+    os.environ.setdefault('TOKEN', '123:fake')
+    os.environ.setdefault('METRICS_PORT', '0')
+    try:
+        result = asyncio.run(run(args, queries))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(result)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {output}")
+    if compare:
+        with open(compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), result)
+
+
+if __name__ == '__main__':
+    main()
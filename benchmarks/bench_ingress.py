@@ -0,0 +1,184 @@
+"""Phát lại một loạt update qua bot thật theo hai chế độ nhận: long polling và webhook ingress.
+
+Update lấy từ file JSONL (mỗi dòng một update như Telegram gửi) hoặc sinh giả lập:
+mỗi user gửi /start, /pool_count, /view_question và bấm nút "Xem pool".
+Bot API là API giả (benchmarks/fake_bot_api.py), DB là bản sao quiz.db trong thư mục tạm.
+Đo thông lượng (update/giây) và latency từ lúc update vào hệ thống tới khi handler xong.
+
+Chạy: python benchmarks/bench_ingress.py --users 200 [--updates recorded.jsonl] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from fake_bot_api import FakeBotAPI
+from migrations import migrate
+from bench_store import percentile
+
+HANDLERS_DONE_GROUP = 99
+
+
+def synthetic_updates(users, max_question_id):
+    update_ids = itertools.count(1)
+    message_ids = itertools.count(1)
+    now = int(time.time())
+    for user_id in range(1, users + 1):
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'U{user_id}'}
+        chat = {'id': user_id, 'type': 'private'}
+        commands = ['/start', '/pool_count', f'/view_question {user_id % max_question_id + 1}']
+        for text in commands:
+            command = text.split()[0]
+            yield {'update_id': next(update_ids), 'message': {
+                'message_id': next(message_ids), 'date': now, 'chat': chat, 'from': user, 'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]}}
+        yield {'update_id': next(update_ids), 'callback_query': {
+            'id': f'cb-{user_id}', 'from': user, 'chat_instance': str(user_id), 'data': 'pool_count',
+            'message': {'message_id': next(message_ids), 'date': now, 'chat': chat, 'text': 'Chào!'}}}
+
+
+def load_updates(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class Tracker:
+    """Ghi thời điểm update vào hệ thống và lúc handler cuối cùng chạy xong."""
+
+    def __init__(self):
+        self.started = {}
+        self.latencies = []
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def reset(self, expected):
+        self.started.clear()
+        self.latencies.clear()
+        self.done.clear()
+        self.expected = expected
+
+    async def finished(self, update, context):
+        start = self.started.get(update.update_id)
+        if start is not None:
+            self.latencies.append(time.perf_counter() - start)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def report(label, tracker, elapsed, api, calls_before):
+    n = len(tracker.latencies)
+    print(f"{label:>8}: {n} update trong {elapsed:.2f}s ({n / elapsed:,.0f} update/s) | "
+          f"latency p50 {percentile(tracker.latencies, 50) * 1000:.1f} ms "
+          f"p99 {percentile(tracker.latencies, 99) * 1000:.1f} ms | {api.count() - calls_before} call Bot API")
+
+
+async def run_polling(application, api, tracker, updates, allowed_updates):
+    tracker.reset(len(updates))
+    calls_before = api.count()
+    start = time.perf_counter()
+    for update in updates:
+        tracker.started[update['update_id']] = start
+    api.push_updates(updates)
+    await application.updater.start_polling(poll_interval=0, timeout=10, allowed_updates=allowed_updates)
+    await tracker.done.wait()
+    elapsed = time.perf_counter() - start
+    await application.updater.stop()
+    report('polling', tracker, elapsed, api, calls_before)
+
+
+async def run_webhook(application, api, tracker, updates, connections):
+    from ingress import WebhookIngress, application_sink
+
+    ingress = await WebhookIngress(application_sink(application), '/telegram', 'bench-secret', '127.0.0.1', 0).start()
+    url = f"http://127.0.0.1:{ingress.port}/telegram"
+    headers = {'X-Telegram-Bot-Api-Secret-Token': 'bench-secret'}
+    # update_id mới để không trùng với lượt polling
+    offset = max(u['update_id'] for u in updates)
+    updates = [dict(u, update_id=u['update_id'] + offset) for u in updates]
+    tracker.reset(len(updates))
+    calls_before = api.count()
+    pending = iter(updates)
+
+    async def sender(client):
+        # Như Telegram: mỗi kết nối gửi tuần tự, tối đa `connections` kết nối song song
+        for update in pending:
+            tracker.started[update['update_id']] = time.perf_counter()
+            response = await client.post(url, json=update, headers=headers)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    limits = httpx.Limits(max_connections=connections)
+    async with httpx.AsyncClient(limits=limits) as client:
+        await asyncio.gather(*(sender(client) for _ in range(connections)))
+    await tracker.done.wait()
+    elapsed = time.perf_counter() - start
+    await ingress.stop()
+    report('webhook', tracker, elapsed, api, calls_before)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', help='file JSONL update đã ghi lại')
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ mỗi call của API giả (giây)')
+    parser.add_argument('--connections', type=int, default=40, help='số kết nối webhook song song')
+    parser.add_argument('--concurrency', type=int, default=64, help='CONCURRENT_UPDATES')
+    args = parser.parse_args()
+
+    # bot.py dùng quiz.db và images/ theo thư mục hiện tại: chạy trên bản sao
+    workdir = tempfile.mkdtemp(prefix='bench_ingress_')
+    shutil.copy(os.path.join(ROOT, 'quiz.db'), workdir)
+    os.symlink(os.path.abspath(os.path.join(ROOT, 'images')), os.path.join(workdir, 'images'))
+    os.chdir(workdir)
+    # Bản sao quiz.db có thể còn schema cũ; bot.main() cũng migrate trước khi chạy
+    migrate('quiz.db')
+    os.environ.setdefault('TOKEN', '123:fake')
+    os.environ.setdefault('METRICS_PORT', '0')
+    os.environ['CONCURRENT_UPDATES'] = str(args.concurrency)
+
+    import bot
+    import config
+    # Log INFO mỗi update làm sai lệch số đo
+    logging.disable(logging.INFO)
+    from outbound import OutboundScheduler
+
+    api = await FakeBotAPI(latency=args.latency).start()
+    # Không đo rate limit ở đây: API giả không giới hạn, scheduler nới rộng
+    scheduler = OutboundScheduler(global_rate=1e6, global_burst=1e6, chat_rate=1e6, chat_burst=1e6)
+    application = bot.build_application(os.environ['TOKEN'], base_url=api.base_url, rate_limiter=scheduler)
+    tracker = Tracker()
+    application.add_handler(TypeHandler(Update, tracker.finished), group=HANDLERS_DONE_GROUP)
+    try:
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        updates = (load_updates(args.updates) if args.updates
+                   else list(synthetic_updates(args.users, max(1, len(bot.catalog)))))
+        print(f"{len(updates)} update, CONCURRENT_UPDATES={config.CONCURRENT_UPDATES}, "
+              f"latency API giả {args.latency * 1000:.0f} ms")
+        await run_polling(application, api, tracker, updates, config.ALLOWED_UPDATES)
+        await run_webhook(application, api, tracker, updates, args.connections)
+    finally:
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+        await api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
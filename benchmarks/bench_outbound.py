@@ -0,0 +1,75 @@
+"""Burst gửi tin (N chat x M tin + trả lời callback) vào Bot API giả có giới hạn như Telegram.
+
+So sánh gửi thẳng (không rate limiter) với OutboundScheduler: số 429, thời gian, latency answerCallbackQuery.
+Chạy: python benchmarks/bench_outbound.py --chats 50 --messages 6
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+from fake_bot_api import FakeBotAPI
+from outbound import OutboundScheduler
+from bench_store import percentile
+
+
+async def burst(bot, chats, messages):
+    failures = 0
+    answer_latencies = []
+
+    async def chat(chat_id):
+        nonlocal failures
+        for i in range(messages):
+            try:
+                if i % 2:
+                    start = time.perf_counter()
+                    await bot.answer_callback_query(f"cb-{chat_id}-{i}")
+                    answer_latencies.append(time.perf_counter() - start)
+                else:
+                    await bot.send_message(chat_id, f"Câu {i}")
+            except RetryAfter:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(chat_id) for chat_id in range(1, chats + 1)))
+    return failures, time.perf_counter() - start, answer_latencies
+
+
+async def run(label, api, rate_limiter, args):
+    api.calls.clear()
+    api.rejected = 0
+    async with ExtBot('123:fake', base_url=api.base_url, rate_limiter=rate_limiter) as bot:
+        failures, elapsed, latencies = await burst(bot, args.chats, args.messages)
+    print(f"{label:>10}: {api.count()} call OK, {api.rejected} lần 429, {failures} request thất bại, "
+          f"{elapsed:.2f}s | answerCallbackQuery p50 {percentile(latencies, 50) * 1000:.1f} ms "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=6)
+    parser.add_argument('--chat-limit', type=int, default=3, help='giới hạn msg/giây mỗi chat của API giả')
+    parser.add_argument('--global-limit', type=int, default=30, help='giới hạn msg/giây toàn bot của API giả')
+    args = parser.parse_args()
+
+    api = await FakeBotAPI(chat_limit=args.chat_limit, global_limit=args.global_limit).start()
+    try:
+        await run('direct', api, None, args)
+        await asyncio.sleep(1.1)  # để cửa sổ giới hạn của API giả trôi qua
+        # Trong cửa sổ 1s bucket cho tối đa burst + rate request: giữ tổng dưới giới hạn của API
+        scheduler = OutboundScheduler(global_rate=args.global_limit * 0.8, global_burst=args.global_limit // 6,
+                                      chat_rate=0.9, chat_burst=max(1, args.chat_limit - 1))
+        await run('scheduler', api, scheduler, args)
+    finally:
+        await api.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
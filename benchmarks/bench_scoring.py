@@ -0,0 +1,36 @@
+"""Chấm N đề (mặc định 10k đề x 65 câu) một lượt, strict và partial.
+
+Chạy: python benchmarks/bench_scoring.py --exams 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import scoring
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--exams', type=int, default=10_000)
+    parser.add_argument('--questions', type=int, default=65)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    correct = [bytes(rng.choice((1, 2, 4, 8, 3, 5, 6)) for _ in range(args.questions)) for _ in range(args.exams)]
+    answers = [bytes(rng.randrange(16) for _ in range(args.questions)) for _ in range(args.exams)]
+
+    backend = 'numpy' if scoring.np is not None else 'python'
+    for mode in scoring.MODES:
+        start = time.perf_counter()
+        totals = scoring.score_exams(answers, correct, mode)
+        elapsed = time.perf_counter() - start
+        print(f"{backend} {mode:>7}: {len(totals)} đề trong {elapsed * 1000:.1f} ms "
+              f"(điểm TB {sum(totals) / len(totals):.2f}/{args.questions})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Đo /search trên pool lớn: FTS5 (questions_fts) so với quét LIKE '%...%'.
+
+Sinh N câu hỏi giả từ bộ từ vựng cố định vào DB tạm, index như import_questions.
+Chạy: python benchmarks/bench_search.py --size 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate
+from question_store import INSERT_OPTION_SQL, defer_search_index, fts_query, index_new_questions, search_questions
+from bench_store import percentile
+
+# Bộ từ nhỏ = trường hợp xấu: mỗi từ có trong ~70% câu, truy vấn thường rơi vào nhánh "quá rộng"
+WORDS = ('lambda function kinesis stream bucket policy role cache queue table index partition '
+         'throughput latency region replica snapshot gateway endpoint certificate token session '
+         'giao thức mạng máy tính dữ liệu bảo mật mã hóa khóa truy vấn bộ nhớ tiến trình luồng').split()
+PAGE = 6
+
+
+def build_db(path, size, rng):
+    migrate(path)
+    conn = sqlite3.connect(path)
+
+    def sentence(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n)) + f' w{rng.randrange(size)}'
+
+    start = time.perf_counter()
+    with conn:
+        # Như import_questions: index FTS một lần sau khi ghi xong
+        indexed_upto = defer_search_index(conn)
+        conn.executemany('INSERT INTO questions (id, question_text) VALUES (?, ?)',
+                         ((q_id, sentence(25)) for q_id in range(1, size + 1)))
+        conn.executemany(INSERT_OPTION_SQL, ((q_id, i, sentence(6)) for q_id in range(1, size + 1) for i in range(4)))
+        index_new_questions(conn, indexed_upto)
+    print(f"Tạo {size} câu + index FTS: {time.perf_counter() - start:.1f}s")
+    return conn
+
+
+def measure(label, run, queries):
+    latencies = []
+    hits = 0
+    for terms in queries:
+        start = time.perf_counter()
+        hits += len(run(terms))
+        latencies.append(time.perf_counter() - start)
+    print(f"{label:>5}: p50 {percentile(latencies, 50) * 1000:8.2f} ms | p99 {percentile(latencies, 99) * 1000:8.2f} ms "
+          f"| {hits / len(queries):.1f} kết quả/truy vấn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--like-queries', type=int, default=20, help='LIKE chậm: ít truy vấn hơn')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, 'quiz.db'), args.size, rng)
+        # 1-3 từ, có cả từ hiếm (w<id>) và tiền tố
+        queries = []
+        for _ in range(args.queries):
+            terms = [rng.choice(WORDS) for _ in range(rng.randint(1, 2))]
+            if rng.random() < 0.3:
+                terms.append(f'w{rng.randrange(args.size)}')
+            queries.append(' '.join(terms))
+
+        def fts(terms):
+            return search_questions(conn, fts_query(terms), PAGE)
+
+        def like(terms):
+            where = ' AND '.join("(question_text LIKE ? OR EXISTS (SELECT 1 FROM question_options o "
+                                 "WHERE o.question_id = questions.id AND o.text LIKE ?))" for _ in terms.split())
+            params = [f'%{t}%' for t in terms.split() for _ in range(2)]
+            return conn.execute(f'SELECT id FROM questions WHERE {where} LIMIT {PAGE}', params).fetchall()
+
+        measure('FTS5', fts, queries)
+        measure('LIKE', like, queries[:args.like_queries])
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
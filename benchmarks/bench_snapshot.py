@@ -0,0 +1,66 @@
+"""Đo khởi động catalog: dựng toàn bộ QuestionRecord từ SQLite so với mmap snapshot (snapshot.py).
+
+Sinh N câu giả như bench_search, export snapshot, rồi đo thời gian load, bộ nhớ Python giữ sau
+load và chi phí get() một đề (lần đầu phải decode từ snapshot, lần sau lấy từ cache).
+Chạy: python benchmarks/bench_snapshot.py --size 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_search import build_db
+from catalog import Catalog
+from exam import DEFAULT_EXAM_SIZE, build_exam
+from question_store import QuestionStore
+from snapshot import export
+
+
+async def measure(label, store, snapshot_file, exams):
+    catalog = Catalog(store, snapshot_file=snapshot_file)
+    tracemalloc.start()
+    start = time.perf_counter()
+    await catalog.load()
+    elapsed = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def take_exams():
+        start = time.perf_counter()
+        for seed in range(exams):
+            build_exam(catalog, DEFAULT_EXAM_SIZE, seed)
+        return (time.perf_counter() - start) / exams * 1000
+
+    cold = take_exams()
+    warm = take_exams()
+    print(f"{label:>8}: load {elapsed * 1000:8.1f} ms | RAM {held / 2**20:6.1f} MB | "
+          f"đề {DEFAULT_EXAM_SIZE} câu: lần đầu {cold:.2f} ms, lặp lại {warm:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--exams', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'quiz.db')
+        snapshot_file = os.path.join(tmp, 'quiz.snap')
+        build_db(db_file, args.size, random.Random(1)).close()
+        start = time.perf_counter()
+        _, count, size = export(db_file, snapshot_file)
+        print(f"Export {count} câu: {size / 2**20:.1f} MB trong {time.perf_counter() - start:.1f}s")
+
+        store = QuestionStore(db_file)
+        await measure('SQLite', store, None, args.exams)
+        await measure('snapshot', store, snapshot_file, args.exams)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
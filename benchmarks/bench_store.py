@@ -0,0 +1,108 @@
+"""Đo latency handler (p50/p99) với N user đồng thời: sqlite3.connect trực tiếp vs QuestionStore.
+
+Chạy: python benchmarks/bench_store.py --users 500 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate
+from question_store import QuestionStore
+
+COUNT_SQL = 'SELECT COUNT(*) FROM questions'
+GET_SQL = 'SELECT * FROM questions WHERE id = ?'
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+# Handler kiểu cũ: connect đồng bộ ngay trong event loop
+async def direct_handler(db_file, q_id):
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute(COUNT_SQL)
+    cursor.fetchone()
+    cursor.execute(GET_SQL, (q_id,))
+    row = cursor.fetchone()
+    conn.close()
+    await asyncio.sleep(0)  # giả lập reply_text
+    return row
+
+
+def count_questions(conn):
+    return conn.execute(COUNT_SQL).fetchone()[0]
+
+
+def get_question(conn, q_id):
+    return conn.execute(GET_SQL, (q_id,)).fetchone()
+
+
+# Cùng hai query, chạy trên pool + executor của QuestionStore
+async def store_handler(store, q_id):
+    await store._submit(count_questions)
+    row = await store._submit(get_question, q_id)
+    await asyncio.sleep(0)
+    return row
+
+
+async def simulate(handler, users, requests, max_id):
+    latencies = []
+
+    async def user(seed):
+        rng = random.Random(seed)
+        for _ in range(requests):
+            await asyncio.sleep(rng.random() * 0.01)  # think time
+            start = time.perf_counter()
+            await handler(rng.randint(1, max_id))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    return latencies, time.perf_counter() - start
+
+
+def report(name, latencies, elapsed):
+    print(f"{name:>8}: {len(latencies)} calls in {elapsed:.2f}s | "
+          f"p50 {percentile(latencies, 50) * 1000:.2f} ms | p99 {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='quiz.db')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'quiz.db')
+        shutil.copy(args.db, db_file)
+        migrate(db_file)
+        conn = sqlite3.connect(db_file)
+        max_id = conn.execute('SELECT MAX(id) FROM questions').fetchone()[0] or 1
+        conn.close()
+
+        latencies, elapsed = await simulate(lambda q_id: direct_handler(db_file, q_id), args.users, args.requests, max_id)
+        report('before', latencies, elapsed)
+
+        store = QuestionStore(db_file, pool_size=args.pool_size)
+        try:
+            latencies, elapsed = await simulate(lambda q_id: store_handler(store, q_id), args.users, args.requests, max_id)
+            report('after', latencies, elapsed)
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""Thông lượng theo số worker: router chia update theo user_id cho 1, 2, 4... worker process.
+
+Mỗi user gửi /start và /pool_count (mỗi update đúng một sendMessage), Bot API là API giả
+chạy trong process router. Đo thời gian tới khi API giả nhận đủ số sendMessage.
+Trên máy N core, thông lượng tăng gần tuyến tính tới khoảng N worker.
+
+Chạy: python benchmarks/bench_workers.py --users 500 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI
+from migrations import migrate
+from workers import ShardRouter
+
+# Chờ worker khởi động (import, nạp catalog) trước khi bắt đầu đo
+WARMUP_TIMEOUT = 60
+
+
+def command_updates(users, commands, first_update_id):
+    update_ids = itertools.count(first_update_id)
+    now = int(time.time())
+    for user_id in range(1, users + 1):
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'U{user_id}'}
+        chat = {'id': user_id, 'type': 'private'}
+        for text in commands:
+            update_id = next(update_ids)
+            yield {'update_id': update_id, 'message': {
+                'message_id': update_id, 'date': now, 'chat': chat, 'from': user, 'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]}}
+
+
+async def wait_for_messages(api, expected, timeout):
+    deadline = time.monotonic() + timeout
+    while api.count('sendMessage') < expected:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"chỉ nhận {api.count('sendMessage')}/{expected} sendMessage")
+        await asyncio.sleep(0.01)
+
+
+async def run(count, args):
+    api = await FakeBotAPI(latency=args.latency).start()
+    router = ShardRouter(count, base_url=api.base_url).start()
+    loop = asyncio.get_running_loop()
+    try:
+        # Mỗi worker trả lời một /pool_count để biết đã sẵn sàng
+        for update in command_updates(count * 8, ['/pool_count'], 1):
+            await router.route(update)
+        await wait_for_messages(api, count * 8, WARMUP_TIMEOUT)
+        api.calls.clear()
+
+        updates = list(command_updates(args.users, ['/start', '/pool_count'], 1_000_000))
+        start = time.perf_counter()
+        for update in updates:
+            await router.route(update)
+        await wait_for_messages(api, len(updates), 600)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>2} worker: {len(updates)} update trong {elapsed:.2f}s "
+              f"({len(updates) / elapsed:,.0f} update/s), phân bố {router.routed}")
+    finally:
+        await loop.run_in_executor(None, router.stop)
+        await api.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ mỗi call của API giả (giây)')
+    args = parser.parse_args()
+
+    # Worker dùng quiz.db và images/ theo thư mục hiện tại: chạy trên bản sao
+    workdir = tempfile.mkdtemp(prefix='bench_workers_')
+    shutil.copy(os.path.join(ROOT, 'quiz.db'), workdir)
+    os.symlink(os.path.abspath(os.path.join(ROOT, 'images')), os.path.join(workdir, 'images'))
+    os.chdir(workdir)
+    # Bản sao quiz.db có thể còn schema cũ; bot.main() cũng migrate trước khi chạy
+    migrate('quiz.db')
+    os.environ.setdefault('TOKEN', '123:fake')
+    os.environ.setdefault('METRICS_PORT', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Đo CPU của worker, không đo giới hạn gửi tin (API giả không giới hạn)
+    os.environ['OUTBOUND_GLOBAL_RATE'] = '1000000'
+    print(f"{os.cpu_count()} CPU")
+    try:
+        for count in map(int, args.workers.split(',')):
+            await run(count, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
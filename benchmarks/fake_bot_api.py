@@ -0,0 +1,178 @@
+"""Bot API giả lập chạy local để test/benchmark offline.
+
+Hỗ trợ các method bot dùng (getMe, sendMessage, sendPhoto, editMessageText, editMessageReplyMarkup,
+answerCallbackQuery, getUpdates, setWebhook, deleteWebhook), ghi lại mọi call và có thể
+trả 429 khi vượt giới hạn theo chat / toàn cục như Telegram thật.
+
+Dùng với python-telegram-bot: Bot(token, base_url=f"http://127.0.0.1:{port}/bot")
+Chạy riêng: python benchmarks/fake_bot_api.py --port 8081
+"""
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from http_server import start_server
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_quiz_bot'}
+
+
+def parse_params(request):
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + request.body)
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename():
+                params[name] = part.get_payload(decode=True)
+            else:
+                params[name] = part.get_content()
+        return params
+    if content_type.startswith('application/json'):
+        return json.loads(request.body or b'{}')
+    return dict(parse_qsl(request.body.decode()))
+
+
+class FakeBotAPI:
+    def __init__(self, chat_limit=None, global_limit=None, latency=0.0):
+        self.chat_limit = chat_limit      # msg/giây mỗi chat, None = không giới hạn
+        self.global_limit = global_limit  # msg/giây toàn bot
+        self.latency = latency            # giả lập độ trễ mạng mỗi call (giây)
+        self.calls = []                   # (time, method, chat_id)
+        self.rejected = 0
+        self._recent = deque()
+        self._recent_by_chat = {}
+        self._message_ids = itertools.count(1000)
+        self._updates = deque()
+        self._update_event = asyncio.Event()
+        self._server = None
+        self.port = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await start_server(self.handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def push_updates(self, updates):
+        """Đưa update (dict) vào hàng đợi để getUpdates trả về."""
+        self._updates.extend(updates)
+        self._update_event.set()
+
+    def count(self, method=None):
+        return sum(1 for _, m, _ in self.calls if method is None or m == method)
+
+    def _over_limit(self, chat_id, now):
+        window = now - 1.0
+        while self._recent and self._recent[0] < window:
+            self._recent.popleft()
+        if self.global_limit and len(self._recent) >= self.global_limit:
+            return True
+        if chat_id is not None and self.chat_limit:
+            recent = self._recent_by_chat.setdefault(chat_id, deque())
+            while recent and recent[0] < window:
+                recent.popleft()
+            if len(recent) >= self.chat_limit:
+                return True
+            recent.append(now)
+        self._recent.append(now)
+        return False
+
+    async def handle(self, request):
+        method = request.path.rsplit('/', 1)[-1]
+        params = parse_params(request)
+        chat_id = params.get('chat_id')
+        if chat_id is not None:
+            chat_id = int(chat_id)
+        now = time.monotonic()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Như Telegram: answerCallbackQuery không tính vào giới hạn gửi tin
+        if method not in ('getUpdates', 'getMe', 'answerCallbackQuery') and self._over_limit(chat_id, now):
+            self.rejected += 1
+            return self._reply({'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                                'parameters': {'retry_after': 1}}, 429)
+        self.calls.append((now, method, chat_id))
+        handler = getattr(self, 'api_' + method, None)
+        if handler is None:
+            return self._reply({'ok': True, 'result': True})
+        return self._reply({'ok': True, 'result': await handler(params)})
+
+    @staticmethod
+    def _reply(payload, status=200):
+        return status, 'application/json', json.dumps(payload).encode()
+
+    def _message(self, params, **extra):
+        chat_id = int(params.get('chat_id', 0))
+        message = {
+            'message_id': int(params.get('message_id', 0)) or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+            'from': BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    async def api_getMe(self, params):
+        return BOT_USER
+
+    async def api_sendMessage(self, params):
+        return self._message(params, text=params.get('text', ''))
+
+    async def api_editMessageText(self, params):
+        return self._message(params, text=params.get('text', ''))
+
+    async def api_editMessageReplyMarkup(self, params):
+        return self._message(params, text='')
+
+    async def api_sendPhoto(self, params):
+        photo = params.get('photo')
+        file_id = photo if isinstance(photo, str) else f"fake-{next(self._message_ids)}"
+        return self._message(params, photo=[{'file_id': file_id, 'file_unique_id': file_id,
+                                             'width': 1, 'height': 1}])
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get('offset', 0) or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._update_event.clear()
+            try:
+                await asyncio.wait_for(self._update_event.wait(), float(params.get('timeout', 0) or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get('limit', 100) or 100)
+        return list(itertools.islice(self._updates, limit))
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--chat-limit', type=int, default=None)
+    parser.add_argument('--global-limit', type=int, default=None)
+    args = parser.parse_args()
+    api = await FakeBotAPI(args.chat_limit, args.global_limit).start(port=args.port)
+    print(f"Fake Bot API: {api.base_url}<token>/<method>")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(_main())
@@ -1,141 +1,94 @@
-import sqlite3
+import asyncio
+import datetime
 import os
-import random
 import logging
-import json
-import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes, ConversationHandler
+from question_store import QuestionStore, answer_key_error
+from catalog import Catalog, mask_to_letters
+from session_store import SessionStore, SqliteSessionBackend
+from persistence import BotPersistence, SqliteStateBackend
+from image_cache import ImageCache, TelegramImageBackend, load_manifest
+from render import MessageRenderer
+from outbound import BULK_PRIORITY, OutboundScheduler
+from ingress import run_webhook
+from workers import run_sharded
+from migrations import migrate
+import config
+import metrics
+from metrics import instrument
+from scoring import PARTIAL, STRICT, score_exam
+from exam import DEFAULT_EXAM_SIZE, build_exam, parse_blueprint
+from study import SqliteStudyBackend, StudyLog, pick_new
+from live_exam import LiveExam, refresh_loop, send_results
+import callback_data as cb
 
-# Cấu hình logging (DEBUG để check image_map)
-logging.basicConfig(level=logging.DEBUG)
+# Cấu hình logging: mức lấy từ LOG_LEVEL (mặc định INFO)
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+# httpx log mọi request ở INFO
+logging.getLogger('httpx').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # Database setup
 DB_FILE = 'quiz.db'
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question_text TEXT NOT NULL,
-            image_url TEXT,
-            option_a TEXT NOT NULL,
-            option_b TEXT NOT NULL,
-            option_c TEXT NOT NULL,
-            option_d TEXT NOT NULL,
-            option_e TEXT,
-            option_f TEXT,
-            option_g TEXT,
-            num_options INTEGER DEFAULT 4,
-            correct_answers TEXT DEFAULT ''
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-def migrate_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA table_info(questions)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if 'num_options' not in columns:
-        cursor.execute("ALTER TABLE questions ADD COLUMN num_options INTEGER DEFAULT 4")
-    if 'correct_answers' not in columns:
-        cursor.execute("ALTER TABLE questions ADD COLUMN correct_answers TEXT DEFAULT ''")
-    for opt in ['e', 'f', 'g']:
-        col_name = f'option_{opt}'
-        if col_name not in columns:
-            cursor.execute(f"ALTER TABLE questions ADD COLUMN {col_name} TEXT")
-    if 'correct_answer' in columns:
-        cursor.execute("UPDATE questions SET correct_answers = correct_answer WHERE correct_answers = '' AND correct_answer IS NOT NULL")
-    conn.commit()
-    conn.close()
-
-migrate_db()
+# Pool connection + executor cho mọi query từ handler
+store = QuestionStore(DB_FILE)
+# Catalog câu hỏi trong RAM, render không cần DB/regex
+catalog = Catalog(store, image_index=load_manifest(), snapshot_file=config.SNAPSHOT_FILE or None)
+# Lưu trạng thái quiz (ID câu + bitmask đáp án), bền qua restart
+sessions = SessionStore(SqliteSessionBackend(DB_FILE))
+# Lịch sử trả lời + lịch ôn SM-2 cho /study, ghi theo lô
+study = StudyLog(SqliteStudyBackend(DB_FILE))
+# Hình câu hỏi: upload một lần, dùng lại Telegram file_id
+images = ImageCache(DB_FILE)
+# Edit message theo diff + gộp toggle; renderer.avoided đếm API call tránh được
+renderer = MessageRenderer()
+# Metric đọc thẳng bộ đếm sẵn có, không tốn gì ở hot path
+metrics.Gauge('quiz_active_sessions', 'Số quiz session đang mở', fn=lambda: len(sessions))
+metrics.Gauge('quiz_catalog_questions', 'Số câu hỏi trong catalog', fn=lambda: len(catalog))
+metrics.Counter('quiz_catalog_lookups_total', 'Lookup câu hỏi trong catalog', ['result'],
+                fn=lambda: {'hit': catalog.hits, 'miss': catalog.misses})
+metrics.Counter('quiz_image_sends_total', 'Gửi hình câu hỏi', ['source'],
+                fn=lambda: {'upload': images.uploads, 'file_id': images.reuses})
+metrics.Counter('quiz_render_total', 'Edit message: đã gửi / tránh được nhờ diff', ['kind'], fn=renderer.stats)
+metrics.Counter('quiz_attempts_total', 'Số câu trả lời đã ghi vào attempts', fn=lambda: study.recorded)
+# Live exam đang chạy theo chat_id group (chỉ trong RAM, mất khi restart)
+live_exams = {}
+metrics.Gauge('quiz_live_exams', 'Số live exam đang chạy trong group', fn=lambda: len(live_exams))
+metrics_server = None
+
+# Số kết quả mỗi trang /search
+SEARCH_PAGE_SIZE = 5
+# /create_exam <số câu> [seed] khó
+HARD_WORDS = ('khó', 'kho')
+# Số câu mặc định / tối đa mỗi lượt /study
+STUDY_SIZE = 20
+MAX_STUDY_SIZE = 100
+# Số câu mặc định mỗi /live
+LIVE_EXAM_SIZE = 20
 
 # Trạng thái Conversation
-QUESTION_TEXT, IMAGE_URL, NUM_OPTIONS, OPTIONS_INPUT, CORRECT_ANSWERS = range(5)
+QUESTION_TEXT, IMAGE_URL, NUM_OPTIONS, OPTIONS_INPUT, CORRECT_ANSWERS, EXAM_COUNT = range(6)
 
-# Lưu trạng thái quiz
-user_quizzes = {}
 
 TOKEN = os.environ.get('TOKEN')
 if not TOKEN:
     raise ValueError("TOKEN chưa được set!")
 
-# Helper
-def get_options(row):
-    opts = {}
-    if row[3]: opts['A'] = row[3]
-    if row[4]: opts['B'] = row[4]
-    if row[5]: opts['C'] = row[5]
-    if row[6]: opts['D'] = row[6]
-    if len(row) > 7 and row[7]: opts['E'] = row[7]
-    if len(row) > 8 and row[8]: opts['F'] = row[8]
-    if len(row) > 9 and row[9]: opts['G'] = row[9]
-    return opts
-
-def get_correct(correct_str):
-    stripped = correct_str.upper().replace(' ', '')
-    if ',' in stripped:
-        return set(c.strip() for c in stripped.split(','))
-    else:
-        return stripped
-
-def parse_images_json(image_url_str, q_id):
-    """Parse image_url: JSON array hoặc single string, map theo opt từ filename."""
-    image_map = {}
-    if not image_url_str:
-        return image_map
-    
-    # Handle single string (câu 48)
-    if not image_url_str.startswith('['):
-        filename = image_url_str.split('/')[-1]
-        match = re.match(r'question(\d+)(_[A-G])?\.jpg', filename)
-        if match:
-            num = match.group(1)
-            opt = match.group(2)[1] if match.group(2) else 'general'
-            if num == str(q_id):
-                image_map[opt] = image_url_str
-        logger.debug(f"Single image for {q_id}: {image_map}")
-        return image_map
-    
-    # Handle JSON array (câu 30)
-    try:
-        urls = json.loads(image_url_str)
-        for url in urls:
-            filename = url.split('/')[-1]
-            match = re.match(r'question(\d+)_([A-G])\.jpg', filename)
-            if match:
-                num = match.group(1)
-                opt = match.group(2)
-                if num == str(q_id):
-                    image_map[opt] = url
-            else:
-                # Fallback general nếu không match opt
-                image_map['general'] = url
-        logger.debug(f"JSON images for {q_id}: {image_map}")
-    except json.JSONDecodeError:
-        logger.error(f"JSON parse error for {q_id}: {image_url_str}")
-        image_map['general'] = image_url_str
-    
-    return image_map
-
 # Thêm câu hỏi
+@instrument
 async def add_question_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text('Gửi nội dung câu hỏi:')
     return QUESTION_TEXT
 
+@instrument
 async def add_question_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['question_text'] = update.message.text
     await update.message.reply_text('Gửi URL hình ảnh (hoặc /skip):')
     return IMAGE_URL
 
+@instrument
 async def add_question_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == '/skip':
         context.user_data['image_url'] = None
@@ -144,6 +97,7 @@ async def add_question_image(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await update.message.reply_text('Số lượng lựa chọn (1-7, gợi ý 4 cho single):')
     return NUM_OPTIONS
 
+@instrument
 async def add_num_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         num = int(update.message.text)
@@ -160,6 +114,7 @@ async def add_num_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text('Số hợp lệ. Thử lại:')
         return NUM_OPTIONS
 
+@instrument
 async def add_options_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     opt_key = context.user_data['current_opt']
     context.user_data['options'][opt_key] = update.message.text
@@ -174,50 +129,39 @@ async def add_options_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text('Đáp án đúng (vd: A cho single, hoặc A,B cho multiple):')
         return CORRECT_ANSWERS
 
+@instrument
 async def add_correct_answers(update: Update, context: ContextTypes.DEFAULT_TYPE):
     correct_str = update.message.text.upper().replace(' ', '')
+    # Cùng kiểm tra như lúc import: catalog không phải đoán với đáp án hỏng
+    error = answer_key_error(context.user_data['num_options'], correct_str)
+    if error:
+        await update.message.reply_text(f'Đáp án không hợp lệ ({error}). Thử lại:')
+        return CORRECT_ANSWERS
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    e_opt = context.user_data['options'].get('E', '')
-    f_opt = context.user_data['options'].get('F', '')
-    g_opt = context.user_data['options'].get('G', '')
-    values = (
-        context.user_data['question_text'],
-        context.user_data['image_url'],
-        context.user_data['options'].get('A', ''),
-        context.user_data['options'].get('B', ''),
-        context.user_data['options'].get('C', ''),
-        context.user_data['options'].get('D', ''),
-        e_opt,
-        f_opt,
-        g_opt,
-        context.user_data['num_options'],
-        correct_str
-    )
-    cursor.execute('''
-        INSERT INTO questions (question_text, image_url, option_a, option_b, option_c, option_d, option_e, option_f, option_g, num_options, correct_answers)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', values)
-    conn.commit()
-    conn.close()
+    options = [context.user_data['options'].get(chr(ord('A') + i), '')
+               for i in range(context.user_data['num_options'])]
+    q_id = await store.add_question(context.user_data['question_text'], context.user_data['image_url'], options,
+                                    correct_str)
+    if q_id is None:
+        await update.message.reply_text('Câu hỏi này đã có trong pool (trùng nội dung câu hỏi và các đáp án A, B, ...), không thêm.')
+        context.user_data.clear()
+        return ConversationHandler.END
+    await catalog.refresh()
     
     await update.message.reply_text('Thêm thành công!')
     context.user_data.clear()
     return ConversationHandler.END
 
+@instrument
 async def cancel_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text('Hủy.')
     context.user_data.clear()
     return ConversationHandler.END
 
 # Xem pool
+@instrument
 async def pool_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM questions')
-    total = cursor.fetchone()[0]
-    conn.close()
+    total = len(catalog)
     
     msg = f'Question pool hiện có {total} câu hỏi.'
     if update.callback_query:
@@ -228,6 +172,7 @@ async def pool_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(msg)
 
 # Xem câu theo ID
+@instrument
 async def view_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text('Sử dụng: /view_question <ID> (e.g., /view_question 5)')
@@ -239,44 +184,112 @@ async def view_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text('ID phải là số nguyên!')
         return
     
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM questions WHERE id = ?', (q_id,))
-    row = cursor.fetchone()
-    conn.close()
+    q = catalog.get(q_id)
     
-    if not row:
+    if not q:
         await update.message.reply_text(f'Câu hỏi ID {q_id} không tồn tại!')
         return
     
-    q_text = row[1]
-    options = get_options(row)
-    correct_str = row[11]
-    num_opts = row[10]
-    image_map = parse_images_json(row[2], q_id)
-    logger.debug(f"Image map for {q_id}: {image_map}")
-    
-    text = f"Câu {q_id}:\n\n{q_text}\n\nĐáp án:"
-    for i in range(1, num_opts + 1):
-        opt = chr(ord('A') + i - 1)
-        opt_text = options.get(opt, '')
-        opt_link = f" [Xem hình {opt}]({image_map.get(opt, '')})" if image_map.get(opt) else ""
-        text += f"\n{opt}: {opt_text}{opt_link}"
-    
-    if 'general' in image_map:
-        text += f"\n\n[Xem hình chung]({image_map['general']})"
-    
-    text += f"\n\nĐáp án đúng: {correct_str}"
+    await send_question_view(update.message, q)
+
+async def send_question_view(message, q):
+    await message.reply_text(q.view_md, parse_mode='Markdown', disable_web_page_preview=False)
+    await images.send_question_images(message.chat_id, q)
+
+# Thống kê câu: đọc bộ đếm theo khóa chính
+@instrument
+async def question_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        q_id = int(context.args[0])
+    except (IndexError, ValueError):
+        await update.message.reply_text('Sử dụng: /stats <ID> (e.g., /stats 5)')
+        return
+    q = catalog.get(q_id)
+    if not q:
+        await update.message.reply_text(f'Câu hỏi ID {q_id} không tồn tại!')
+        return
+    stats = await store.question_stats(q_id)
+    if stats is None:
+        await update.message.reply_text(f'Câu {q_id} chưa có ai làm.')
+        return
+    attempts, correct, picks = stats
+    lines = [f'Thống kê câu {q_id}: {attempts} lượt làm, đúng {correct / attempts:.0%} ({correct})']
+    for i in range(q.num_options):
+        n = picks.get(i, 0)
+        mark = ' ✅' if q.correct_mask >> i & 1 else ''
+        lines.append(f"{chr(ord('A') + i)}: {n} lượt chọn ({n / attempts:.0%}){mark}")
+    await update.message.reply_text('\n'.join(lines))
+
+# Chủ đề: đọc thẳng tag index của catalog
+@instrument
+async def list_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not catalog.tag_index:
+        await update.message.reply_text('Pool chưa có câu nào được gắn tag.')
+        return
+    tags = sorted(catalog.tag_index.items(), key=lambda item: (-len(item[1]), item[0]))
+    lines = [f'{tag}: {len(ids)} câu' for tag, ids in tags]
+    await update.message.reply_text('Chủ đề trong pool:\n' + '\n'.join(lines) +
+                                    '\n\nĐề theo tỉ lệ: /create_exam 65 lambda:30 dynamodb:20')
+
+# Tìm kiếm
+@instrument
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text('Sử dụng: /search <từ khóa> (e.g., /search giao thức TCP)')
+        return
+    # Giữ từ khóa trong user_data cho nút chuyển trang (callback_data tối đa 64 byte)
+    context.user_data['search'] = ' '.join(context.args)
+    await show_search_page(update, context.user_data['search'], 0)
+
+async def show_search_page(update: Update, terms, page):
+    rows = await store.search(terms, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE)
+    has_next = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    
+    if rows:
+        lines = [f'Kết quả cho "{terms}" (trang {page + 1}):']
+        lines += [f'\n#{q_id}: {snippet}' for q_id, snippet in rows]
+        text = '\n'.join(lines)
+    else:
+        text = f'Không tìm thấy câu hỏi nào cho "{terms}".'
+    keyboard = [[InlineKeyboardButton(f'👁 Xem câu {q_id}', callback_data=f'view_{q_id}')] for q_id, _ in rows]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton('◀ Trước', callback_data=f'search_{page - 1}'))
+    if has_next:
+        nav.append(InlineKeyboardButton('Sau ▶', callback_data=f'search_{page + 1}'))
+    if nav:
+        keyboard.append(nav)
+    reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
     
-    await update.message.reply_text(text, parse_mode='Markdown', disable_web_page_preview=False)
+    if update.callback_query:
+        await update.callback_query.answer()
+        await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+@instrument
+async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    action, arg = query.data.split('_', 1)
+    if action == 'view':
+        q = catalog.get(int(arg))
+        if q is None:
+            await query.answer('Câu hỏi không còn tồn tại!')
+            return
+        await query.answer()
+        await send_question_view(query.message, q)
+    else:
+        terms = context.user_data.get('search')
+        if not terms:
+            await query.answer('Kết quả đã hết hạn, hãy /search lại.')
+            return
+        await show_search_page(update, terms, int(arg))
 
 # Tạo exam
+@instrument
 async def create_exam_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM questions')
-    total = cursor.fetchone()[0]
-    conn.close()  # Đóng sau query đầu
+    total = len(catalog)
     
     if total == 0:
         msg = 'Pool chưa có câu hỏi nào! Hãy thêm bằng /add_question.'
@@ -288,7 +301,13 @@ async def create_exam_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(msg)
         return ConversationHandler.END
     
-    msg = f'Pool có {total} câu hỏi. Nhập số câu để random (1-{total}):'
+    # /create_exam <số câu> [seed] -> tạo luôn, không hỏi
+    if context.args:
+        return await create_exam_build(update, context, context.args, retry=ConversationHandler.END)
+    
+    msg = (f'Pool có {total} câu hỏi. Nhập số câu để random (1-{total}), kèm seed nếu muốn '
+           f'(vd: {min(DEFAULT_EXAM_SIZE, total)} 1234); thêm "khó" để ưu tiên câu hay làm sai, '
+           f'hoặc tỉ lệ theo chủ đề (vd: lambda:30 dynamodb:20, xem /tags):')
     if update.callback_query:
         query = update.callback_query
         await query.answer()
@@ -297,193 +316,237 @@ async def create_exam_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(msg)
     return EXAM_COUNT
 
-    # Mở connection mới cho query thứ 2
-    conn2 = sqlite3.connect(DB_FILE)
-    cursor2 = conn2.cursor()
-    cursor2.execute('SELECT * FROM questions')
-    all_questions = cursor2.fetchall()
-    conn2.close()
-    
-    # Random và tạo quiz (phần này thêm vào cuối hàm, sau return EXAM_COUNT nếu có prompt; nếu tự động 65, thay EXAM_COUNT bằng logic random)
-    # Ví dụ tự động 65 (nếu bạn muốn loại bỏ prompt):
-    if total < 65:
-        msg = f'Pool chưa đủ 65 câu (chỉ có {total}). Hãy thêm thêm!'
-        if update.callback_query:
-            await query.message.reply_text(msg)
-        else:
-            await update.message.reply_text(msg)
-        return ConversationHandler.END
-    
-    selected = random.sample(all_questions, 65)
-    user_id = update.effective_user.id
-    quiz_data = {
-        'questions': [
-            {
-                'id': q[0],
-                'text': q[1],
-                'image': q[2],
-                'options': get_options(q),
-                'num_options': q[10],
-                'correct': get_correct(q[11]),
-                'is_multiple': isinstance(get_correct(q[11]), set)
-            } for q in selected
-        ],
-        'current_index': 0,
-        'answers': {}
-    }
-    user_quizzes[user_id] = quiz_data
-    
-    msg = f'Đã tạo đề thi 65 câu! Bắt đầu quiz...'
-    if update.callback_query:
-        await query.message.reply_text(msg)
+@instrument
+async def create_exam_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await create_exam_build(update, context, update.message.text.split())
+
+async def create_exam_build(update: Update, context: ContextTypes.DEFAULT_TYPE, parts, retry=EXAM_COUNT):
+    """Tạo đề từ tham số; sai thì trả retry: EXAM_COUNT để hỏi lại, END nếu tham số gõ kèm lệnh."""
+    total = len(catalog)
+
+    async def reject(msg):
+        hint = 'Thử lại:' if retry == EXAM_COUNT else 'Gõ lại /create_exam.'
+        await update.message.reply_text(f'{msg} {hint}')
+        return retry
+
+    # "khó": bốc theo tỉ lệ sai của từng câu
+    hard = any(p.lower() in HARD_WORDS for p in parts)
+    parts = [p for p in parts if p.lower() not in HARD_WORDS]
+    # "tag:phần trăm": blueprint theo chủ đề
+    try:
+        blueprint = parse_blueprint([p for p in parts if ':' in p])
+    except ValueError:
+        return await reject('Blueprint dạng tag:phần trăm, tổng không quá 100 (vd: lambda:30 dynamodb:20).')
+    unknown = [tag for tag, _ in blueprint if tag not in catalog.tag_index]
+    if unknown:
+        return await reject(f"Không có tag: {', '.join(unknown)}. Xem danh sách bằng /tags.")
+    if blueprint and hard:
+        return await reject('Chọn blueprint hoặc "khó", không dùng chung.')
+    parts = [p for p in parts if ':' not in p]
+    try:
+        k = int(parts[0])
+        seed = int(parts[1]) if len(parts) > 1 else None
+    except (ValueError, IndexError):
+        return await reject(f'Nhập số nguyên 1-{total} (và seed là số nguyên).')
+    if not 1 <= k <= total:
+        return await reject(f'Số câu phải trong khoảng 1-{total}.')
+    
+    seed, selected = build_exam(catalog, k, seed, study.difficulty.weight if hard else None, blueprint)
+    sessions.create(update.effective_user.id, [q.id for q in selected])
+    
+    if blueprint:
+        counts = [f"{tag} {sum(tag in q.tags for q in selected)}" for tag, _ in blueprint]
+        kind = f"{', '.join(counts)}, "
     else:
-        await update.message.reply_text(msg)
-    
+        kind = 'ưu tiên câu khó, ' if hard else ''
+    await update.message.reply_text(f'Đã tạo đề thi {k} câu ({kind}seed {seed})! Bắt đầu quiz...')
     await show_question(update, context)
     return ConversationHandler.END
 
+@instrument
+async def cancel_exam(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text('Hủy tạo đề.')
+    return ConversationHandler.END
+
 # Hiển thị câu
-async def show_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def show_question(update: Update, context: ContextTypes.DEFAULT_TYPE, toggled=False):
     user_id = update.effective_user.id
-    if user_id not in user_quizzes:
+    session = sessions.get(user_id)
+    if session is None:
         if update.message:
             await update.message.reply_text('Tạo exam trước bằng /create_exam!')
         return
     
-    quiz = user_quizzes[user_id]
-    total_q = len(quiz['questions'])
-    idx = quiz['current_index']
-    q = quiz['questions'][idx]
+    total_q = len(session)
+    idx = session.cursor
+    q = catalog.get(session.question_ids[idx])
     
-    select_type = "1 đáp án" if not q['is_multiple'] else "tất cả đúng"
-    q_text = q['text']
-    image_map = parse_images_json(q['image'], q['id'])
-    logger.debug(f"Quiz image map for {q['id']}: {image_map}")
+    select_type = "1 đáp án" if not q.is_multiple else "tất cả đúng"
     
-    text = f"Câu {idx+1}/{total_q}:\n\n{q_text}\n\n(Chọn {select_type})"
+    text = f"Câu {idx+1}/{total_q}:\n\n{q.body_md}\n\n(Chọn {select_type})"
     
-    # Lấy selected hiện tại
-    selected = quiz['answers'].get(idx, '' if not q['is_multiple'] else set())
+    # Bitmask đáp án đang chọn
+    selected = session.answers[idx]
     
-    # Keyboard động với image links
+    # Keyboard động, nhãn đã dựng sẵn trong catalog
+    nonce = session.nonce
     keyboard = []
-    for i in range(q['num_options']):
-        opt = chr(ord('A') + i)
-        opt_text = q['options'][opt]
-        opt_link = f" [img {opt}]({image_map.get(opt, '')})" if image_map.get(opt) else ""
-        label = f"{opt}: {opt_text}{opt_link}"
-        if q['is_multiple']:
-            if opt in selected:
-                label += ' ✅'
-        else:
-            if selected == opt:
-                label += ' ✅'
-        keyboard.append([InlineKeyboardButton(label, callback_data=f"ans_{idx}_{opt}")])
+    for i, label in enumerate(q.labels):
+        if selected >> i & 1:
+            label += ' ✅'
+        keyboard.append([InlineKeyboardButton(label, callback_data=cb.encode(cb.ANSWER, nonce, idx, 1 << i))])
     
+    if q.image_paths:
+        keyboard.append([InlineKeyboardButton("🖼 Xem hình", callback_data=cb.encode(cb.IMAGE, nonce, idx))])
     keyboard += [
-        [InlineKeyboardButton("Next", callback_data=f"next_{idx}")],
-        [InlineKeyboardButton("Back", callback_data=f"back_{idx}")],
-        [InlineKeyboardButton("Confirm", callback_data=f"confirm_{idx}")]
+        [InlineKeyboardButton("Next", callback_data=cb.encode(cb.NEXT, nonce, idx))],
+        [InlineKeyboardButton("Back", callback_data=cb.encode(cb.BACK, nonce, idx))],
+        [InlineKeyboardButton("Confirm", callback_data=cb.encode(cb.CONFIRM, nonce, idx))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     if update.callback_query:
         query = update.callback_query
-        await query.answer()
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown', disable_web_page_preview=False)
+        # Toggle đáp án: callback đã answer, gộp các lần bấm liên tiếp thành một edit
+        if not toggled:
+            await query.answer()
+        await renderer.edit(query, text, reply_markup, coalesce=toggled, parse_mode='Markdown', disable_web_page_preview=False)
     else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown', disable_web_page_preview=False)
+        message = await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown', disable_web_page_preview=False)
+        renderer.sent(message, text, reply_markup)
+
+# Callback: decode một lần, từ chối nút cũ, rồi tra bảng QUIZ_ACTIONS
+STALE_BUTTON = 'Nút này đã cũ, dùng câu hỏi mới nhất.'
 
-# Callback
+@instrument
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    data = query.data
-    user_id = query.from_user.id
-    
-    if user_id not in user_quizzes:
+    decoded = cb.decode(query.data)
+    session = sessions.get(query.from_user.id)
+    if session is None:
         await query.answer("Chưa có quiz!")
         return
-    
-    quiz = user_quizzes[user_id]
-    total_q = len(quiz['questions'])
-    idx = quiz['current_index']
-    q = quiz['questions'][idx]
-    
-    if data.startswith('ans_'):
-        _, _, idx_str, opt = data.split('_')
-        idx = int(idx_str)
-        q = quiz['questions'][idx]
-        if q['is_multiple']:
-            selected = quiz['answers'].setdefault(idx, set())
-            if opt in selected:
-                selected.discard(opt)
-                await query.answer(f"Bỏ {opt}")
-            else:
-                selected.add(opt)
-                await query.answer(f"Chọn {opt}")
+    # Nút của đề khác (nonce) hoặc của câu không còn hiển thị
+    if decoded is None or decoded[1] != session.nonce or decoded[2] != session.cursor:
+        await query.answer(STALE_BUTTON)
+        return
+    action, _, idx, mask = decoded
+    handler = QUIZ_ACTIONS.get(action)
+    if handler is None:
+        await query.answer(STALE_BUTTON)
+        return
+    await handler(update, context, session, idx, mask)
+
+async def on_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, session, idx, bit):
+    query = update.callback_query
+    q = catalog.get(session.question_ids[idx])
+    # Mỗi nút mang đúng một bit trong số option của câu
+    if not 0 < bit < 1 << q.num_options or bit & (bit - 1):
+        await query.answer(STALE_BUTTON)
+        return
+    opt = mask_to_letters(bit)[0]
+    if q.is_multiple:
+        session.answers[idx] ^= bit
+        await query.answer(f"Chọn {opt}" if session.answers[idx] & bit else f"Bỏ {opt}")
+    else:
+        if session.answers[idx] == bit:
+            session.answers[idx] = 0
+            await query.answer("Bỏ chọn")
         else:
-            if quiz['answers'].get(idx) == opt:
-                quiz['answers'][idx] = ''
-                await query.answer("Bỏ chọn")
-            else:
-                quiz['answers'][idx] = opt
-                await query.answer(f"Chọn {opt}")
+            session.answers[idx] = bit
+            await query.answer(f"Chọn {opt}")
+    sessions.touch(session)
+    await show_question(update, context, toggled=True)
+
+async def on_next(update: Update, context: ContextTypes.DEFAULT_TYPE, session, idx, mask):
+    if idx < len(session) - 1:
+        session.cursor += 1
+        sessions.touch(session)
         await show_question(update, context)
+    else:
+        await update.callback_query.answer()
+        result = end_quiz(session)
+        await context.bot.send_message(session.user_id, result)
+        sessions.delete(session.user_id)
+
+async def on_back(update: Update, context: ContextTypes.DEFAULT_TYPE, session, idx, mask):
+    if idx > 0:
+        session.cursor -= 1
+        sessions.touch(session)
+        await show_question(update, context)
+    else:
+        await update.callback_query.answer()
+
+async def on_image(update: Update, context: ContextTypes.DEFAULT_TYPE, session, idx, mask):
+    query = update.callback_query
+    await query.answer()
+    await images.send_question_images(query.message.chat_id, catalog.get(session.question_ids[idx]))
+
+async def on_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, session, idx, mask):
+    q = catalog.get(session.question_ids[idx])
+    # Text phản hồi đã dựng sẵn lúc load catalog
+    text, show_alert = q.feedback[q.is_correct(session.answers[idx])]
+    await update.callback_query.answer(text, show_alert=show_alert)
+
+QUIZ_ACTIONS = {
+    cb.ANSWER: on_answer,
+    cb.NEXT: on_next,
+    cb.BACK: on_back,
+    cb.IMAGE: on_image,
+    cb.CONFIRM: on_confirm,
+}
+
+# Nút dạng chuỗi cũ (ans_0_A, live_0_A...) còn trong chat từ trước khi đổi định dạng
+@instrument
+async def stale_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer(STALE_BUTTON)
+
+# Ôn tập: câu đến hạn theo SM-2 trước, còn chỗ thì thêm câu chưa làm
+@instrument
+async def study_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    try:
+        size = int(context.args[0]) if context.args else STUDY_SIZE
+    except ValueError:
+        size = 0
+    if not 1 <= size <= MAX_STUDY_SIZE:
+        await update.message.reply_text(f'Sử dụng: /study [số câu 1-{MAX_STUDY_SIZE}] (mặc định {STUDY_SIZE})')
+        return
     
-    elif data.startswith('next_'):
-        if idx < total_q - 1:
-            quiz['current_index'] += 1
-            await show_question(update, context)
-        else:
-            result = end_quiz(user_id)
-            await context.bot.send_message(user_id, result)
-            del user_quizzes[user_id]
-    
-    elif data.startswith('back_'):
-        if idx > 0:
-            quiz['current_index'] -= 1
-            await show_question(update, context)
+    due, seen, next_due = await study.plan(user_id, size)
+    # Câu đã bị xóa khỏi pool thì bỏ qua
+    due = [q_id for q_id in due if catalog.get(q_id) is not None]
+    fresh = pick_new(catalog.ids, seen, size - len(due))
+    if not due and not fresh:
+        when = datetime.datetime.fromtimestamp(next_due).strftime('%d/%m %H:%M') if next_due else None
+        await update.message.reply_text(f'Chưa có câu nào đến hạn ôn. Lần tới: {when}.' if when else
+                                        'Pool chưa có câu hỏi nào!')
+        return
     
-    elif data.startswith('confirm_'):
-        selected = quiz['answers'].get(idx, '' if not q['is_multiple'] else set())
-        correct = q['correct']
-        
-        if q['is_multiple']:
-            if selected == correct:
-                result = "✅ Đúng hoàn toàn!"
-            else:
-                correct_list = ', '.join(sorted(correct))
-                result = f"❌ Sai! Đúng: {correct_list}"
-        else:
-            if selected == correct:
-                result = "✅ Đúng!"
-            else:
-                result = f"❌ Sai! Đúng là {correct}: {q['options'][correct]}"
-        
-        await query.answer(result)
+    sessions.create(user_id, due + fresh)
+    await update.message.reply_text(f'Ôn tập {len(due) + len(fresh)} câu: {len(due)} câu đến hạn, {len(fresh)} câu mới.')
+    await show_question(update, context)
 
 # Kết quả
-def end_quiz(user_id):
-    if user_id not in user_quizzes:
+def end_quiz(session):
+    if session is None:
         return "Không có quiz."
     
-    quiz = user_quizzes[user_id]
-    total = len(quiz['questions'])
-    correct_count = 0
-    wrong_positions = []
-    for i in range(total):
-        q = quiz['questions'][i]
-        selected = quiz['answers'].get(i, '' if not q['is_multiple'] else set())
-        if (q['is_multiple'] and selected == q['correct']) or (not q['is_multiple'] and selected == q['correct']):
-            correct_count += 1
-        else:
-            wrong_positions.append(str(q['id']))
+    total = len(session)
+    # Chấm cả đề một lượt trên bitmask (có snapshot thì mask đọc thẳng từ record, không decode câu)
+    correct = bytes(catalog.correct_mask(q_id) for q_id in session.question_ids)
+    scores = score_exam(session.answers, correct, STRICT)
+    study.record_exam(session.user_id, session.question_ids, session.answers, scores)
+    partial_score = sum(score_exam(session.answers, correct, PARTIAL))
+    correct_count = int(sum(scores))
+    wrong_positions = [str(q_id) for q_id, score in zip(session.question_ids, scores) if not score]
     
     wrong_count = total - correct_count
-    result_text = f"Kết quả:\n✅ Đúng: {correct_count}/{total}\n❌ Sai: {wrong_count}\nVị trí sai trong pool: {', '.join(wrong_positions)}"
+    result_text = f"Kết quả:\n✅ Đúng: {correct_count}/{total}\n❌ Sai: {wrong_count}\nĐiểm từng phần: {partial_score:.2f}/{total}\nVị trí sai trong pool: {', '.join(wrong_positions)}"
     return result_text
 
 # Start và button
+@instrument
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [InlineKeyboardButton("Thêm câu hỏi", callback_data="add_q")],
@@ -493,26 +556,191 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text('Chào! Chọn chức năng:', reply_markup=reply_markup)
 
+@instrument
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     if query.data == "add_q":
         await query.edit_message_text("Dùng /add_question để thêm.")
-    elif query.data == "create_exam":
-        return await create_exam_start(update, context)
     elif query.data == "pool_count":
         await pool_count(update, context)
 
+@instrument
 async def finish_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    result = end_quiz(user_id)
+    result = end_quiz(sessions.get(user_id))
     await update.message.reply_text(result)
-    if user_id in user_quizzes:
-        del user_quizzes[user_id]
+    sessions.delete(user_id)
+
+# Live exam trong group: host đẩy câu, cả nhóm trả lời trên cùng message
+@instrument
+async def live_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    if chat.type == 'private':
+        await update.message.reply_text('Dùng /live trong group để cả nhóm cùng thi.')
+        return
+    if chat.id in live_exams:
+        await update.message.reply_text('Group đang có live exam. Host dùng /live_end để kết thúc.')
+        return
+    total = len(catalog)
+    try:
+        k = int(context.args[0]) if context.args else min(LIVE_EXAM_SIZE, total)
+        seed = int(context.args[1]) if len(context.args) > 1 else None
+    except ValueError:
+        k = 0
+    if not 1 <= k <= total:
+        await update.message.reply_text(f'Sử dụng: /live [số câu 1-{total}] [seed]')
+        return
+    
+    seed, selected = build_exam(catalog, k, seed)
+    host = update.effective_user
+    exam = live_exams[chat.id] = LiveExam(chat.id, host.id, [q.id for q in selected], seed)
+    await update.message.reply_text(f'Live exam {k} câu (seed {seed}), host {host.first_name}. '
+                                    f'Mọi người bấm đáp án ngay trên câu hỏi; host bấm "Câu tiếp" để chuyển.')
+    await push_live_question(context, exam)
+    exam.refresher = context.application.create_task(refresh_loop(context.bot, exam))
+
+async def push_live_question(context: ContextTypes.DEFAULT_TYPE, exam):
+    exam.cursor += 1
+    idx = exam.cursor
+    q = catalog.get(exam.question_ids[idx])
+    select_type = "1 đáp án" if not q.is_multiple else "tất cả đúng"
+    text = f"Câu {idx+1}/{len(exam)}:\n\n{q.body_md}\n\n(Chọn {select_type})"
+    keyboard = [[InlineKeyboardButton(label, callback_data=cb.encode(cb.LIVE_ANSWER, exam.nonce, idx, 1 << i))]
+                for i, label in enumerate(q.labels)]
+    last = idx == len(exam) - 1
+    keyboard.append([InlineKeyboardButton("🏁 Kết thúc" if last else "Câu tiếp ⏭", callback_data=cb.encode(cb.LIVE_NEXT, exam.nonce, idx))])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    if q.image_paths:
+        await images.send_question_images(exam.chat_id, q)
+    message = await context.bot.send_message(exam.chat_id, text, reply_markup=reply_markup,
+                                             parse_mode='Markdown', disable_web_page_preview=False)
+    exam.open(message.message_id, text, reply_markup)
+
+async def close_live_question(context: ContextTypes.DEFAULT_TYPE, exam):
+    """Chấm câu đang mở cho cả nhóm, thay keyboard bằng đáp án đúng. Gọi khi đang giữ exam.lock."""
+    q = catalog.get(exam.question_ids[exam.cursor])
+    message_id, answered = exam.message_id, exam.answered
+    right = exam.close_question(q.correct_mask)
+    answer = ', '.join(mask_to_letters(q.correct_mask)) or 'chưa có'
+    await context.bot.edit_message_text(f"{exam.text}\n\n✅ Đáp án: {answer} — {right}/{answered} người đúng",
+                                        chat_id=exam.chat_id, message_id=message_id, parse_mode='Markdown')
+
+async def finish_live(context: ContextTypes.DEFAULT_TYPE, exam, title):
+    live_exams.pop(exam.chat_id, None)
+    if exam.refresher:
+        exam.refresher.cancel()
+    await context.bot.send_message(exam.chat_id, exam.leaderboard_text())
+    # Lịch sử /study: chỉ các câu đã mở; câu người đó không chọn bị record_exam bỏ qua
+    asked = exam.question_ids[:exam.cursor + 1]
+    correct = [catalog.correct_mask(q_id) for q_id in asked]
+    for user_id, row in exam.answers.items():
+        study.record_exam(user_id, asked, row, [mask and mask == c for mask, c in zip(row, correct)])
+    # Kết quả riêng: chạy nền, ưu tiên thấp, bộ lập lịch tự giãn theo rate limit
+    context.application.create_task(send_results(context.bot, exam, title, BULK_PRIORITY))
+
+@instrument
+async def live_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    decoded = cb.decode(query.data)
+    exam = live_exams.get(query.message.chat_id)
+    if (decoded is None or exam is None or decoded[1] != exam.nonce or decoded[2] != exam.cursor
+            or exam.message_id is None or decoded[0] not in LIVE_ACTIONS):
+        await query.answer('Câu này đã đóng.')
+        return
+    action, _, idx, mask = decoded
+    await LIVE_ACTIONS[action](update, context, exam, idx, mask)
+
+async def on_live_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, exam, idx, bit):
+    query = update.callback_query
+    user = query.from_user
+    q = catalog.get(exam.question_ids[idx])
+    if not 0 < bit < 1 << q.num_options or bit & (bit - 1):
+        await query.answer('Câu này đã đóng.')
+        return
+    exam.answer(user.id, user.first_name, idx, bit, q.is_multiple)
+    # Không edit ở đây: refresh_loop gộp mọi lần bấm thành một edit
+    await query.answer(f"Đã chọn: {exam.picked(user.id)}")
+
+async def on_live_next(update: Update, context: ContextTypes.DEFAULT_TYPE, exam, idx, mask):
+    query = update.callback_query
+    if query.from_user.id != exam.host_id:
+        await query.answer('Chỉ host mới chuyển câu được.')
+        return
+    await query.answer()
+    async with exam.lock:
+        # Host bấm hai lần: lần sau chờ lock xong thì câu idx đã đóng
+        if idx != exam.cursor or exam.message_id is None:
+            return
+        await close_live_question(context, exam)
+        if exam.cursor < len(exam) - 1:
+            await push_live_question(context, exam)
+        else:
+            await finish_live(context, exam, query.message.chat.title)
+
+LIVE_ACTIONS = {
+    cb.LIVE_ANSWER: on_live_answer,
+    cb.LIVE_NEXT: on_live_next,
+}
+
+@instrument
+async def live_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    exam = live_exams.get(update.effective_chat.id)
+    if exam is None:
+        await update.message.reply_text('Group không có live exam nào.')
+        return
+    if update.effective_user.id != exam.host_id:
+        await update.message.reply_text('Chỉ host mới kết thúc được.')
+        return
+    async with exam.lock:
+        if live_exams.get(exam.chat_id) is not exam:
+            return
+        if exam.message_id is not None:
+            await close_live_question(context, exam)
+        await finish_live(context, exam, update.effective_chat.title)
 
 # Main
-def main():
-    application = Application.builder().token(TOKEN).build()
+async def on_startup(application: Application):
+    await catalog.load()
+    catalog.start_watching()
+    await sessions.load(shard=config.SHARD)
+    sessions.start()
+    await study.load()
+    study.start()
+    images.backend = TelegramImageBackend(application.bot)
+    await images.load()
+    global metrics_server
+    if config.METRICS_PORT:
+        port = config.METRICS_PORT + (config.SHARD[0] if config.SHARD else 0)
+        try:
+            metrics_server = await metrics.serve(config.METRICS_HOST, port)
+        except OSError as exc:
+            logger.warning("Không mở được /metrics ở port %s: %s", port, exc)
+
+async def on_shutdown(application: Application):
+    catalog.stop_watching()
+    if metrics_server:
+        metrics_server.close()
+    logger.info("Render stats: %s", renderer.stats())
+    await sessions.stop()
+    await study.stop()
+    images.close()
+    store.close()
+
+def build_application(token=TOKEN, base_url=None, rate_limiter=None, persistence=None):
+    """Tạo Application với đủ handler; base_url để trỏ tới Bot API khác (vd. API giả khi benchmark)."""
+    # Trạng thái hội thoại + user_data nằm trong DB để các worker/lần restart dùng chung
+    if persistence is None:
+        persistence = BotPersistence(SqliteStateBackend(DB_FILE), shard=config.SHARD)
+    # Mọi request ra Bot API đi qua scheduler: ưu tiên + token bucket theo chat/toàn cục
+    builder = (
+        Application.builder().token(token).rate_limiter(rate_limiter or OutboundScheduler(global_rate=config.OUTBOUND_GLOBAL_RATE))
+        .concurrent_updates(config.CONCURRENT_UPDATES).persistence(persistence)
+        .post_init(on_startup).post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
     
     conv_handler = ConversationHandler(
     entry_points=[CommandHandler('add_question', add_question_start)],
@@ -524,18 +752,62 @@ def main():
         CORRECT_ANSWERS: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_correct_answers)],
     },
     fallbacks=[CommandHandler('cancel', cancel_add)],
+    name='add_question',
+    persistent=True,
+    )
+    
+    exam_handler = ConversationHandler(
+        entry_points=[
+            CommandHandler('create_exam', create_exam_start),
+            CallbackQueryHandler(create_exam_start, pattern='^create_exam$'),
+        ],
+        states={
+            EXAM_COUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, create_exam_count)],
+        },
+        fallbacks=[CommandHandler('cancel', cancel_exam)],
+        # Đang chờ nhập số câu mà gõ lại /create_exam ... thì bắt đầu lại, không bị kẹt
+        allow_reentry=True,
+        name='create_exam',
+        persistent=True,
     )
     
     application.add_handler(CommandHandler('start', start))
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler('pool_count', pool_count))
     application.add_handler(CommandHandler('view_question', view_question))
-    application.add_handler(CommandHandler('create_exam', create_exam_start))
+    application.add_handler(CommandHandler('search', search))
+    application.add_handler(CommandHandler('stats', question_stats))
+    application.add_handler(CommandHandler('tags', list_tags))
+    application.add_handler(exam_handler)
     application.add_handler(CommandHandler('finish_quiz', finish_quiz))
-    application.add_handler(CallbackQueryHandler(handle_callback, pattern='^(ans_|next_|back_|confirm_)'))
-    application.add_handler(CallbackQueryHandler(button_handler, pattern='^(add_q|create_exam|pool_count)'))
-    
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.add_handler(CommandHandler('study', study_start))
+    application.add_handler(CommandHandler('live', live_start))
+    application.add_handler(CommandHandler('live_end', live_end))
+    application.add_handler(CallbackQueryHandler(handle_callback, pattern=f'^{cb.QUIZ_PREFIX}'))
+    application.add_handler(CallbackQueryHandler(button_handler, pattern='^(add_q|pool_count)'))
+    application.add_handler(CallbackQueryHandler(search_callback, pattern='^(view|search)_'))
+    application.add_handler(CallbackQueryHandler(live_callback, pattern=f'^{cb.LIVE_PREFIX}'))
+    application.add_handler(CallbackQueryHandler(stale_callback, pattern='^(ans_|next_|back_|img_|confirm_|live_|livenext_)'))
+    
+    return application
+
+def main():
+    if config.BOT_MODE == 'webhook' and not config.WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL chưa được set!")
+    # Schema cập nhật một lần ở đây (trước khi tách worker), không phải mỗi lần import bot
+    migrate(DB_FILE)
+    if config.WORKERS > 1:
+        run_sharded(config.WORKERS)
+        return
+    application = build_application()
+    if config.BOT_MODE == 'webhook':
+        asyncio.run(run_webhook(
+            application, config.WEBHOOK_URL, config.WEBHOOK_PATH, config.WEBHOOK_LISTEN, config.WEBHOOK_PORT,
+            secret_token=config.WEBHOOK_SECRET, allowed_updates=config.ALLOWED_UPDATES,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        ))
+    else:
+        application.run_polling(allowed_updates=config.ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
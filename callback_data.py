@@ -0,0 +1,50 @@
+"""callback_data gọn cho nút quiz và live exam: prefix + base64url của 9 byte.
+
+    version (1) | action (1) | nonce (4) | vị trí câu (2) | bitmask option (1)
+
+Nonce là số ngẫu nhiên của session/live exam: nút của đề cũ (khác nonce) hoặc câu khác câu đang
+mở bị từ chối ngay sau một lần decode, không đụng tới catalog. Đổi định dạng thì tăng VERSION,
+nút cũ sẽ decode ra None.
+"""
+import base64
+import binascii
+import functools
+import random
+import struct
+
+VERSION = 1
+# Ký tự đầu để CallbackQueryHandler (và router của workers) tách luồng không cần decode
+QUIZ_PREFIX = 'Q'
+LIVE_PREFIX = 'L'
+
+# Action
+ANSWER, NEXT, BACK, IMAGE, CONFIRM, LIVE_ANSWER, LIVE_NEXT = range(7)
+_PREFIXES = {LIVE_ANSWER: LIVE_PREFIX, LIVE_NEXT: LIVE_PREFIX}
+
+_FORMAT = struct.Struct('>BBIHB')
+_ENCODED_LEN = 1 + 12  # 9 byte -> 12 ký tự base64, không padding
+
+
+def new_nonce():
+    return random.getrandbits(32)
+
+
+def encode(action, nonce, idx, mask=0):
+    packed = _FORMAT.pack(VERSION, action, nonce, idx, mask)
+    return _PREFIXES.get(action, QUIZ_PREFIX) + base64.urlsafe_b64encode(packed).decode('ascii')
+
+
+# Cùng một nút bị bấm nhiều lần (toggle, Confirm; live exam: cả group bấm chung vài nút):
+# base64 + struct ~1.5 µs, tra cache ~0.1 µs
+@functools.lru_cache(maxsize=4096)
+def decode(data):
+    """(action, nonce, idx, mask) hoặc None nếu không đúng định dạng / khác version."""
+    if len(data) != _ENCODED_LEN:
+        return None
+    try:
+        version, action, nonce, idx, mask = _FORMAT.unpack(base64.urlsafe_b64decode(data[1:]))
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    if version != VERSION:
+        return None
+    return action, nonce, idx, mask
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import re
+
+from telegram.helpers import escape_markdown
+
+from image_cache import local_path
+from snapshot import open_snapshot
+
+logger = logging.getLogger(__name__)
+
+OPTION_LETTERS = 'ABCDEFG'
+# answerCallbackQuery nhận tối đa 200 ký tự
+FEEDBACK_LIMIT = 200
+
+
+# Bitmask đáp án: bit i <-> chữ cái thứ i (A=1, B=2, C=4, ...)
+def option_bit(opt):
+    return 1 << OPTION_LETTERS.index(opt)
+
+def letters_to_mask(letters):
+    mask = 0
+    for opt in letters:
+        idx = OPTION_LETTERS.find(opt) if len(opt) == 1 else -1
+        if idx >= 0:
+            mask |= 1 << idx
+    return mask
+
+def mask_to_letters(mask):
+    return [opt for i, opt in enumerate(OPTION_LETTERS) if mask >> i & 1]
+
+
+# Helper (chỉ chạy lúc load catalog, không chạy lúc render)
+def get_correct(correct_str):
+    stripped = correct_str.upper().replace(' ', '')
+    if ',' in stripped:
+        return set(c.strip() for c in stripped.split(','))
+    else:
+        return stripped
+
+def feedback_payload(text, explanation=None):
+    """(text, show_alert) cho query.answer: có giải thích thì hiện popup; cắt theo giới hạn Telegram."""
+    if explanation:
+        text = f"{text}\n\n{explanation}"
+    if len(text) > FEEDBACK_LIMIT:
+        text = text[:FEEDBACK_LIMIT - 1] + '…'
+    return text, bool(explanation)
+
+def parse_images_json(image_url_str, q_id):
+    """Parse image_url: JSON array hoặc single string, map theo opt từ filename.
+
+    Mọi URL trong image_url đều thuộc câu này, kể cả khi số trong tên file khác q_id (nhiều ngân hàng).
+    """
+    image_map = {}
+    if not image_url_str:
+        return image_map
+
+    # Handle single string (câu 48)
+    if not image_url_str.startswith('['):
+        filename = image_url_str.split('/')[-1]
+        match = re.match(r'question(\d+)(_[A-G])?\.jpe?g', filename)
+        if match:
+            opt = match.group(2)[1] if match.group(2) else 'general'
+            image_map[opt] = image_url_str
+        logger.debug("Single image for %s: %s", q_id, image_map)
+        return image_map
+
+    # Handle JSON array (câu 30)
+    try:
+        urls = json.loads(image_url_str)
+        for url in urls:
+            filename = url.split('/')[-1]
+            match = re.match(r'question(\d+)_([A-G])\.jpe?g', filename)
+            if match:
+                image_map[match.group(2)] = url
+            else:
+                # Fallback general nếu không match opt
+                image_map['general'] = url
+        logger.debug("JSON images for %s: %s", q_id, image_map)
+    except json.JSONDecodeError:
+        logger.error("JSON parse error for %s: %s", q_id, image_url_str)
+        image_map['general'] = image_url_str
+
+    return image_map
+
+
+class QuestionRecord:
+    """Câu hỏi đã compile sẵn: options, đáp án, phản hồi Confirm, image map và text Markdown đã escape."""
+
+    __slots__ = ('id', 'num_options', 'options', 'correct', 'correct_mask', 'correct_str', 'is_multiple',
+                 'explanation', 'feedback', 'tags', 'image_paths', 'body_md', 'view_md', 'labels')
+
+    def __init__(self, row, options, image_index=None, tags=(), correct_mask=None):
+        """row: dòng questions (sqlite3.Row); options: {vị trí: text} từ question_options; tags: tên chủ đề.
+
+        image_index: {tên file gốc: path} từ image_cache.load_manifest, None nếu chưa có manifest.
+        correct_mask: đã tính sẵn (snapshot) thì dùng luôn, không thì tính từ correct_answers.
+        """
+        q_id = row['id']
+        num_opts = row['num_options']
+        correct_str = row['correct_answers'] or ''
+        correct = get_correct(correct_str)
+
+        self.id = q_id
+        self.num_options = num_opts
+        self.options = tuple(options.get(i, '') for i in range(num_opts))
+        self.correct = frozenset(correct)
+        self.correct_mask = letters_to_mask(self.correct) if correct_mask is None else correct_mask
+        self.correct_str = correct_str
+        self.is_multiple = isinstance(correct, set)
+        self.explanation = explanation = row['explanation']
+        self.tags = tuple(tags)
+
+        # Phản hồi Confirm dựng sẵn: feedback[đúng?] -> (text, show_alert)
+        letters = mask_to_letters(self.correct_mask)
+        if not letters:
+            # Dòng cũ chưa qua kiểm tra lúc import: không có đáp án hợp lệ
+            wrong = "❌ Sai! (Câu này chưa có đáp án đúng)"
+        elif self.is_multiple:
+            wrong = f"❌ Sai! Đúng: {', '.join(letters)}"
+        else:
+            wrong = f"❌ Sai! Đúng là {letters[0]}: {self.option_text(letters[0])}"
+        right = "✅ Đúng hoàn toàn!" if self.is_multiple else "✅ Đúng!"
+        self.feedback = (feedback_payload(wrong, explanation), feedback_payload(right, explanation))
+
+        # Hình gửi qua Telegram bằng file_id (image_cache), không link GitHub.
+        # Luôn theo image_url của chính câu này (số trong tên file là số câu của ngân hàng, không phải ID);
+        # có manifest (prepare_images.py) thì dùng bản đã nén.
+        self.image_paths = image_paths = {key: local_path(url, image_index)
+                                          for key, url in parse_images_json(row['image_url'], q_id).items()}
+        self.body_md = escape_markdown(row['question_text'], version=1)
+
+        # Nhãn nút (plain text, Telegram không parse Markdown trong button)
+        labels = []
+        for opt, opt_text in zip(OPTION_LETTERS, self.options):
+            opt_link = f" (hình {opt})" if opt in image_paths else ""
+            labels.append(f"{opt}: {opt_text}{opt_link}")
+        self.labels = tuple(labels)
+
+        # Nội dung /view_question dựng sẵn
+        text = f"Câu {q_id}:\n\n{self.body_md}\n\nĐáp án:"
+        for opt, opt_text in zip(OPTION_LETTERS, self.options):
+            opt_link = f" (hình {opt})" if opt in image_paths else ""
+            text += f"\n{opt}: {escape_markdown(opt_text, version=1)}{opt_link}"
+        if image_paths:
+            text += "\n\n(Hình minh họa gửi kèm bên dưới)"
+        text += f"\n\nĐáp án đúng: {escape_markdown(correct_str, version=1)}"
+        if explanation:
+            text += f"\n\nGiải thích: {escape_markdown(explanation, version=1)}"
+        if self.tags:
+            text += f"\n\nChủ đề: {escape_markdown(', '.join(self.tags), version=1)}"
+        self.view_md = text
+
+    def option_text(self, opt):
+        idx = OPTION_LETTERS.find(opt) if len(opt) == 1 else -1
+        return self.options[idx] if 0 <= idx < len(self.options) else ''
+
+    def is_correct(self, mask):
+        return mask == self.correct_mask
+
+
+class Catalog:
+    """Toàn bộ câu hỏi load một lần vào RAM, reload khi catalog_version trong DB đổi.
+
+    tag_index: {tag: tuple ID} dựng lại mỗi lần load, cùng lúc với ids, để bốc đề theo blueprint O(k).
+    QuestionRecord dựng trên thread (reload sau /add_question không chặn event loop) rồi đổi một lần.
+
+    Có snapshot (snapshot.py) cùng version với DB thì load chỉ mmap file: ids / tag_index là view
+    trên snapshot, QuestionRecord được dựng lần đầu get() rồi giữ lại. Thiếu hoặc cũ thì đọc SQLite.
+    """
+
+    def __init__(self, store, image_index=None, poll_interval=30, snapshot_file=None):
+        self.store = store
+        self.image_index = image_index
+        self.poll_interval = poll_interval
+        self.snapshot_file = snapshot_file
+        self.version = None
+        self.ids = ()
+        self.tag_index = {}
+        self._records = {}
+        self._snapshot = None
+        # Mỗi lúc một load: bản dựng xong trước không bị bản cũ hơn đè lên
+        self._loading = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._watcher = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, q_id):
+        record = self._records.get(q_id)
+        if record is None and self._snapshot is not None:
+            record = self._decode(self._snapshot, self._records, q_id)
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def correct_mask(self, q_id):
+        """Bitmask đáp án đúng cho chấm điểm; với snapshot đọc thẳng từ record, không dựng QuestionRecord."""
+        record = self._records.get(q_id)
+        if record is not None:
+            return record.correct_mask
+        if self._snapshot is not None:
+            return self._snapshot.correct_mask(q_id)
+        return None
+
+    def _record(self, row, options, tags, correct_mask=None):
+        return QuestionRecord(row, options, self.image_index, tags, correct_mask)
+
+    def _decode(self, snapshot, records, q_id):
+        # snapshot và records truyền vào cùng cặp: load() đổi cả hai thì bản decode cũ không lẫn vào bản mới
+        found = snapshot.row(q_id)
+        if found is None:
+            return None
+        record = records[q_id] = self._record(*found)
+        return record
+
+    def _build(self, rows, options, tags):
+        records = {}
+        tag_index = {}
+        for row in rows:
+            q_id = row['id']
+            q_tags = tags.get(q_id, ())
+            records[q_id] = self._record(row, options.get(q_id, {}), q_tags)
+            for tag in q_tags:
+                tag_index.setdefault(tag, []).append(q_id)
+        return records, {tag: tuple(ids) for tag, ids in tag_index.items()}
+
+    async def load(self):
+        async with self._loading:
+            if self.snapshot_file and await self._load_snapshot():
+                return
+            version, rows, options, tags = await self.store.catalog_rows()
+            loop = asyncio.get_running_loop()
+            records, tag_index = await loop.run_in_executor(None, self._build, rows, options, tags)
+            # Đổi tham chiếu một lần, reader không bao giờ thấy catalog dở dang
+            self._snapshot = None
+            self._records = records
+            self.ids = tuple(records)
+            self.tag_index = tag_index
+            self.version = version
+            logger.info("Catalog v%s: %d câu hỏi", version, len(records))
+
+    async def _load_snapshot(self):
+        loop = asyncio.get_running_loop()
+        snapshot, version = await asyncio.gather(loop.run_in_executor(None, open_snapshot, self.snapshot_file),
+                                                 self.store.catalog_version())
+        if snapshot is None:
+            return False
+        if snapshot.version != version:
+            logger.warning("Snapshot %s là catalog v%s, DB đang v%s: đọc từ SQLite (chạy lại snapshot.py)",
+                           self.snapshot_file, snapshot.version, version)
+            return False
+        # Snapshot cũ không close: còn đề đang bốc từ view của nó, mmap tự đóng khi hết tham chiếu
+        self._snapshot = snapshot
+        self._records = {}
+        self.ids = snapshot.ids
+        self.tag_index = snapshot.tag_index
+        self.version = version
+        logger.info("Catalog v%s: %d câu hỏi (snapshot %s)", version, len(snapshot), self.snapshot_file)
+        return True
+
+    async def refresh(self):
+        version = await self.store.catalog_version()
+        if version != self.version:
+            await self.load()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Catalog reload lỗi")
+
+    def start_watching(self):
+        self._watcher = asyncio.create_task(self._watch())
+
+    def stop_watching(self):
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
@@ -0,0 +1,39 @@
+import os
+
+from telegram import Update
+
+# Cấu hình từ biến môi trường
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')  # 'polling' hoặc 'webhook'
+
+# Webhook: Telegram gọi WEBHOOK_URL + WEBHOOK_PATH, ingress nghe ở WEBHOOK_LISTEN:WEBHOOK_PORT
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or None
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Giới hạn gửi tin toàn bot (msg/giây); Telegram mặc định ~30
+OUTBOUND_GLOBAL_RATE = float(os.environ.get('OUTBOUND_GLOBAL_RATE', '30'))
+
+# Số update xử lý song song
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', '64'))
+
+# Bot chỉ dùng message và callback query
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Số worker process; >1 thì update được chia theo user_id % WORKERS (xem workers.py)
+WORKERS = int(os.environ.get('WORKERS', '1'))
+# (index, count) của worker hiện tại, workers.py đặt trong process con; None = chạy một process
+SHARD = None
+
+# Mức log: DEBUG, INFO, WARNING...
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# Endpoint /metrics (Prometheus) chỉ nghe local; METRICS_PORT=0 để tắt.
+# Chạy nhiều worker: worker i nghe ở METRICS_PORT + i
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9108'))
+
+# Snapshot catalog (python snapshot.py); không có hoặc cũ hơn DB thì bot đọc SQLite. Rỗng để tắt
+SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE', 'quiz.snap')
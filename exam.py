@@ -0,0 +1,95 @@
+import heapq
+import math
+import random
+
+DEFAULT_EXAM_SIZE = 65
+
+
+def sample_question_ids(ids, k, seed):
+    """Chọn k ID từ index ID (tuple đã sort), O(k); cùng seed + cùng pool thì ra cùng đề."""
+    return random.Random(seed).sample(ids, k)
+
+
+def weighted_sample_ids(ids, k, seed, weight):
+    """k ID không lặp, xác suất theo weight(id) > 0 (Efraimidis-Spirakis: khóa u^(1/w), lấy k khóa lớn nhất).
+
+    O(n log k) vì phải xem cả pool; cùng seed + cùng trọng số thì ra cùng đề.
+    """
+    rng = random.Random(seed)
+    return heapq.nlargest(k, ids, key=lambda q_id: rng.random() ** (1 / weight(q_id)))
+
+
+def parse_blueprint(parts):
+    """['lambda:30', 'dynamodb:20%'] -> [(tag, phần trăm)]; ValueError nếu sai cú pháp hoặc tổng > 100."""
+    blueprint = []
+    for part in parts:
+        tag, _, share = part.partition(':')
+        share = float(share.rstrip('%'))
+        # float() nhận cả 'nan' / 'inf': nan lọt qua mọi phép so sánh
+        if not tag or not math.isfinite(share) or not 0 < share <= 100:
+            raise ValueError(part)
+        blueprint.append((tag.lower(), share))
+    if sum(share for _, share in blueprint) > 100:
+        raise ValueError('tổng phần trăm > 100')
+    return blueprint
+
+
+def blueprint_quotas(k, blueprint):
+    """Số câu mỗi tag theo phần trăm của k, làm tròn theo phần dư lớn nhất; phần còn lại bốc từ cả pool."""
+    exact = [k * share / 100 for _, share in blueprint]
+    quotas = [int(x) for x in exact]
+    # Tổng phần trăm = 100 thì chia hết k cho các tag; nhỏ hơn thì chỉ làm tròn phần đã hứa
+    target = round(sum(exact))
+    for i in sorted(range(len(exact)), key=lambda i: quotas[i] - exact[i])[:target - sum(quotas)]:
+        quotas[i] += 1
+    return [(tag, quota) for (tag, _), quota in zip(blueprint, quotas)]
+
+
+def _draw(rng, pool, k, chosen):
+    """k ID khác nhau từ pool (tuple), không trùng ID đã chọn (câu nhiều tag); thêm vào chosen.
+
+    Pool rộng hơn nhiều so với số câu cần: bốc ngẫu nhiên rồi bỏ trùng, O(k).
+    Pool hẹp: lọc một lượt rồi sample, trả về ít hơn k nếu tag không đủ câu.
+    """
+    if k <= 0:
+        return []
+    if len(pool) >= 2 * (k + len(chosen)):
+        picked = []
+        while len(picked) < k:
+            q_id = pool[rng.randrange(len(pool))]
+            if q_id not in chosen:
+                chosen.add(q_id)
+                picked.append(q_id)
+        return picked
+    rest = [q_id for q_id in pool if q_id not in chosen]
+    picked = rng.sample(rest, min(k, len(rest)))
+    chosen.update(picked)
+    return picked
+
+
+def blueprint_sample_ids(catalog, k, seed, blueprint):
+    """Đề k câu theo blueprint từ catalog.tag_index; tag thiếu câu thì bù từ cả pool. Trộn thứ tự câu."""
+    rng = random.Random(seed)
+    chosen = set()
+    ids = []
+    for tag, quota in blueprint_quotas(k, blueprint):
+        ids += _draw(rng, catalog.tag_index.get(tag, ()), quota, chosen)
+    ids += _draw(rng, catalog.ids, k - len(ids), chosen)
+    rng.shuffle(ids)
+    return ids
+
+
+def build_exam(catalog, k, seed=None, weight=None, blueprint=None):
+    """Trả về (seed, records) của đề k câu.
+
+    weight(id): bốc thiên về câu khó; blueprint: [(tag, phần trăm)] (parse_blueprint); không có thì bốc đều.
+    """
+    if seed is None:
+        seed = random.randrange(1_000_000)
+    if blueprint:
+        ids = blueprint_sample_ids(catalog, k, seed, blueprint)
+    elif weight is None:
+        ids = sample_question_ids(catalog.ids, k, seed)
+    else:
+        ids = weighted_sample_ids(catalog.ids, k, seed, weight)
+    return seed, [catalog.get(q_id) for q_id in ids]
@@ -0,0 +1,81 @@
+"""HTTP/1.1 server tối giản trên asyncio (keep-alive, Content-Length), không cần thư viện ngoài.
+
+handler(request) -> (status, content_type, body_bytes); request có method, path, headers, body.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+MAX_BODY = 10 * 1024 * 1024
+
+
+class Request:
+    __slots__ = ('method', 'path', 'headers', 'body')
+
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError('body quá lớn')
+    body = await reader.readexactly(length) if length else b''
+    return Request(method, path, headers, body)
+
+
+def _response(status, content_type, body, keep_alive):
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def start_server(handler, host, port):
+    """Trả về asyncio.Server; gọi server.close() + await server.wait_closed() để dừng."""
+
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, 'text/plain', b'bad request', False))
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                try:
+                    status, content_type, body = await handler(request)
+                except Exception:
+                    logger.exception("HTTP handler lỗi: %s %s", request.method, request.path)
+                    status, content_type, body = 500, 'text/plain', b'internal error'
+                writer.write(_response(status, content_type, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Server dừng giữa chừng (vd. long poll đang chờ): đóng kết nối, không log traceback
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port)
@@ -0,0 +1,199 @@
+"""Gửi hình câu hỏi qua Telegram: upload file trong images/ một lần, sau đó dùng lại file_id.
+
+Chạy trước để upload toàn bộ (tùy chọn): TOKEN=... python image_cache.py --chat <chat_id>
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Bot
+from telegram.error import BadRequest
+
+from migrations import migrate
+from question_store import connect
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = 'images'
+MANIFEST_FILE = os.path.join(IMAGES_DIR, 'manifest.json')
+MANIFEST_VERSION = 1
+
+# Bảng do migrations.py tạo (v10); chạy migrate trước khi mở backend
+SAVE_SQL = '''
+    INSERT INTO image_file_ids (path, file_id, uploaded_at) VALUES (?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET file_id = excluded.file_id, uploaded_at = excluded.uploaded_at
+'''
+LOAD_SQL = 'SELECT path, file_id FROM image_file_ids'
+FORGET_SQL = 'DELETE FROM image_file_ids WHERE path = ?'
+
+
+def local_path(url, index=None):
+    """URL GitHub raw (hoặc path tương đối) -> path trong images/; có index manifest thì lấy bản đã nén."""
+    name = url.rsplit('/', 1)[-1]
+    if index is not None and name in index:
+        return index[name]
+    return os.path.join(IMAGES_DIR, name)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Đọc manifest của prepare_images.py -> index {tên file gốc: path bản đã nén}.
+
+    Tra theo tên file trong image_url của từng câu, không theo số trong tên file: ID câu trong DB
+    khác số câu của ngân hàng khi import nhiều file. Trả về None nếu chưa có manifest.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        logger.warning("Manifest %s version %s không hỗ trợ, bỏ qua", path, manifest.get('version'))
+        return None
+    base = os.path.dirname(path)
+    index = {}
+    for entry in manifest['images']:
+        index[entry['source']] = os.path.join(base, entry['file'])
+    return index
+
+
+class TelegramImageBackend:
+    """Gửi ảnh qua Bot API; photo là file object (lần đầu) hoặc file_id (các lần sau)."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        message = await self.bot.send_photo(chat_id, photo=photo, caption=caption)
+        return message.photo[-1].file_id
+
+
+class LocalImageBackend:
+    """Backend giả lập offline: file_id là hash nội dung, ghi lại mọi lần gửi để kiểm tra.
+
+    file_id trong expired bị từ chối như Telegram từ chối file_id hết hạn.
+    """
+
+    def __init__(self):
+        self.uploads = 0
+        self.sent = []
+        self.expired = set()
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        if hasattr(photo, 'read'):
+            self.uploads += 1
+            file_id = 'local-' + hashlib.sha1(photo.read()).hexdigest()
+        elif photo in self.expired:
+            raise BadRequest('Wrong file identifier/http url specified')
+        else:
+            file_id = photo
+        self.sent.append((chat_id, file_id, caption))
+        return file_id
+
+
+class ImageCache:
+    """Map path ảnh -> Telegram file_id, giữ trong RAM và lưu bảng image_file_ids."""
+
+    def __init__(self, db_file, backend=None):
+        self.backend = backend
+        self._file_ids = {}
+        self._locks = {}
+        self.uploads = 0
+        self.reuses = 0
+        self._conn = connect(db_file)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-cache')
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self._executor, lambda: self._conn.execute(LOAD_SQL).fetchall())
+        self._file_ids = dict(rows)
+        logger.info("Image cache: %d file_id", len(self._file_ids))
+
+    def _save(self, path, file_id):
+        with self._conn:
+            self._conn.execute(SAVE_SQL, (path, file_id, time.time()))
+
+    def _forget(self, path):
+        with self._conn:
+            self._conn.execute(FORGET_SQL, (path,))
+
+    async def send(self, chat_id, path, caption=None):
+        """Gửi ảnh, trả về file_id; None nếu file không đọc được (bỏ qua ảnh đó, không làm hỏng câu hỏi)."""
+        file_id = self._file_ids.get(path)
+        loop = asyncio.get_running_loop()
+        if file_id is not None:
+            try:
+                await self.backend.send_photo(chat_id, file_id, caption)
+                self.reuses += 1
+                return file_id
+            except BadRequest:
+                # file_id hết hạn/không hợp lệ -> upload lại; lỗi mạng / RetryAfter thì để người gọi xử lý
+                logger.warning("file_id cho %s không dùng được, upload lại", path)
+                self._file_ids.pop(path, None)
+                await loop.run_in_executor(self._executor, self._forget, path)
+
+        # Khóa theo path để nhiều user cùng lúc chỉ gây một lần upload
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            file_id = self._file_ids.get(path)
+            if file_id is not None:
+                await self.backend.send_photo(chat_id, file_id, caption)
+                self.reuses += 1
+                return file_id
+            try:
+                f = open(path, 'rb')
+            except OSError as exc:
+                logger.warning("Không đọc được ảnh %s, bỏ qua: %s", path, exc)
+                return None
+            with f:
+                file_id = await self.backend.send_photo(chat_id, f, caption)
+            self.uploads += 1
+            self._file_ids[path] = file_id
+            await loop.run_in_executor(self._executor, self._save, path, file_id)
+            return file_id
+
+    async def send_question_images(self, chat_id, q):
+        """Gửi hình chung trước, rồi hình theo từng đáp án."""
+        for key in sorted(q.image_paths, key=lambda k: (k != 'general', k)):
+            caption = f"Câu {q.id} - hình chung" if key == 'general' else f"Câu {q.id} - hình {key}"
+            await self.send(chat_id, q.image_paths[key], caption)
+
+    async def upload_all(self, chat_id, images_dir=IMAGES_DIR):
+        index = load_manifest(os.path.join(images_dir, os.path.basename(MANIFEST_FILE)))
+        if index is not None:
+            paths = sorted(set(index.values()))
+        else:
+            paths = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))]
+        for path in paths:
+            if os.path.isfile(path) and path not in self._file_ids:
+                await self.send(chat_id, path, caption=os.path.basename(path))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+async def _upload_main(db_file, chat_id):
+    migrate(db_file)
+    cache = ImageCache(db_file)
+    await cache.load()
+    async with Bot(os.environ['TOKEN']) as bot:
+        cache.backend = TelegramImageBackend(bot)
+        await cache.upload_all(chat_id)
+    print(f"Upload {cache.uploads} ảnh, {len(cache)} file_id trong cache.")
+    cache.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upload trước toàn bộ images/ và lưu file_id')
+    parser.add_argument('--db', default='quiz.db')
+    parser.add_argument('--chat', type=int, required=True, help='chat_id nhận ảnh upload (vd: chat riêng của admin)')
+    args = parser.parse_args()
+    asyncio.run(_upload_main(args.db, args.chat))
@@ -1,124 +1,332 @@
-import sqlite3
+import argparse
+import glob
+import itertools
+import os
 import re
 import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from migrations import migrate
+from question_store import (INSERT_OPTION_SQL, answer_key_error, bump_catalog_version, connect, content_hash, defer_search_index,
+                            index_new_questions, tag_questions)
+from tagging import auto_tags, normalize_tag
 
 DB_FILE = 'quiz.db'
 GITHUB_RAW_BASE = 'https://raw.githubusercontent.com/runkwell/telegram-quiz-bot/main'
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question_text TEXT NOT NULL,
-            image_url TEXT,
-            option_a TEXT,
-            option_b TEXT,
-            option_c TEXT,
-            option_d TEXT,
-            option_e TEXT,
-            option_f TEXT,
-            option_g TEXT,
-            num_options INTEGER DEFAULT 4,
-            correct_answers TEXT DEFAULT ''
-        )
-    ''')
-    conn.commit()
-    conn.close()
+INSERT_NEW_SQL = '''
+    INSERT INTO questions (question_text, image_url, num_options, correct_answers, content_hash, explanation)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(content_hash) DO NOTHING
+'''
+UPDATE_SQL = '''
+    UPDATE questions SET image_url = ?, num_options = ?, correct_answers = ?, explanation = ?
+    WHERE content_hash = ?
+'''
+DELETE_TAGS_SQL = 'DELETE FROM question_tags WHERE question_id = ?'
+
+BATCH_SIZE = 500
+PROGRESS_EVERY = 5000
+
+SEPARATOR_RE = re.compile(r'^\s*-{20,}\s*$')
+IMAGE_RE = re.compile(r'!\[([^\]]+)\]\(images/([^\)]+\.jpe?g)\)')
+IMAGE_CLEAN_RE = re.compile(r'!\[[^\]]+\]\(images/[^\)]+\)')
+QUESTION_RE = re.compile(r'(\d+\.\s+.+?)(?=\n\n|\n-{2,}|\Z)', re.DOTALL)
+OPTION_RE = re.compile(r'-\s+\[([x ])\]\s+(.+)')
+# Chủ đề ghi tay: dòng "Tags: lambda, s3" (hoặc "Chủ đề:") ở bất kỳ đâu trong block
+TAGS_RE = re.compile(r'^\s*(?:Tags|Chủ đề)\s*:\s*(.*)$\n?', re.MULTILINE | re.IGNORECASE)
+# Giải thích đáp án: từ dòng "Explanation:" (hoặc "Giải thích:") sau các option tới hết block
+EXPLANATION_RE = re.compile(r'^\s*(?:Explanation|Giải thích)\s*:\s*', re.MULTILINE | re.IGNORECASE)
+
+class InvalidQuestion(ValueError):
+    """Block đúng định dạng câu hỏi nhưng đáp án không dùng được; báo lại thay vì bỏ qua im lặng."""
+
+def iter_blocks(lines):
+    """Gom từng dòng thành block câu hỏi, tách bởi dòng '-----...' (>= 20 dấu -)."""
+    block = []
+    for line in lines:
+        if SEPARATOR_RE.match(line):
+            if block:
+                yield ''.join(block)
+                block = []
+        else:
+            block.append(line)
+    if block:
+        yield ''.join(block)
+
+def iter_questions(lines, rejected=None, auto_tag=True):
+    """Generator record câu hỏi; đọc file theo dòng nên bộ nhớ không phụ thuộc kích thước file.
 
-def parse_and_insert_questions(filename='pasted-text.txt', update_existing=False, reset_images=False):
-    init_db()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    Câu có đáp án hỏng được bỏ qua và ghi (đầu câu hỏi, lỗi) vào rejected.
+    """
+    for block in iter_blocks(lines):
+        try:
+            values = parse_block(block, auto_tag)
+        except InvalidQuestion as exc:
+            if rejected is not None:
+                rejected.append(exc.args)
+            continue
+        if values:
+            yield values
+
+def parse_block(block, auto_tag=True):
+    """Parse một block câu hỏi -> (text, image_url, num_options, đáp án, content_hash, giải thích, options, tags).
+
+    tags: dòng "Tags:" cộng tag tự động theo từ khóa trong đề (tagging.py) nếu auto_tag.
+
+    None nếu block không phải câu hỏi; InvalidQuestion nếu đáp án không khớp các option.
+    """
+    block = block.strip()
+    if not block or len(block) < 100:
+        return None
     
-    if reset_images:
-        cursor.execute("UPDATE questions SET image_url = NULL")
-        print("Đã reset tất cả image_url về NULL.")
+    # Parse TẤT CẢ images
+    image_matches = IMAGE_RE.findall(block)
+    images_json = [f"{GITHUB_RAW_BASE}/images/{filename}" for alt, filename in image_matches]
+    image_url_json = json.dumps(images_json) if images_json else None
     
-    with open(filename, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # Clean block
+    clean_block = IMAGE_CLEAN_RE.sub('', block)
     
-    questions_blocks = re.split(r'-{20,}', content)
+    tags = []
+    for t_match in TAGS_RE.finditer(clean_block):
+        tags += [normalize_tag(name) for name in t_match.group(1).split(',')]
+    clean_block = TAGS_RE.sub('', clean_block)
     
-    inserted_count = 0
-    updated_count = 0
-    for block in questions_blocks:
-        block = block.strip()
-        if not block or len(block) < 100:
-            continue
-        
-        # Parse TẤT CẢ images
-        image_matches = re.findall(r'!\[([^\]]+)\]\(images/([^\)]+\.jpg)\)', block)
-        images_json = []  # Array [urlA, urlB, ...]
-        if image_matches:
-            for alt, filename in image_matches:
-                raw_url = f"{GITHUB_RAW_BASE}/images/{filename}"
-                images_json.append(raw_url)
-                print(f"Found image for alt '{alt}': {raw_url}")
-        
-        image_url_json = json.dumps(images_json) if images_json else None
-        
-        # Clean block
-        clean_block = re.sub(r'!\[[^\]]+\]\(images/[^\)]+\)', '', block)
-        
-        # Tách question_text
-        q_match = re.match(r'(\d+\.\s+.+?)(?=\n\n|\n-{2,}|\Z)', clean_block, re.DOTALL)
-        if not q_match:
-            continue
-        question_text = q_match.group(1).strip()
-        
-        # Parse options
-        options_lines = re.findall(r'-\s+\[([x ])\]\s+(.+)', clean_block)
-        if len(options_lines) < 2:
-            continue
-        
-        options = {}
-        correct = []
-        num_options = len(options_lines)
-        
-        for i, (mark, text) in enumerate(options_lines, 1):
-            opt_key = chr(ord('A') + i - 1)
-            options[opt_key] = text.strip()
-            if mark == 'x':
-                correct.append(opt_key)
-        
-        correct_str = ','.join(correct) if len(correct) > 1 else correct[0] if correct else ''
-        
-        # Check duplicate/update
-        cursor.execute("SELECT id FROM questions WHERE question_text LIKE ?", (f"%{question_text[:50]}%",))
-        existing = cursor.fetchone()
-        if existing:
-            if update_existing:
-                cursor.execute('''
-                    UPDATE questions SET image_url = ?, num_options = ?, correct_answers = ?
-                    WHERE id = ?
-                ''', (image_url_json, num_options, correct_str, existing[0]))
-                if image_url_json:
-                    updated_count += 1
-                    print(f"Updated images JSON for: {question_text[:50]}... → {len(images_json)} images")
-            else:
-                print(f"Skip duplicate: {question_text[:50]}...")
-            continue
-        
-        # Insert mới
-        values = (
-            question_text, image_url_json,
-            options.get('A', ''), options.get('B', ''), options.get('C', ''), options.get('D', ''),
-            options.get('E', ''), options.get('F', ''), options.get('G', ''),
-            num_options, correct_str
-        )
-        cursor.execute('''
-            INSERT INTO questions (question_text, image_url, option_a, option_b, option_c, option_d, 
-                                  option_e, option_f, option_g, num_options, correct_answers)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', values)
-        inserted_count += 1
-        print(f"Inserted: {question_text[:50]}... (correct: {correct_str}, images: {len(images_json)})")
-    
-    conn.commit()
+    # Tách giải thích trước để option trong đó (nếu có) không bị tính
+    explanation = None
+    e_match = EXPLANATION_RE.search(clean_block)
+    if e_match:
+        explanation = clean_block[e_match.end():].strip() or None
+        clean_block = clean_block[:e_match.start()]
+    
+    # Tách question_text
+    q_match = QUESTION_RE.match(clean_block)
+    if not q_match:
+        return None
+    question_text = q_match.group(1).strip()
+    
+    # Parse options
+    options_lines = OPTION_RE.findall(clean_block)
+    # Schema giữ tối đa 7 option (A-G)
+    if not 2 <= len(options_lines) <= 7:
+        return None
+    
+    options = {}
+    correct = []
+    num_options = len(options_lines)
+    
+    for i, (mark, text) in enumerate(options_lines, 1):
+        opt_key = chr(ord('A') + i - 1)
+        options[opt_key] = text.strip()
+        if mark == 'x':
+            correct.append(opt_key)
+    
+    correct_str = ','.join(correct) if len(correct) > 1 else correct[0] if correct else ''
+    option_values = tuple(options.values())
+    
+    error = answer_key_error(num_options, correct_str)
+    if error is None and not all(option_values):
+        error = "có option rỗng"
+    if error:
+        raise InvalidQuestion(question_text.split('\n', 1)[0][:60], error)
+    
+    if auto_tag:
+        tags += auto_tags(question_text)
+    tags = tuple(sorted({tag for tag in tags if tag}))
+    
+    return (question_text, image_url_json, num_options, correct_str,
+            content_hash(question_text, option_values), explanation, option_values, tags)
+
+class ImportStats:
+    def __init__(self, label):
+        self.label = label
+        self.parsed = self.inserted = self.updated = self.skipped = self.invalid = 0
+        self.started = time.perf_counter()
+    
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.parsed / elapsed if elapsed > 0 else 0.0
+    
+    def progress(self):
+        print(f"{self.label}: {self.parsed} câu ({self.rate():.0f} câu/s)")
+    
+    def reject(self, rejected):
+        self.invalid += len(rejected)
+        for head, error in rejected:
+            print(f"{self.label}: bỏ qua '{head}': {error}")
+    
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.label}: parse {self.parsed}, insert {self.inserted}, update {self.updated}, "
+                f"bỏ qua trùng {self.skipped}, lỗi đáp án {self.invalid} trong {elapsed:.2f}s ({self.rate():.0f} câu/s)")
+
+def write_batch(conn, batch, update_existing, stats):
+    """Ghi một lô: tra hash đã có bằng unique index, executemany câu mới + option của chúng, update câu cũ, gắn tag."""
+    hashes = [values[4] for values in batch]
+    placeholders = ','.join('?' * len(hashes))
+    existing = {row[0] for row in conn.execute(
+        f"SELECT content_hash FROM questions WHERE content_hash IN ({placeholders})", hashes)}
+    new, to_update = [], []
+    for values in batch:
+        question_text, image_url, num_options, correct_str, digest, explanation, options, tags = values
+        if digest in existing:
+            if not update_existing:
+                stats.skipped += 1
+                continue
+            stats.updated += 1
+            to_update.append(values)
+        else:
+            existing.add(digest)
+            stats.inserted += 1
+            new.append(values)
+    if not new and not to_update:
+        return
+    if new:
+        conn.executemany(INSERT_NEW_SQL, [values[:6] for values in new])
+    # executemany không trả id: tra lại theo hash (unique index) để ghi option và tag
+    written = new + to_update
+    written_hashes = [values[4] for values in written]
+    ids = dict(conn.execute(f"SELECT content_hash, id FROM questions WHERE content_hash IN "
+                            f"({','.join('?' * len(written_hashes))})", written_hashes).fetchall())
+    conn.executemany(INSERT_OPTION_SQL, [(ids[values[4]], i, text) for values in new
+                                         for i, text in enumerate(values[6]) if text])
+    # Hash gồm cả text option nên câu đã có chỉ đổi được hình/đáp án/giải thích/tag
+    conn.executemany(UPDATE_SQL, [(*values[1:4], values[5], values[4]) for values in to_update])
+    if to_update:
+        conn.executemany(DELETE_TAGS_SQL, [(ids[values[4]],) for values in to_update])
+    tag_questions(conn, [(ids[values[4]], tag) for values in written for tag in values[7]])
+
+def import_records(conn, records, update_existing, stats):
+    batch = []
+    for values in records:
+        batch.append(values)
+        stats.parsed += 1
+        if len(batch) >= BATCH_SIZE:
+            write_batch(conn, batch, update_existing, stats)
+            batch = []
+        if stats.parsed % PROGRESS_EVERY == 0:
+            stats.progress()
+    if batch:
+        write_batch(conn, batch, update_existing, stats)
+
+def parse_file(filename, auto_tag=True):
+    """Chạy trong worker process: parse cả một file, trả về (records, câu bị loại, thời gian parse)."""
+    started = time.perf_counter()
+    rejected = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        records = list(iter_questions(f, rejected, auto_tag))
+    return records, rejected, time.perf_counter() - started
+
+def expand_paths(patterns):
+    """Nhận file, thư mục (lấy *.txt, *.md) hoặc glob; trả về danh sách file theo thứ tự ổn định."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = [p for ext in ('*.txt', '*.md') for p in glob.glob(os.path.join(pattern, ext))]
+        elif glob.has_magic(pattern):
+            found = glob.glob(pattern)
+        else:
+            found = [pattern]
+        paths.extend(sorted(found))
+    return list(dict.fromkeys(paths))
+
+def open_import(reset_images):
+    migrate(DB_FILE)
+    conn = connect(DB_FILE)
+    # Index FTS một lần lúc close_import thay vì qua trigger cho từng câu/option
+    indexed_upto = defer_search_index(conn)
+    if reset_images:
+        conn.execute("UPDATE questions SET image_url = NULL")
+    return conn, indexed_upto
+
+def close_import(conn, indexed_upto, dry_run, reset_images):
+    # Một transaction duy nhất; dry-run chạy y hệt rồi rollback
+    if dry_run:
+        conn.rollback()
+    else:
+        index_new_questions(conn, indexed_upto)
+        # Báo cho bot đang chạy reload catalog
+        bump_catalog_version(conn)
+        conn.commit()
     conn.close()
-    print(f"\nHoàn tất! Insert {inserted_count}, update {updated_count}.")
+    if reset_images:
+        print(f"{'[dry-run] ' if dry_run else ''}Reset tất cả image_url về NULL.")
+
+def parse_and_insert_questions(filename='pasted-text.txt', update_existing=False, reset_images=False, dry_run=False,
+                               auto_tag=True):
+    conn, indexed_upto = open_import(reset_images)
+    stats = ImportStats(filename)
+    try:
+        rejected = []
+        with open(filename, 'r', encoding='utf-8') as f:
+            import_records(conn, iter_questions(f, rejected, auto_tag), update_existing, stats)
+        stats.reject(rejected)
+    except BaseException:
+        conn.rollback()
+        conn.close()
+        raise
+    close_import(conn, indexed_upto, dry_run, reset_images)
+    print(f"\n{'[dry-run] ' if dry_run else ''}Hoàn tất! {stats.summary()}")
+
+def import_many(filenames, update_existing=False, reset_images=False, dry_run=False, workers=None, auto_tag=True):
+    """Parse nhiều file song song bằng process pool, một writer duy nhất ghi theo đúng thứ tự file."""
+    workers = workers or os.cpu_count() or 1
+    conn, indexed_upto = open_import(reset_images)
+    started = time.perf_counter()
+    all_stats = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Giới hạn số file đã parse xong mà chưa ghi, để bộ nhớ không phình
+            max_pending = workers + 1
+            pending = deque()
+            paths = iter(filenames)
+            for path in itertools.islice(paths, max_pending):
+                pending.append((path, executor.submit(parse_file, path, auto_tag)))
+            while pending:
+                path, future = pending.popleft()
+                records, rejected, parse_seconds = future.result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(parse_file, next_path, auto_tag)))
+                stats = ImportStats(path)
+                import_records(conn, records, update_existing, stats)
+                stats.reject(rejected)
+                print(f"{stats.summary()} | parse {parse_seconds:.2f}s")
+                all_stats.append(stats)
+    except BaseException:
+        conn.rollback()
+        conn.close()
+        raise
+    close_import(conn, indexed_upto, dry_run, reset_images)
+    
+    elapsed = time.perf_counter() - started
+    total = sum(st.parsed for st in all_stats)
+    print(f"\n{'[dry-run] ' if dry_run else ''}Hoàn tất {len(all_stats)} file: parse {total}, "
+          f"insert {sum(st.inserted for st in all_stats)}, update {sum(st.updated for st in all_stats)}, "
+          f"bỏ qua trùng {sum(st.skipped for st in all_stats)}, lỗi đáp án {sum(st.invalid for st in all_stats)} "
+          f"trong {elapsed:.2f}s "
+          f"({total / elapsed if elapsed > 0 else 0:.0f} câu/s)")
 
 if __name__ == '__main__':
-    parse_and_insert_questions(update_existing=True, reset_images=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Import ngân hàng câu hỏi (định dạng pasted-text.txt) vào quiz.db')
+    parser.add_argument('filenames', nargs='*', default=['pasted-text.txt'],
+                        help='file, thư mục hoặc glob (vd: "banks/*.txt")')
+    parser.add_argument('--update-existing', action=argparse.BooleanOptionalAction, default=True,
+                        help='cập nhật image/đáp án/giải thích cho câu đã có (mặc định: có)')
+    parser.add_argument('--reset-images', action=argparse.BooleanOptionalAction, default=True,
+                        help='reset image_url về NULL trước khi import (mặc định: có)')
+    parser.add_argument('--dry-run', action='store_true', help='chạy thử trong transaction rồi rollback, chỉ báo cáo')
+    parser.add_argument('--workers', type=int, default=None, help='số process parse (mặc định: số core)')
+    parser.add_argument('--auto-tag', action=argparse.BooleanOptionalAction, default=True,
+                        help='gắn tag theo từ khóa trong đề bài, cộng với dòng "Tags:" (mặc định: có)')
+    args = parser.parse_args()
+    
+    paths = expand_paths(args.filenames)
+    if len(paths) == 1:
+        parse_and_insert_questions(paths[0], update_existing=args.update_existing,
+                                   reset_images=args.reset_images, dry_run=args.dry_run, auto_tag=args.auto_tag)
+    else:
+        import_many(paths, update_existing=args.update_existing, reset_images=args.reset_images,
+                    dry_run=args.dry_run, workers=args.workers, auto_tag=args.auto_tag)
@@ -0,0 +1,107 @@
+"""Ingress cho chế độ webhook: HTTP server riêng nhận update từ Telegram.
+
+Update (dict JSON) được chuyển cho sink: update_queue của Application (một process)
+hoặc ShardRouter (nhiều worker, xem workers.py).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+from http_server import start_server
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+def application_sink(application):
+    async def sink(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    return sink
+
+
+class WebhookIngress:
+    def __init__(self, sink, path='/telegram', secret_token=None, host='0.0.0.0', port=8443):
+        """sink: coroutine function nhận dict update; xem application_sink."""
+        self.sink = sink
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.rejected = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await start_server(self.handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Webhook ingress nghe ở %s:%s%s", self.host, self.port, self.path)
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle(self, request):
+        if request.method == 'GET' and request.path == '/healthz':
+            return 200, 'text/plain', b'ok'
+        if request.path != self.path:
+            return 404, 'text/plain', b'not found'
+        if request.method != 'POST':
+            return 405, 'text/plain', b'method not allowed'
+        if self.secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            self.rejected += 1
+            return 403, 'text/plain', b'forbidden'
+        try:
+            data = json.loads(request.body)
+            if not isinstance(data, dict) or 'update_id' not in data:
+                raise ValueError('không phải update')
+        except ValueError:
+            self.rejected += 1
+            return 400, 'text/plain', b'bad update'
+        # Trả 200 ngay, update được xử lý song song phía sau
+        await self.sink(data)
+        self.received += 1
+        return 200, 'application/json', b'{}'
+
+
+def stop_event():
+    """Event được set khi nhận SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def run_webhook(application, url, path, listen, port, secret_token=None, allowed_updates=None,
+                      max_connections=40):
+    """Chạy bot ở chế độ webhook tới khi nhận SIGINT/SIGTERM."""
+    stop = stop_event()
+
+    await application.initialize()
+    # run_polling/run_webhook của PTB tự gọi post_init/post_shutdown; ở đây phải gọi tay
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    ingress = await WebhookIngress(application_sink(application), path, secret_token, listen, port).start()
+    try:
+        await application.bot.set_webhook(
+            url=url.rstrip('/') + path,
+            allowed_updates=allowed_updates,
+            secret_token=secret_token,
+            max_connections=max_connections,
+        )
+        await stop.wait()
+    finally:
+        await ingress.stop()
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
@@ -0,0 +1,168 @@
+"""Live exam trong group: host đẩy từng câu một lần vào chat, cả nhóm bấm đáp án trên cùng message.
+
+Mỗi lần bấm chỉ sửa một byte trong RAM rồi answerCallbackQuery; message câu hỏi được sửa theo lô
+(số người đã trả lời) tối đa một lần mỗi REFRESH_INTERVAL giây vì group chỉ được ~20 tin/phút.
+Đẩy / đóng câu giữ exam.lock; refresh bỏ lượt khi lock đang bị giữ nên không bao giờ sửa đè
+lên message câu đã đóng.
+Chấm khi host chuyển câu; bảng xếp hạng cập nhật tăng dần nên không phải chấm lại cả đề.
+"""
+import asyncio
+import logging
+from bisect import bisect_left, insort
+
+from telegram.error import BadRequest
+
+from callback_data import new_nonce
+from catalog import mask_to_letters
+
+logger = logging.getLogger(__name__)
+
+# group: ~20 tin/phút cho cả chat (outbound.group_rate); refresh dùng ~6, phần còn lại cho
+# câu mới, edit đóng câu và hình
+REFRESH_INTERVAL = 10.0
+LEADERBOARD_SIZE = 10
+
+
+class Leaderboard:
+    """Điểm từng người + danh sách (-điểm, user_id) luôn đã sort; cộng điểm = bisect xóa + insort."""
+
+    def __init__(self):
+        self._scores = {}
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, user_id, points):
+        old = self._scores.get(user_id)
+        if old is not None:
+            if not points:
+                return
+            del self._entries[bisect_left(self._entries, (-old, user_id))]
+        new = (old or 0) + points
+        self._scores[user_id] = new
+        insort(self._entries, (-new, user_id))
+
+    def score(self, user_id):
+        return self._scores.get(user_id, 0)
+
+    def rank(self, user_id):
+        """Hạng kiểu thi đấu (đồng điểm cùng hạng), từ 1."""
+        return bisect_left(self._entries, (-self._scores[user_id],)) + 1
+
+    def top(self, k=None):
+        """[(user_id, điểm)] từ cao xuống thấp."""
+        entries = self._entries if k is None else self._entries[:k]
+        return [(user_id, -neg) for neg, user_id in entries]
+
+
+class LiveExam:
+    """Trạng thái một live exam: câu đang mở, bitmask đáp án của từng người, bảng xếp hạng."""
+
+    def __init__(self, chat_id, host_id, question_ids, seed=None):
+        self.chat_id = chat_id
+        self.host_id = host_id
+        self.question_ids = list(question_ids)
+        self.seed = seed
+        self.nonce = new_nonce()    # gắn vào callback_data, nút của live exam trước bị từ chối
+        self.cursor = -1            # chưa đẩy câu nào
+        self.answers = {}           # user_id -> bytearray, byte i = mask câu i
+        self.names = {}
+        self.leaderboard = Leaderboard()
+        self.message_id = None      # message câu đang mở
+        self.text = None
+        self.reply_markup = None
+        self.answered = 0           # số người đã chọn ở câu đang mở
+        self.dirty = False
+        self.refresher = None
+        # Giữ khi đẩy / đóng câu, kết thúc exam
+        self.lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def open(self, message_id, text, reply_markup):
+        self.message_id = message_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.answered = 0
+        self.dirty = False
+
+    def answer(self, user_id, name, idx, bit, is_multiple):
+        """Ghi một lần bấm; trả về mask mới, None nếu câu idx đã đóng."""
+        if idx != self.cursor or self.message_id is None:
+            return None
+        row = self.answers.get(user_id)
+        if row is None:
+            row = self.answers[user_id] = bytearray(len(self.question_ids))
+            self.leaderboard.add(user_id, 0)
+        self.names[user_id] = name
+        before = row[idx]
+        row[idx] = before ^ bit if is_multiple else (0 if before == bit else bit)
+        self.answered += bool(row[idx]) - bool(before)
+        self.dirty = True
+        return row[idx]
+
+    def close_question(self, correct_mask):
+        """Chấm câu đang mở cho mọi người (STRICT), cộng vào leaderboard; trả về số người đúng."""
+        idx = self.cursor
+        right = 0
+        for user_id, row in self.answers.items():
+            if row[idx] and row[idx] == correct_mask:
+                self.leaderboard.add(user_id, 1)
+                right += 1
+        self.message_id = None
+        return right
+
+    def status_text(self):
+        return f"{self.text}\n\n👥 {self.answered} người đã trả lời"
+
+    def leaderboard_text(self):
+        lines = [f"🏆 Kết quả live exam ({len(self)} câu, {len(self.leaderboard)} người):"]
+        for user_id, score in self.leaderboard.top(LEADERBOARD_SIZE):
+            lines.append(f"{self.leaderboard.rank(user_id)}. {self.names.get(user_id, user_id)}: {score}/{len(self)}")
+        return '\n'.join(lines)
+
+    def result_text(self, user_id, title):
+        score = self.leaderboard.score(user_id)
+        return (f"Kết quả live exam ở {title}: {score}/{len(self)} câu đúng, "
+                f"hạng {self.leaderboard.rank(user_id)}/{len(self.leaderboard)}.")
+
+    def picked(self, user_id):
+        row = self.answers.get(user_id)
+        return ', '.join(mask_to_letters(row[self.cursor])) if row and row[self.cursor] else 'chưa chọn'
+
+
+async def refresh_loop(bot, exam, interval=REFRESH_INTERVAL):
+    """Gộp các lần bấm: sửa message câu đang mở (đếm người trả lời) tối đa một lần mỗi interval."""
+    while True:
+        await asyncio.sleep(interval)
+        # Host đang chuyển câu: message sắp đóng, bỏ lượt này
+        if not exam.dirty or exam.message_id is None or exam.lock.locked():
+            continue
+        async with exam.lock:
+            exam.dirty = False
+            try:
+                await bot.edit_message_text(exam.status_text(), chat_id=exam.chat_id, message_id=exam.message_id,
+                                            reply_markup=exam.reply_markup, parse_mode='Markdown')
+            except BadRequest as e:
+                if 'not modified' not in str(e).lower():
+                    logger.warning("Không cập nhật được câu live exam ở %s: %s", exam.chat_id, e)
+            except Exception:
+                logger.exception("Cập nhật live exam lỗi")
+
+
+async def send_results(bot, exam, title, priority):
+    """Gửi kết quả riêng cho từng người theo thứ tự hạng, ưu tiên thấp để không chặn tin tương tác.
+
+    Bộ lập lịch gửi (outbound) tự giãn các tin theo giới hạn toàn bot; người chưa từng /start
+    bot thì Telegram từ chối, chỉ đếm lại.
+    """
+    async def send(user_id):
+        await bot.send_message(user_id, exam.result_text(user_id, title), rate_limit_args=priority)
+
+    participants = [user_id for user_id, _ in exam.leaderboard.top()]
+    results = await asyncio.gather(*(send(user_id) for user_id in participants), return_exceptions=True)
+    failed = sum(isinstance(r, Exception) for r in results)
+    logger.info("Live exam %s: gửi kết quả %d/%d người", exam.chat_id, len(results) - failed, len(results))
+    return failed
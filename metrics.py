@@ -0,0 +1,177 @@
+"""Metric trong process (Counter/Gauge/Histogram) và endpoint /metrics dạng text của Prometheus.
+
+Không cần thư viện ngoài; cập nhật metric chỉ là cộng số trong dict nên dùng được ở hot path.
+Metric có thể lấy giá trị từ hàm (fn=...) để đọc bộ đếm sẵn có mà không tốn gì lúc chạy.
+"""
+import bisect
+import functools
+import logging
+import time
+
+from http_server import start_server
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Giây; đủ cho cả handler (ms) lẫn call Bot API (giây)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames) if self.labelnames else ()
+
+    def samples(self):
+        """[(tên, nhãn đã format, giá trị)]"""
+        if self.fn is not None:
+            value = self.fn()
+            if isinstance(value, dict):
+                return [(self.name, _format_labels(self.labelnames, k if isinstance(k, tuple) else (k,)), v)
+                        for k, v in value.items()]
+            return [(self.name, '', value)]
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{name}{labels} {_format_value(value)}' for name, labels, value in self.samples()]
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # [đếm theo bucket (không cộng dồn)..., +Inf] + tổng
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        result = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                result.append((self.name + '_bucket', _format_labels(self.labelnames, key, [('le', le)]), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            result.append((self.name + '_sum', labels, total))
+            result.append((self.name + '_count', labels, cumulative))
+        return result
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        try:
+            lines += metric.render()
+        except Exception:
+            logger.exception("Không đọc được metric %s", metric.name)
+    return '\n'.join(lines) + '\n'
+
+
+# Metric dùng chung giữa các module
+HANDLER_SECONDS = Histogram('quiz_handler_seconds', 'Thời gian xử lý update theo handler', ['handler'])
+HANDLER_ERRORS = Counter('quiz_handler_errors_total', 'Số lần handler ném exception', ['handler'])
+DB_SECONDS = Histogram('quiz_db_seconds', 'Thời gian thao tác DB', ['op'])
+API_CALLS = Counter('quiz_telegram_api_calls_total', 'Số call Bot API', ['method'])
+API_ERRORS = Counter('quiz_telegram_api_errors_total', 'Số call Bot API lỗi', ['method', 'error'])
+API_SECONDS = Histogram('quiz_telegram_api_seconds', 'Thời gian call Bot API (không tính chờ hàng đợi)', ['method'])
+
+
+def instrument(handler):
+    """Decorator cho handler PTB: đo thời gian và đếm lỗi theo tên handler."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler(update, context, *args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+
+    return wrapper
+
+
+async def _handle(request):
+    if request.method == 'GET' and request.path == '/metrics':
+        return 200, CONTENT_TYPE, render().encode()
+    return 404, 'text/plain', b'not found'
+
+
+async def serve(host='127.0.0.1', port=9108):
+    """Mở endpoint http://host:port/metrics; trả về asyncio.Server."""
+    server = await start_server(_handle, host, port)
+    logger.info("Metrics ở http://%s:%s/metrics", host, server.sockets[0].getsockname()[1])
+    return server
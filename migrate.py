@@ -1,78 +1,26 @@
+import argparse
 import sqlite3
 
+from migrations import LATEST, MIGRATIONS, current_version, migrate
+
 DB_FILE = 'quiz.db'
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question_text TEXT NOT NULL,
-            image_url TEXT,
-            option_a TEXT NOT NULL,
-            option_b TEXT NOT NULL,
-            option_c TEXT NOT NULL,
-            option_d TEXT NOT NULL,
-            option_e TEXT,
-            option_f TEXT,
-            option_g TEXT,
-            num_options INTEGER DEFAULT 4,
-            correct_answers TEXT DEFAULT ''
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    print("DB initialized successfully! (Bảng 'questions' đã tạo hoặc tồn tại.)")
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cập nhật schema quiz.db theo các bước trong migrations.py')
+    parser.add_argument('--db', default=DB_FILE)
+    parser.add_argument('--status', action='store_true', help='chỉ in version hiện tại, không migrate')
+    args = parser.parse_args()
 
-def migrate_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Kiểm tra bảng có tồn tại không
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='questions';")
-    table_exists = cursor.fetchone() is not None
-    
-    if not table_exists:
-        print("Bảng chưa tồn tại, sẽ tạo mới qua init_db.")
+    if args.status:
+        conn = sqlite3.connect(args.db)
+        version = current_version(conn)
         conn.close()
-        init_db()
-        conn = sqlite3.connect(DB_FILE)  # Reconnect
-        cursor = conn.cursor()
-    
-    # Lấy info cột hiện tại
-    cursor.execute("PRAGMA table_info(questions)")
-    columns = [col[1] for col in cursor.fetchall()]
-    print(f"Cột hiện tại: {columns}")
-    
-    # Thêm cột nếu chưa có
-    added = []
-    if 'num_options' not in columns:
-        cursor.execute("ALTER TABLE questions ADD COLUMN num_options INTEGER DEFAULT 4")
-        added.append('num_options')
-    if 'correct_answers' not in columns:
-        cursor.execute("ALTER TABLE questions ADD COLUMN correct_answers TEXT DEFAULT ''")
-        added.append('correct_answers')
-    for opt in ['e', 'f', 'g']:
-        col_name = f'option_{opt}'
-        if col_name not in columns:
-            cursor.execute(f"ALTER TABLE questions ADD COLUMN {col_name} TEXT")
-            added.append(col_name)
-    
-    # Migrate data cũ (nếu có cột correct_answer cũ)
-    if 'correct_answer' in columns:
-        cursor.execute("UPDATE questions SET correct_answers = correct_answer WHERE correct_answers = '' AND correct_answer IS NOT NULL")
-        added.append('migrated correct_answer')
-    
-    conn.commit()
-    conn.close()
-    
-    if added:
-        print(f"Đã thêm/migrate: {', '.join(added)}")
+        pending = [f"{v} ({name})" for v, name, _ in MIGRATIONS if v > version]
+        print(f"Schema version {version}/{LATEST}. Chưa chạy: {', '.join(pending) or 'không'}")
     else:
-        print("Không cần thay đổi, DB đã up-to-date.")
-
-if __name__ == '__main__':
-    init_db()
-    migrate_db()
-    print("Migrate hoàn tất! File 'quiz.db' đã sẵn sàng.")
\ No newline at end of file
+        applied = migrate(args.db)
+        if applied:
+            print(f"Đã chạy: {', '.join(f'{v} ({name})' for v, name in applied)}")
+        else:
+            print("Không cần thay đổi, DB đã up-to-date.")
+        print(f"Migrate hoàn tất! File '{args.db}' ở schema version {LATEST}.")
@@ -0,0 +1,367 @@
+"""Migration schema có version: bảng schema_version ghi các bước đã chạy, mỗi bước một transaction.
+
+Chạy một lần lúc khởi động (bot.main, import_questions) hoặc tay qua `python migrate.py`,
+không chạy mỗi lần import bot. Bước nào cũng idempotent: DB cũ đã được migrate_db kiểu cũ sửa
+một phần (chưa có schema_version) vẫn chạy lại an toàn từ bước 1.
+Thêm bước mới: viết hàm nhận connection, thêm vào cuối MIGRATIONS với version kế tiếp.
+"""
+import logging
+import sqlite3
+import time
+
+from question_store import FTS_BULK_KEY, FTS_INDEX_NEW_SQL, bump_catalog_version, content_hash, tag_questions
+from tagging import auto_tags
+
+logger = logging.getLogger(__name__)
+
+VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at REAL NOT NULL
+    )
+'''
+CURRENT_SQL = 'SELECT ifnull(max(version), 0) FROM schema_version'
+# catalog_version + cờ import hàng loạt (question_store)
+META_DDL = 'CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+RECORD_SQL = 'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)'
+LEGACY_OPTION_COLUMNS = [f'option_{c}' for c in 'abcdefg']
+
+
+def _columns(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _legacy_questions(conn):
+    """v1: bảng questions kiểu cũ (mỗi option một cột) + các cột thêm dần trước đây."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_text TEXT NOT NULL,
+            image_url TEXT,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            option_e TEXT,
+            option_f TEXT,
+            option_g TEXT,
+            num_options INTEGER DEFAULT 4,
+            correct_answers TEXT DEFAULT ''
+        )
+    ''')
+    columns = _columns(conn, 'questions')
+    if 'option_a' not in columns:
+        return  # đã chuẩn hóa (v3) từ trước khi có schema_version
+    if 'num_options' not in columns:
+        conn.execute("ALTER TABLE questions ADD COLUMN num_options INTEGER DEFAULT 4")
+    if 'correct_answers' not in columns:
+        conn.execute("ALTER TABLE questions ADD COLUMN correct_answers TEXT DEFAULT ''")
+    for col_name in LEGACY_OPTION_COLUMNS[4:]:
+        if col_name not in columns:
+            conn.execute(f"ALTER TABLE questions ADD COLUMN {col_name} TEXT")
+    if 'correct_answer' in columns:
+        conn.execute("UPDATE questions SET correct_answers = correct_answer "
+                     "WHERE correct_answers = '' AND correct_answer IS NOT NULL")
+
+
+def _content_hash(conn):
+    """v2: cột content_hash cho import chống trùng, điền hash cho dòng cũ."""
+    columns = _columns(conn, 'questions')
+    if 'option_a' not in columns:
+        return
+    if 'content_hash' not in columns:
+        conn.execute("ALTER TABLE questions ADD COLUMN content_hash TEXT")
+    seen = {row[0] for row in conn.execute("SELECT content_hash FROM questions WHERE content_hash IS NOT NULL")}
+    updates = []
+    rows = conn.execute(f'''
+        SELECT id, question_text, {', '.join(LEGACY_OPTION_COLUMNS)}
+        FROM questions WHERE content_hash IS NULL
+    ''').fetchall()
+    for row in rows:
+        digest = content_hash(row[1], row[2:])
+        # Dòng trùng nội dung giữ hash NULL (unique index cho phép nhiều NULL)
+        if digest not in seen:
+            seen.add(digest)
+            updates.append((digest, row[0]))
+    conn.executemany("UPDATE questions SET content_hash = ? WHERE id = ?", updates)
+
+
+def _question_options(conn):
+    """v3: option sang bảng question_options (một dòng mỗi option), questions bỏ 7 cột option_x.
+
+    SQLite không đổi được ràng buộc cột tại chỗ: tạo bảng mới, chép dữ liệu, đổi tên.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_options (
+            question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL CHECK (position BETWEEN 0 AND 6),
+            text TEXT NOT NULL,
+            PRIMARY KEY (question_id, position)
+        ) WITHOUT ROWID
+    ''')
+    if 'option_a' not in _columns(conn, 'questions'):
+        return
+    # Trigger FTS cũ đọc option_x: bỏ trước khi bỏ cột (v4 tạo lại)
+    for name in ('questions_fts_insert', 'questions_fts_update', 'questions_fts_delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    # Như QuestionRecord cũ: chỉ lấy option trong num_options, option rỗng = không có
+    for position, column in enumerate(LEGACY_OPTION_COLUMNS):
+        conn.execute(f'''
+            INSERT OR IGNORE INTO question_options (question_id, position, text)
+            SELECT id, {position}, {column} FROM questions
+            WHERE {column} IS NOT NULL AND {column} != '' AND ifnull(num_options, 4) > {position}
+        ''')
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'questions'").fetchone()
+    conn.execute('''
+        CREATE TABLE questions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_text TEXT NOT NULL,
+            image_url TEXT,
+            num_options INTEGER NOT NULL DEFAULT 4 CHECK (num_options BETWEEN 1 AND 7),
+            correct_answers TEXT NOT NULL DEFAULT '',
+            content_hash TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO questions_new (id, question_text, image_url, num_options, correct_answers, content_hash)
+        SELECT id, question_text, image_url, min(max(ifnull(num_options, 4), 1), 7), ifnull(correct_answers, ''),
+               content_hash
+        FROM questions
+    ''')
+    conn.execute("DROP TABLE questions")
+    conn.execute("ALTER TABLE questions_new RENAME TO questions")
+    if sequence:
+        # Giữ AUTOINCREMENT: id đã xóa không bị cấp lại
+        conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'questions'", (sequence[0],))
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_content_hash ON questions(content_hash)')
+
+
+# FTS5: text câu hỏi + gộp các option. remove_diacritics: gõ không dấu vẫn tìm được tiếng Việt có dấu;
+# prefix: index sẵn tiền tố 2-3 ký tự để từ cuối gõ dở (vd. "ki*") không phải gộp doclist của hàng nghìn term.
+FTS_DDL = '''
+    CREATE VIRTUAL TABLE questions_fts
+    USING fts5(question_text, options, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')
+'''
+_FTS_OPTIONS = "(SELECT ifnull(group_concat(text, ' '), '') FROM question_options WHERE question_id = {id})"
+# Trigger insert bỏ qua khi import hàng loạt (question_store.defer_search_index)
+_NOT_BULK = f"WHEN NOT EXISTS (SELECT 1 FROM catalog_meta WHERE key = '{FTS_BULK_KEY}')"
+FTS_TRIGGERS_DDL = [
+    f'''CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions {_NOT_BULK} BEGIN
+        INSERT INTO questions_fts (rowid, question_text, options) VALUES (new.id, new.question_text, '');
+    END''',
+    '''CREATE TRIGGER questions_fts_update AFTER UPDATE OF question_text ON questions BEGIN
+        UPDATE questions_fts SET question_text = new.question_text WHERE rowid = old.id;
+    END''',
+    '''CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN
+        DELETE FROM questions_fts WHERE rowid = old.id;
+    END''',
+    # Option ghi sau câu hỏi (khóa ngoại): dựng lại cột options của câu đó
+    f'''CREATE TRIGGER question_options_fts_insert AFTER INSERT ON question_options {_NOT_BULK} BEGIN
+        UPDATE questions_fts SET options = {_FTS_OPTIONS.format(id='new.question_id')}
+        WHERE rowid = new.question_id;
+    END''',
+    f'''CREATE TRIGGER question_options_fts_update AFTER UPDATE ON question_options BEGIN
+        UPDATE questions_fts SET options = {_FTS_OPTIONS.format(id='new.question_id')}
+        WHERE rowid = new.question_id;
+    END''',
+    f'''CREATE TRIGGER question_options_fts_delete AFTER DELETE ON question_options BEGIN
+        UPDATE questions_fts SET options = {_FTS_OPTIONS.format(id='old.question_id')}
+        WHERE rowid = old.question_id;
+    END''',
+]
+def _search_index(conn):
+    """v4: bảng FTS cho /search đọc option từ question_options; dựng lại index từ đầu."""
+    for name in ('questions_fts_insert', 'questions_fts_update', 'questions_fts_delete',
+                 'question_options_fts_insert', 'question_options_fts_update', 'question_options_fts_delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS questions_fts")
+    conn.execute(FTS_DDL)
+    conn.execute(META_DDL)
+    for ddl in FTS_TRIGGERS_DDL:
+        conn.execute(ddl)
+    conn.execute(FTS_INDEX_NEW_SQL, (0,))
+
+
+def _explanation(conn):
+    """v5: cột explanation (giải thích đáp án, import từ dòng "Explanation:" trong ngân hàng câu hỏi)."""
+    if 'explanation' not in _columns(conn, 'questions'):
+        conn.execute("ALTER TABLE questions ADD COLUMN explanation TEXT")
+
+
+def _study(conn):
+    """v6: lịch sử trả lời (chỉ append) + trạng thái ôn tập SM-2 cho /study (study.py)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer_mask INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            answered_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS review_state (
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            repetitions INTEGER NOT NULL,
+            interval_days REAL NOT NULL,
+            ease REAL NOT NULL,
+            due_at REAL NOT NULL,
+            PRIMARY KEY (user_id, question_id)
+        ) WITHOUT ROWID
+    ''')
+    # Câu đến hạn của một user: range scan theo due_at, không sort
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_review_state_due ON review_state(user_id, due_at)')
+
+
+def _question_stats(conn):
+    """v7: bộ đếm từng câu (lượt làm, lượt đúng, lượt chọn mỗi option) cho /stats, cộng dồn từ attempts."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+            attempts INTEGER NOT NULL,
+            correct INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS option_picks (
+            question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL CHECK (position BETWEEN 0 AND 6),
+            picks INTEGER NOT NULL,
+            PRIMARY KEY (question_id, position)
+        ) WITHOUT ROWID
+    ''')
+    # Backfill một lần từ lịch sử đã có
+    conn.execute('''
+        INSERT INTO question_stats (question_id, attempts, correct)
+        SELECT question_id, count(*), sum(correct) FROM attempts
+        WHERE question_id IN (SELECT id FROM questions) GROUP BY question_id
+    ''')
+    conn.execute('''
+        WITH positions(position) AS (VALUES (0), (1), (2), (3), (4), (5), (6))
+        INSERT INTO option_picks (question_id, position, picks)
+        SELECT question_id, position, count(*) FROM attempts, positions
+        WHERE answer_mask >> position & 1 AND question_id IN (SELECT id FROM questions)
+        GROUP BY question_id, position
+    ''')
+
+
+def _session_nonce(conn):
+    """v8: nonce của quiz session cho callback_data (callback_data.py); bảng chưa có thì v10 tạo kèm nonce."""
+    columns = _columns(conn, 'quiz_sessions')
+    if columns and 'nonce' not in columns:
+        conn.execute('ALTER TABLE quiz_sessions ADD COLUMN nonce INTEGER NOT NULL DEFAULT 0')
+
+
+def _tags(conn):
+    """v9: chủ đề câu hỏi (tags + question_tags) cho blueprint đề thi; gắn tag tự động cho câu đã có."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_tags (
+            question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+            tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+            PRIMARY KEY (question_id, tag_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_tags_tag ON question_tags(tag_id)')
+    pairs = [(q_id, tag) for q_id, text in conn.execute('SELECT id, question_text FROM questions').fetchall()
+             for tag in auto_tags(text)]
+    tag_questions(conn, pairs)
+    bump_catalog_version(conn)
+
+
+def _runtime_tables(conn):
+    """v10: bảng trước đây constructor tự tạo lúc import bot: quiz_sessions, bot_state, image_file_ids.
+
+    IF NOT EXISTS: DB đang chạy đã có các bảng này (quiz_sessions có nonce từ v8).
+    """
+    # Session quiz đang làm (session_store.py); LOAD/EXPIRE lọc theo updated_at qua index
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_sessions (
+            user_id INTEGER PRIMARY KEY,
+            question_ids BLOB NOT NULL,
+            answers BLOB NOT NULL,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            nonce INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_sessions_updated_at ON quiz_sessions(updated_at)')
+    # Trạng thái ConversationHandler + user_data (persistence.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            user_id INTEGER,
+            value TEXT NOT NULL,
+            PRIMARY KEY (kind, key)
+        )
+    ''')
+    # Telegram file_id của từng ảnh đã upload (image_cache.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_file_ids (
+            path TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            uploaded_at REAL NOT NULL
+        )
+    ''')
+
+
+# (version, tên, hàm) theo thứ tự; không sửa/xóa bước đã phát hành, chỉ thêm bước mới ở cuối
+MIGRATIONS = [
+    (1, 'legacy_questions', _legacy_questions),
+    (2, 'content_hash', _content_hash),
+    (3, 'question_options', _question_options),
+    (4, 'search_index', _search_index),
+    (5, 'explanation', _explanation),
+    (6, 'study', _study),
+    (7, 'question_stats', _question_stats),
+    (8, 'session_nonce', _session_nonce),
+    (9, 'tags', _tags),
+    (10, 'runtime_tables', _runtime_tables),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    conn.execute(VERSION_DDL)
+    return conn.execute(CURRENT_SQL).fetchone()[0]
+
+
+def migrate(db_file, target=LATEST):
+    """Chạy các bước còn thiếu tới target; trả về [(version, tên)] đã chạy lần này."""
+    # isolation_level=None: tự quản BEGIN/COMMIT để cả DDL nằm trong transaction.
+    # foreign_keys để mặc định (tắt): bước dựng lại bảng không kích hoạt ON DELETE CASCADE.
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    applied = []
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(VERSION_DDL)
+        for version, name, step in MIGRATIONS:
+            if version > target:
+                break
+            # BEGIN IMMEDIATE giữ write lock: process khác migrate cùng lúc thì chờ rồi thấy bước đã chạy
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute(CURRENT_SQL).fetchone()[0] >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                started = time.perf_counter()
+                step(conn)
+                conn.execute(RECORD_SQL, (version, name, time.time()))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            logger.info("Migration %d (%s): %.2fs", version, name, time.perf_counter() - started)
+            applied.append((version, name))
+    finally:
+        conn.close()
+    return applied
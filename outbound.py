@@ -0,0 +1,179 @@
+"""Lịch gửi request ra Bot API: hàng đợi ưu tiên + token bucket theo chat và toàn cục + xử lý RetryAfter.
+
+Cắm vào Application qua extension point rate limiter của python-telegram-bot:
+    Application.builder().rate_limiter(OutboundScheduler())
+Handler vẫn gọi reply_text/edit_message_text/send_message như cũ.
+"""
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import API_CALLS, API_ERRORS, API_SECONDS, Gauge
+
+logger = logging.getLogger(__name__)
+
+# answerCallbackQuery không tính vào giới hạn gửi tin: đi thẳng, không qua hàng đợi (spinner trên client tắt ngay).
+# Còn lại: số nhỏ = ưu tiên cao; edit trước, rồi gửi mới.
+PRIORITIES = {
+    'editMessageReplyMarkup': 1,
+    'editMessageText': 1,
+    'sendMessage': 2,
+    'sendPhoto': 3,
+    'sendMediaGroup': 3,
+}
+DEFAULT_PRIORITY = 2
+# Ưu tiên thấp nhất, cho gửi hàng loạt (vd. trả kết quả cho cả lớp)
+BULK_PRIORITY = 9
+
+QUEUE_DEPTH = Gauge('quiz_outbound_queue', 'Số request đang chờ token gửi')
+
+
+class TokenBucket:
+    """Bucket kiểu đặt trước: reserve() luôn lấy token (có thể nợ) và trả về số giây phải chờ."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Mặc định theo giới hạn Telegram: ~30 msg/s toàn bot, ~1 msg/s mỗi chat riêng, 20 msg/phút mỗi group."""
+
+    def __init__(self, global_rate=30, global_burst=30, chat_rate=1.0, chat_burst=3,
+                 group_rate=20 / 60, group_burst=5, max_retries=3):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = {}
+        self._queue = None
+        self._seq = itertools.count()
+        self._resume = None
+        self._dispatcher = None
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+
+    async def initialize(self):
+        # ExtBot gọi initialize của rate limiter mỗi lần bot.initialize() (Application và Updater đều gọi)
+        if self._dispatcher:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._resume = asyncio.Event()
+        self._resume.set()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+
+    def stats(self):
+        return {'calls': self.calls, 'retries': self.retries, 'errors': self.errors,
+                'queued': self._queue.qsize() if self._queue else 0}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                # Dọn bucket đã đầy lại (chat không hoạt động)
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle()}
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (TokenBucket(self.group_rate, self.group_burst) if is_group
+                      else TokenBucket(self.chat_rate, self.chat_burst))
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self):
+        # Cấp token toàn cục theo thứ tự ưu tiên
+        while True:
+            priority, seq, future = await self._queue.get()
+            QUEUE_DEPTH.set(self._queue.qsize())
+            if future.done():
+                continue
+            await self._resume.wait()
+            delay = self._global.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            if not future.done():
+                future.set_result(None)
+
+    async def _acquire(self, chat_id, priority):
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._seq), future))
+        QUEUE_DEPTH.set(self._queue.qsize())
+        await future
+
+    @staticmethod
+    async def _call(endpoint, callback, args, kwargs):
+        API_CALLS.inc(method=endpoint)
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as exc:
+            API_ERRORS.inc(method=endpoint, error=type(exc).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method=endpoint)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        # Request không gắn chat (getUpdates, getMe, setWebhook...) không bị giới hạn
+        if chat_id is None and endpoint != 'answerCallbackQuery':
+            return await self._call(endpoint, callback, args, kwargs)
+        if endpoint == 'answerCallbackQuery':
+            await self._resume.wait()
+            self.calls += 1
+            return await self._call(endpoint, callback, args, kwargs)
+        priority = rate_limit_args if isinstance(rate_limit_args, int) else PRIORITIES.get(endpoint, DEFAULT_PRIORITY)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                self.calls += 1
+                return await self._call(endpoint, callback, args, kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    self.errors += 1
+                    logger.error("Vẫn bị rate limit sau %d lần thử (%s)", self.max_retries, endpoint)
+                    raise
+                self.retries += 1
+                logger.info("429 cho %s, tạm dừng %ss", endpoint, exc.retry_after)
+                # Dừng cấp token toàn cục trong retry_after rồi thử lại
+                self._resume.clear()
+                await asyncio.sleep(exc.retry_after)
+                self._resume.set()
+            except Exception:
+                self.errors += 1
+                raise
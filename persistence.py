@@ -0,0 +1,162 @@
+"""Lưu trạng thái ConversationHandler và user_data (form /add_question đang nhập dở) ra ngoài process.
+
+Nhờ vậy nhiều worker và các lần restart dùng chung trạng thái hội thoại.
+BotPersistence cắm vào Application.builder().persistence(...).
+Backend: SqliteStateBackend (chung file DB) hoặc MemoryStateBackend (test).
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from metrics import DB_SECONDS
+from question_store import connect
+
+logger = logging.getLogger(__name__)
+
+# Bảng do migrations.py tạo (v10); chạy migrate trước khi mở backend
+LOAD_STATE_SQL = 'SELECT key, value FROM bot_state WHERE kind = ?'
+UPSERT_STATE_SQL = '''
+    INSERT INTO bot_state (kind, key, user_id, value) VALUES (?, ?, ?, ?)
+    ON CONFLICT(kind, key) DO UPDATE SET value = excluded.value
+'''
+DELETE_STATE_SQL = 'DELETE FROM bot_state WHERE kind = ? AND key = ?'
+
+USER_DATA = 'user_data'
+CONVERSATION = 'conv:'  # + tên ConversationHandler
+
+
+class SqliteStateBackend:
+    def __init__(self, db_file):
+        self._conn = connect(db_file)
+
+    def load(self, kind, shard=None):
+        sql, params = LOAD_STATE_SQL, (kind,)
+        if shard and shard[1] > 1:
+            sql, params = sql + ' AND user_id % ? = ?', (kind, shard[1], shard[0])
+        return dict(self._conn.execute(sql, params).fetchall())
+
+    def write(self, changes):
+        """changes: [(kind, key, user_id, value hoặc None = xóa)] trong một transaction."""
+        with DB_SECONDS.time(op='state_write'), self._conn:
+            self._conn.executemany(UPSERT_STATE_SQL, [c for c in changes if c[3] is not None])
+            self._conn.executemany(DELETE_STATE_SQL, [c[:2] for c in changes if c[3] is None])
+
+    def close(self):
+        self._conn.close()
+
+
+class MemoryStateBackend:
+    def __init__(self):
+        self.rows = {}  # (kind, key) -> (user_id, value)
+
+    def load(self, kind, shard=None):
+        return {key: value for (k, key), (user_id, value) in self.rows.items()
+                if k == kind and (not shard or shard[1] <= 1 or user_id % shard[1] == shard[0])}
+
+    def write(self, changes):
+        for kind, key, user_id, value in changes:
+            if value is None:
+                self.rows.pop((kind, key), None)
+            else:
+                self.rows[(kind, key)] = (user_id, value)
+
+    def close(self):
+        pass
+
+
+class BotPersistence(BasePersistence):
+    """Chỉ lưu user_data và conversation; các update trong một lượt update_persistence ghi chung một transaction."""
+
+    def __init__(self, backend, shard=None, update_interval=2.0):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self._backend = backend
+        self.shard = shard
+        self._pending = {}
+        self._writer = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bot-state')
+
+    async def _read(self, kind):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._backend.load, kind, self.shard)
+
+    def _queue(self, kind, key, user_id, value):
+        # Chụp giá trị ngay (JSON) để handler sửa tiếp cũng không ảnh hưởng bản sẽ ghi
+        self._pending[(kind, key)] = (kind, key, user_id, value)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        # Chạy sau khi update_persistence gọi xong mọi update_* (không await thật) -> gom thành một lô.
+        # Thay đổi đến trong lúc đang ghi được ghi ở vòng sau, không chờ update kế tiếp
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            changes, self._pending = self._pending, {}
+            try:
+                await loop.run_in_executor(self._executor, self._backend.write, list(changes.values()))
+            except Exception:
+                # Trả lại lô chưa ghi; bản mới hơn của cùng key (nếu có) được giữ
+                self._pending = {**changes, **self._pending}
+                logger.exception("Ghi bot_state lỗi, %d thay đổi chờ lần ghi sau", len(self._pending))
+                return
+
+    async def get_user_data(self):
+        rows = await self._read(USER_DATA)
+        return {int(key): json.loads(value) for key, value in rows.items()}
+
+    async def update_user_data(self, user_id, data):
+        self._queue(USER_DATA, str(user_id), user_id, json.dumps(data) if data else None)
+
+    async def drop_user_data(self, user_id):
+        self._queue(USER_DATA, str(user_id), user_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def get_conversations(self, name):
+        rows = await self._read(CONVERSATION + name)
+        return {tuple(json.loads(key)): json.loads(value) for key, value in rows.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        # key = (chat_id, user_id) với per_chat + per_user mặc định
+        value = json.dumps(new_state) if new_state is not None else None
+        self._queue(CONVERSATION + name, json.dumps(list(key)), key[-1], value)
+
+    async def flush(self):
+        if self._writer:
+            await self._writer
+        await self._write_pending()
+        self._executor.shutdown(wait=True)
+        self._backend.close()
+
+    # Không dùng chat_data / bot_data / callback_data
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
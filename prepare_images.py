@@ -0,0 +1,92 @@
+"""Chuẩn hóa thư mục images/ (chạy offline trước khi deploy).
+
+Mỗi ảnh: giới hạn kích thước, nén lại (JPEG progressive hoặc WebP), đặt tên theo hash nội dung
+vào images/dist/, rồi ghi images/manifest.json để bot tra (câu, đáp án) -> file O(1).
+
+Chạy: python prepare_images.py [--max-size 1280] [--format jpeg|webp] [--quality 82]
+Cần Pillow (pip install Pillow); bot không cần Pillow lúc chạy.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+
+from image_cache import IMAGES_DIR, MANIFEST_FILE, MANIFEST_VERSION
+
+DIST_DIR = 'dist'
+SOURCE_RE = re.compile(r'question(\d+)(?:_([A-G]))?\.(?:jpe?g|png|webp)$', re.IGNORECASE)
+
+
+def compress(path, max_size, fmt, quality):
+    """Trả về (bytes, width, height) của ảnh đã resize + nén lại."""
+    from PIL import Image
+
+    with Image.open(path) as im:
+        im = im.convert('L' if im.mode in ('L', 'LA', '1') else 'RGB')
+        im.thumbnail((max_size, max_size), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == 'webp':
+            im.save(buf, 'WEBP', quality=quality, method=6)
+        else:
+            im.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True)
+        return buf.getvalue(), im.width, im.height
+
+
+def build(images_dir=IMAGES_DIR, max_size=1280, fmt='jpeg', quality=82):
+    dist = os.path.join(images_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    ext = 'webp' if fmt == 'webp' else 'jpg'
+    entries = []
+    for name in sorted(os.listdir(images_dir)):
+        match = SOURCE_RE.match(name)
+        if not match:
+            continue
+        path = os.path.join(images_dir, name)
+        with open(path, 'rb') as f:
+            original = f.read()
+        data, width, height = compress(path, max_size, fmt, quality)
+        # Nén lại mà to hơn bản gốc (ảnh nhỏ, đã tối ưu) thì giữ bản gốc nếu cùng định dạng
+        if fmt == 'jpeg' and len(data) >= len(original) and max(width, height) <= max_size:
+            data = original
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        out_name = f"{DIST_DIR}/{digest}.{ext}"
+        out_path = os.path.join(images_dir, out_name)
+        if not os.path.exists(out_path):
+            with open(out_path, 'wb') as f:
+                f.write(data)
+        entries.append({
+            'source': name,
+            'file': out_name,
+            'question': int(match.group(1)),
+            'key': match.group(2).upper() if match.group(2) else 'general',
+            'width': width,
+            'height': height,
+            'bytes': len(data),
+            'source_bytes': len(original),
+        })
+
+    # Xóa file cũ trong dist/ không còn được manifest tham chiếu
+    referenced = {os.path.basename(e['file']) for e in entries}
+    for name in os.listdir(dist):
+        if name not in referenced:
+            os.remove(os.path.join(dist, name))
+
+    manifest = {'version': MANIFEST_VERSION, 'max_size': max_size, 'format': fmt, 'images': entries}
+    with open(os.path.join(images_dir, os.path.basename(MANIFEST_FILE)), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    return entries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resize, nén lại và content-address thư mục images/')
+    parser.add_argument('--images-dir', default=IMAGES_DIR)
+    parser.add_argument('--max-size', type=int, default=1280, help='cạnh dài tối đa (px)')
+    parser.add_argument('--format', choices=('jpeg', 'webp'), default='jpeg')
+    parser.add_argument('--quality', type=int, default=82)
+    args = parser.parse_args()
+    entries = build(args.images_dir, args.max_size, args.format, args.quality)
+    before = sum(e['source_bytes'] for e in entries)
+    after = sum(e['bytes'] for e in entries)
+    print(f"{len(entries)} ảnh: {before} -> {after} bytes ({after / before:.0%})" if entries else "Không có ảnh nào.")
@@ -0,0 +1,75 @@
+"""Thống kê từng câu: lượt làm, lượt đúng, lượt chọn mỗi option (bảng do migrations.py tạo).
+
+Không đếm lại từ attempts: mỗi lô attempts được gộp thành delta theo câu rồi cộng vào bộ đếm
+bằng một executemany upsert cho mỗi bảng, trong cùng transaction ghi attempts (study.py).
+/stats chỉ đọc theo khóa chính. Độ khó trong RAM (Difficulty) dùng để bốc đề thiên về câu khó.
+"""
+from collections import Counter
+
+UPSERT_STATS_SQL = '''
+    INSERT INTO question_stats (question_id, attempts, correct) VALUES (?, ?, ?)
+    ON CONFLICT(question_id) DO UPDATE SET
+        attempts = attempts + excluded.attempts, correct = correct + excluded.correct
+'''
+UPSERT_PICKS_SQL = '''
+    INSERT INTO option_picks (question_id, position, picks) VALUES (?, ?, ?)
+    ON CONFLICT(question_id, position) DO UPDATE SET picks = picks + excluded.picks
+'''
+GET_STATS_SQL = 'SELECT attempts, correct FROM question_stats WHERE question_id = ?'
+GET_PICKS_SQL = 'SELECT position, picks FROM option_picks WHERE question_id = ?'
+ALL_STATS_SQL = 'SELECT question_id, attempts, correct FROM question_stats'
+
+
+def fold(attempts):
+    """attempts: [(user_id, question_id, answer_mask, correct, answered_at)] -> (delta câu, delta option)."""
+    totals = Counter()
+    rights = Counter()
+    picks = Counter()
+    for _, q_id, mask, correct, _ in attempts:
+        totals[q_id] += 1
+        rights[q_id] += bool(correct)
+        while mask:
+            bit = mask & -mask
+            picks[(q_id, bit.bit_length() - 1)] += 1
+            mask ^= bit
+    return ([(q_id, n, rights[q_id]) for q_id, n in totals.items()],
+            [(q_id, position, n) for (q_id, position), n in picks.items()])
+
+
+def write_stats(conn, attempts):
+    """Cộng một lô attempts vào bộ đếm; gọi trong transaction của người gọi."""
+    stats, picks = fold(attempts)
+    conn.executemany(UPSERT_STATS_SQL, stats)
+    conn.executemany(UPSERT_PICKS_SQL, picks)
+
+
+def get_stats(conn, q_id):
+    """(lượt làm, lượt đúng, {vị trí: lượt chọn}) hoặc None nếu chưa ai làm."""
+    row = conn.execute(GET_STATS_SQL, (q_id,)).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], dict(conn.execute(GET_PICKS_SQL, (q_id,)).fetchall())
+
+
+def load_counts(conn):
+    """{question_id: (lượt làm, lượt đúng)} để dựng Difficulty lúc khởi động."""
+    return {q_id: (attempts, correct) for q_id, attempts, correct in conn.execute(ALL_STATS_SQL)}
+
+
+class Difficulty:
+    """(lượt làm, lượt đúng) từng câu trong RAM: nạp một lần lúc khởi động, cộng dồn mỗi lần chấm.
+
+    Mỗi worker chỉ cộng lượt chấm của mình; các worker khác thấy ở lần khởi động sau.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    def add(self, q_id, correct):
+        attempts, right = self.counts.get(q_id, (0, 0))
+        self.counts[q_id] = (attempts + 1, right + bool(correct))
+
+    def weight(self, q_id):
+        """Tỉ lệ sai làm mượt (sai + 1) / (làm + 2): câu chưa ai làm = 0.5, không bao giờ bằng 0."""
+        attempts, right = self.counts.get(q_id, (0, 0))
+        return (attempts - right + 1) / (attempts + 2)
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import queue
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import DB_SECONDS
+from question_stats import get_stats
+from tagging import auto_tags
+
+# SQL cố định: sqlite3 cache prepared statement theo chuỗi SQL trên mỗi connection,
+# nên dùng lại đúng các hằng này là dùng lại statement đã compile.
+# Chỉ các cột cần dùng; option nằm ở question_options (schema do migrations.py quản lý)
+QUESTION_COLUMNS = 'id, question_text, image_url, num_options, correct_answers, explanation'
+ALL_SQL = f'SELECT {QUESTION_COLUMNS} FROM questions ORDER BY id'
+# Quét theo khóa chính (question_id, position): không cần sort
+ALL_OPTIONS_SQL = 'SELECT question_id, position, text FROM question_options ORDER BY question_id, position'
+VERSION_SQL = "SELECT value FROM catalog_meta WHERE key = 'version'"
+BUMP_SQL = '''
+    INSERT INTO catalog_meta (key, value) VALUES ('version', 1)
+    ON CONFLICT(key) DO UPDATE SET value = value + 1
+'''
+INSERT_SQL = '''
+    INSERT INTO questions (question_text, image_url, num_options, correct_answers, content_hash, explanation)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(content_hash) DO NOTHING
+'''
+INSERT_OPTION_SQL = 'INSERT INTO question_options (question_id, position, text) VALUES (?, ?, ?)'
+# Tag theo tên (tagging.py); bảng do migrations.py tạo
+INSERT_TAG_SQL = 'INSERT INTO tags (name) VALUES (?) ON CONFLICT(name) DO NOTHING'
+TAG_QUESTION_SQL = 'INSERT OR IGNORE INTO question_tags (question_id, tag_id) SELECT ?, id FROM tags WHERE name = ?'
+ALL_TAGS_SQL = 'SELECT qt.question_id, t.name FROM question_tags qt JOIN tags t ON t.id = qt.tag_id ORDER BY t.name'
+
+# Full-text search trên questions_fts (bảng + trigger tạo trong migrations.py).
+# Mỗi option ghi vào question_options làm trigger ghi lại cả dòng FTS (tokenize lại text câu hỏi):
+# import hàng loạt bật cờ FTS_BULK_KEY trong transaction của mình để trigger insert bỏ qua,
+# rồi index một lần các câu mới. Cờ chưa commit nên connection khác không thấy.
+FTS_BULK_KEY = 'fts_bulk'
+FTS_BULK_ON_SQL = f"INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('{FTS_BULK_KEY}', 1)"
+FTS_BULK_OFF_SQL = f"DELETE FROM catalog_meta WHERE key = '{FTS_BULK_KEY}'"
+FTS_INDEX_NEW_SQL = '''
+    INSERT INTO questions_fts (rowid, question_text, options)
+    SELECT id, question_text,
+           (SELECT ifnull(group_concat(text, ' '), '') FROM question_options WHERE question_id = questions.id)
+    FROM questions WHERE id > ?
+'''
+MAX_ID_SQL = 'SELECT ifnull(max(id), 0) FROM questions'
+# bm25 phải chấm điểm mọi dòng khớp: chỉ xếp hạng khi số dòng khớp <= RANK_WINDOW,
+# truy vấn quá rộng (từ phổ biến) thì trả câu mới nhất trước, dừng sớm theo rowid.
+RANK_WINDOW = 2000
+PROBE_SQL = 'SELECT count(*) FROM (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ? LIMIT ?)'
+# Text câu hỏi nặng hơn option khi xếp hạng
+SEARCH_SQL = '''
+    SELECT rowid, snippet(questions_fts, 0, '', '', '…', 16) FROM questions_fts
+    WHERE questions_fts MATCH ? ORDER BY bm25(questions_fts, 2.0, 1.0) LIMIT ? OFFSET ?
+'''
+BROAD_SEARCH_SQL = '''
+    SELECT rowid, snippet(questions_fts, 0, '', '', '…', 16) FROM questions_fts
+    WHERE questions_fts MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?
+'''
+_TERM_RE = re.compile(r'\w+')
+
+
+def connect(db_file):
+    """Mở connection dùng chung được giữa các thread của executor, bật WAL; row đọc theo tên cột."""
+    conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=64)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def bump_catalog_version(conn):
+    """Tăng version để các bot đang chạy reload catalog; gọi trong cùng transaction với thay đổi."""
+    conn.execute(BUMP_SQL)
+
+
+def tag_questions(conn, pairs):
+    """pairs: [(question_id, tên tag)]; tạo tag chưa có, bỏ qua cặp đã gắn."""
+    conn.executemany(INSERT_TAG_SQL, [(name,) for name in {name for _, name in pairs}])
+    conn.executemany(TAG_QUESTION_SQL, pairs)
+
+
+def read_catalog_version(conn):
+    row = conn.execute(VERSION_SQL).fetchone()
+    return row[0] if row else 0
+
+
+def content_hash(question_text, options):
+    """Hash nội dung câu hỏi (text + các option, đã chuẩn hóa khoảng trắng) để phát hiện trùng O(1)."""
+    parts = (question_text, *(opt for opt in options if opt))
+    normalized = '\n'.join(' '.join(part.split()) for part in parts)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def answer_key_error(num_options, correct_str):
+    """Kiểm tra đáp án đúng ('B' hoặc 'A,C') so với số option; trả về mô tả lỗi hoặc None nếu hợp lệ."""
+    letters = correct_str.upper().replace(' ', '').split(',')
+    if letters == ['']:
+        return "thiếu đáp án đúng"
+    valid = 'ABCDEFG'[:num_options]
+    bad = [letter for letter in letters if len(letter) != 1 or letter not in valid]
+    if bad:
+        return f"đáp án {','.join(bad) or '(rỗng)'} không thuộc A-{valid[-1]}"
+    if len(set(letters)) != len(letters):
+        return "đáp án bị lặp"
+    return None
+
+
+def defer_search_index(conn):
+    """Bắt đầu ghi hàng loạt: trả về id lớn nhất hiện có, truyền lại cho index_new_questions."""
+    conn.execute(FTS_BULK_ON_SQL)
+    return conn.execute(MAX_ID_SQL).fetchone()[0]
+
+
+def index_new_questions(conn, after_id):
+    """Index FTS một lần cho các câu id > after_id rồi tắt cờ; gọi trước commit."""
+    conn.execute(FTS_INDEX_NEW_SQL, (after_id,))
+    conn.execute(FTS_BULK_OFF_SQL)
+
+
+def search_questions(conn, match, limit, offset=0):
+    """match: chuỗi từ fts_query. Trả [(id, đoạn trích)]."""
+    matches = conn.execute(PROBE_SQL, (match, RANK_WINDOW + 1)).fetchone()[0]
+    sql = SEARCH_SQL if matches <= RANK_WINDOW else BROAD_SEARCH_SQL
+    return conn.execute(sql, (match, limit, offset)).fetchall()
+
+
+def fts_query(text):
+    """Chuỗi người dùng gõ -> câu MATCH an toàn: mọi từ phải có, từ cuối khớp tiền tố."""
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+class QuestionStore:
+    """Pool connection SQLite nhỏ; mọi query chạy trên executor riêng, không chặn event loop."""
+
+    def __init__(self, db_file, pool_size=4):
+        self.db_file = db_file
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(connect(db_file))
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='question-store')
+
+    def _run(self, fn, *args):
+        conn = self._pool.get()
+        try:
+            with DB_SECONDS.time(op=fn.__name__.lstrip('_')):
+                return fn(conn, *args)
+        finally:
+            self._pool.put(conn)
+
+    async def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, fn, *args)
+
+    async def catalog_version(self):
+        return await self._submit(read_catalog_version)
+
+    async def catalog_rows(self):
+        return await self._submit(_catalog_rows)
+
+    async def add_question(self, question_text, image_url, options, correct_answers, explanation=None):
+        """options: text theo thứ tự A, B, ...; trả về id câu mới, None nếu câu đã có (trùng content_hash)."""
+        return await self._submit(_add_question, question_text, image_url, options, correct_answers, explanation)
+
+    async def question_stats(self, q_id):
+        """(lượt làm, lượt đúng, {vị trí: lượt chọn}) hoặc None."""
+        return await self._submit(get_stats, q_id)
+
+    async def search(self, text, limit=10, offset=0):
+        """[(id, đoạn trích)] theo độ liên quan."""
+        match = fts_query(text)
+        if match is None:
+            return []
+        return await self._submit(search_questions, match, limit, offset)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def _catalog_rows(conn):
+    # Đọc version và rows trong cùng một read transaction cho nhất quán
+    with conn:
+        conn.execute('BEGIN')
+        version = read_catalog_version(conn)
+        rows = conn.execute(ALL_SQL).fetchall()
+        options = {}
+        for q_id, position, text in conn.execute(ALL_OPTIONS_SQL):
+            options.setdefault(q_id, {})[position] = text
+        tags = {}
+        for q_id, name in conn.execute(ALL_TAGS_SQL):
+            tags.setdefault(q_id, []).append(name)
+    return version, rows, options, tags
+
+
+def _add_question(conn, question_text, image_url, options, correct_answers, explanation):
+    digest = content_hash(question_text, options)
+    with conn:
+        cur = conn.execute(INSERT_SQL, (question_text, image_url, len(options), correct_answers, digest,
+                                        explanation))
+        if not cur.rowcount:
+            return None
+        q_id = cur.lastrowid
+        conn.executemany(INSERT_OPTION_SQL, [(q_id, i, text) for i, text in enumerate(options) if text])
+        tag_questions(conn, [(q_id, tag) for tag in auto_tags(question_text)])
+        bump_catalog_version(conn)
+    return q_id
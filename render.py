@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class MessageRenderer:
+    """Sửa message quiz theo diff: bỏ qua edit không đổi gì, chỉ sửa keyboard khi text giữ nguyên,
+    và gộp nhiều lần toggle liên tiếp trong một cửa sổ ngắn thành một edit.
+    """
+
+    def __init__(self, debounce=0.3, max_messages=10000):
+        self.debounce = debounce
+        self.max_messages = max_messages
+        self._last = OrderedDict()  # (chat_id, message_id) -> (text, reply_markup)
+        self._pending = {}          # (chat_id, message_id) -> render mới nhất đang chờ
+        self.edits = 0
+        self.markup_edits = 0
+        self.avoided = 0            # số API call đã tránh được (no-op + gộp)
+
+    def stats(self):
+        return {'edits': self.edits, 'markup_edits': self.markup_edits, 'avoided': self.avoided}
+
+    def _remember(self, key, text, reply_markup):
+        self._last[key] = (text, reply_markup)
+        self._last.move_to_end(key)
+        if len(self._last) > self.max_messages:
+            self._last.popitem(last=False)
+
+    def sent(self, message, text, reply_markup):
+        """Ghi nhận message vừa gửi mới để lần edit sau so sánh được."""
+        self._remember((message.chat_id, message.message_id), text, reply_markup)
+
+    async def edit(self, query, text, reply_markup, coalesce=False, **kwargs):
+        key = (query.message.chat_id, query.message.message_id)
+        if not coalesce:
+            # Edit trực tiếp thay cho bản đang chờ (nếu có)
+            self._drop_pending(key)
+            await self._apply(key, query, text, reply_markup, kwargs)
+            return
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending[1:] = [query, text, reply_markup, kwargs]
+            self.avoided += 1
+            return
+        self._pending[key] = [asyncio.create_task(self._flush_later(key)), query, text, reply_markup, kwargs]
+
+    def _drop_pending(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending[0].cancel()
+            self.avoided += 1
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.debounce)
+        _, query, text, reply_markup, kwargs = self._pending.pop(key)
+        try:
+            await self._apply(key, query, text, reply_markup, kwargs)
+        except Exception:
+            logger.exception("Edit message (gộp) lỗi")
+
+    async def _apply(self, key, query, text, reply_markup, kwargs):
+        last = self._last.get(key)
+        try:
+            if last is not None and last[0] == text:
+                if last[1] == reply_markup:
+                    self.avoided += 1
+                    return
+                await query.edit_message_reply_markup(reply_markup=reply_markup)
+                self.markup_edits += 1
+            else:
+                await query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+                self.edits += 1
+        except BadRequest as e:
+            # Trạng thái cache lệch với Telegram (vd. sau restart) -> coi như no-op
+            if 'not modified' not in str(e).lower():
+                raise
+            self.avoided += 1
+        self._remember(key, text, reply_markup)
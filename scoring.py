@@ -0,0 +1,76 @@
+"""Chấm điểm theo bitmask 7 bit (A-G), chấm nhiều đề một lượt.
+
+Mỗi đề là một dãy byte (bytes/bytearray/array), byte i là mask đáp án câu i.
+Có NumPy thì chấm cả ma trận bằng phép toán vector; không có thì dùng bảng popcount thuần Python.
+"""
+try:
+    import numpy as np
+except ImportError:  # NumPy là tuỳ chọn
+    np = None
+
+STRICT = 'strict'
+PARTIAL = 'partial'
+MODES = (STRICT, PARTIAL)
+
+OPTION_MASK = 0x7F
+POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+
+def _question_score(answer, correct, mode):
+    if mode == STRICT:
+        return 1.0 if answer == correct else 0.0
+    # partial: (chọn đúng - chọn sai) / số đáp án đúng, không âm
+    n_correct = POPCOUNT[correct]
+    if not n_correct:
+        return 1.0 if not answer else 0.0
+    hits = POPCOUNT[answer & correct]
+    wrong = POPCOUNT[answer & ~correct & OPTION_MASK]
+    return max(0.0, (hits - wrong) / n_correct)
+
+
+def score_matrix(answers, correct, mode=STRICT):
+    """Điểm từng câu của từng đề (0..1).
+
+    answers, correct: n đề x m câu (list các dãy byte hoặc ndarray uint8), cùng kích thước.
+    Trả về ndarray float (n, m) nếu có NumPy, ngược lại list các list.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode phải là một trong {MODES}")
+    if np is not None:
+        return _score_matrix_numpy(answers, correct, mode)
+    return [[_question_score(a, c, mode) for a, c in zip(row_a, row_c)]
+            for row_a, row_c in zip(answers, correct)]
+
+
+def _as_matrix(rows):
+    if isinstance(rows, np.ndarray):
+        return rows.astype(np.uint8, copy=False)
+    return np.frombuffer(b''.join(bytes(r) for r in rows), dtype=np.uint8).reshape(len(rows), -1)
+
+
+def _score_matrix_numpy(answers, correct, mode):
+    a = _as_matrix(answers)
+    c = _as_matrix(correct)
+    if mode == STRICT:
+        return (a == c).astype(np.float64)
+    popcount = np.frombuffer(POPCOUNT, dtype=np.uint8)
+    n_correct = popcount[c].astype(np.float64)
+    hits = popcount[a & c].astype(np.float64)
+    wrong = popcount[a & ~c & OPTION_MASK].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(n_correct > 0, np.maximum(0.0, (hits - wrong) / n_correct), (a == 0).astype(np.float64))
+    return scores
+
+
+def score_exams(answers, correct, mode=STRICT):
+    """Tổng điểm mỗi đề."""
+    scores = score_matrix(answers, correct, mode)
+    if np is not None:
+        return scores.sum(axis=1).tolist()
+    return [sum(row) for row in scores]
+
+
+def score_exam(answers, correct, mode=STRICT):
+    """Điểm từng câu của một đề."""
+    scores = score_matrix([answers], [correct], mode)
+    return list(scores[0])
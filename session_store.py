@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from callback_data import new_nonce
+from metrics import DB_SECONDS
+from question_store import connect
+
+logger = logging.getLogger(__name__)
+
+# Bảng do migrations.py tạo (v10); chạy migrate trước khi mở backend
+UPSERT_SQL = '''
+    INSERT INTO quiz_sessions (user_id, question_ids, answers, cursor, updated_at, nonce)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        question_ids = excluded.question_ids, answers = excluded.answers,
+        cursor = excluded.cursor, updated_at = excluded.updated_at, nonce = excluded.nonce
+'''
+DELETE_SQL = 'DELETE FROM quiz_sessions WHERE user_id = ?'
+EXPIRE_SQL = 'DELETE FROM quiz_sessions WHERE updated_at < ?'
+LOAD_SQL = 'SELECT user_id, question_ids, answers, cursor, updated_at, nonce FROM quiz_sessions WHERE updated_at >= ?'
+
+
+class QuizSession:
+    """Trạng thái một lượt thi: chỉ ID câu hỏi, bitmask đáp án (1 byte/câu) và vị trí hiện tại.
+
+    nonce: số ngẫu nhiên mỗi đề, gắn vào callback_data để nhận ra nút của đề cũ.
+    """
+
+    __slots__ = ('user_id', 'question_ids', 'answers', 'cursor', 'updated_at', 'nonce')
+
+    def __init__(self, user_id, question_ids, answers=None, cursor=0, updated_at=None, nonce=None):
+        self.user_id = user_id
+        self.question_ids = array('I', question_ids)
+        self.answers = answers if answers is not None else bytearray(len(self.question_ids))
+        self.cursor = cursor
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.nonce = nonce if nonce is not None else new_nonce()
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def to_row(self):
+        return (self.user_id, self.question_ids.tobytes(), bytes(self.answers), self.cursor, self.updated_at,
+                self.nonce)
+
+    @classmethod
+    def from_row(cls, row):
+        user_id, ids_blob, answers_blob, cursor, updated_at, nonce = row
+        question_ids = array('I')
+        question_ids.frombytes(ids_blob)
+        return cls(user_id, question_ids, bytearray(answers_blob), cursor, updated_at, nonce)
+
+
+def shard_filter(shard):
+    """(index, count) -> điều kiện SQL + tham số để chỉ lấy user thuộc worker này."""
+    if not shard or shard[1] <= 1:
+        return '', ()
+    index, count = shard
+    return ' AND user_id % ? = ?', (count, index)
+
+
+class SqliteSessionBackend:
+    """Lưu session vào bảng quiz_sessions; nhiều worker (process) dùng chung một file DB ở chế độ WAL."""
+
+    def __init__(self, db_file):
+        self._conn = connect(db_file)
+
+    def load_rows(self, cutoff, shard=None):
+        where, params = shard_filter(shard)
+        with DB_SECONDS.time(op='session_load'):
+            return self._conn.execute(LOAD_SQL + where, (cutoff, *params)).fetchall()
+
+    def write(self, upserts, deletes, cutoff):
+        with DB_SECONDS.time(op='session_flush'), self._conn:
+            if upserts:
+                self._conn.executemany(UPSERT_SQL, upserts)
+            if deletes:
+                self._conn.executemany(DELETE_SQL, deletes)
+            self._conn.execute(EXPIRE_SQL, (cutoff,))
+
+    def close(self):
+        self._conn.close()
+
+
+class MemorySessionBackend:
+    """Backend trong RAM (test, chạy một process không cần giữ session khi restart)."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def load_rows(self, cutoff, shard=None):
+        return [row for row in self.rows.values()
+                if row[4] >= cutoff and (not shard or shard[1] <= 1 or row[0] % shard[1] == shard[0])]
+
+    def write(self, upserts, deletes, cutoff):
+        for row in upserts:
+            self.rows[row[0]] = row
+        for (user_id,) in deletes:
+            self.rows.pop(user_id, None)
+        self.rows = {uid: row for uid, row in self.rows.items() if row[4] >= cutoff}
+
+    def close(self):
+        pass
+
+
+class SessionStore:
+    """Session trong RAM, ghi xuống backend theo lô (write-behind), tự xóa session bỏ dở quá TTL.
+
+    backend: SqliteSessionBackend / MemorySessionBackend (hoặc đường dẫn file DB).
+    """
+
+    def __init__(self, backend, ttl=24 * 3600, flush_interval=2.0):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._sessions = {}
+        self._dirty = set()
+        self._deleted = set()
+        self._backend = SqliteSessionBackend(backend) if isinstance(backend, str) else backend
+        # Một thread ghi duy nhất cho backend này
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-store')
+        self._flusher = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def get(self, user_id):
+        return self._sessions.get(user_id)
+
+    def create(self, user_id, question_ids):
+        session = QuizSession(user_id, question_ids)
+        self._sessions[user_id] = session
+        self._deleted.discard(user_id)
+        self._dirty.add(user_id)
+        return session
+
+    def touch(self, session):
+        """Đánh dấu session đã đổi; sẽ được ghi ở lần flush kế tiếp."""
+        session.updated_at = time.time()
+        self._dirty.add(session.user_id)
+
+    def delete(self, user_id):
+        if self._sessions.pop(user_id, None) is not None:
+            self._dirty.discard(user_id)
+            self._deleted.add(user_id)
+
+    async def load(self, shard=None):
+        """shard=(index, count): chỉ nạp session của user có user_id % count == index."""
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self._executor, self._backend.load_rows, time.time() - self.ttl, shard)
+        for row in rows:
+            session = QuizSession.from_row(row)
+            self._sessions[session.user_id] = session
+        logger.info("Khôi phục %d quiz session", len(rows))
+
+    async def flush(self):
+        cutoff = time.time() - self.ttl
+        expired = [uid for uid, s in self._sessions.items() if s.updated_at < cutoff]
+        for uid in expired:
+            del self._sessions[uid]
+            self._dirty.discard(uid)
+        dirty, self._dirty = self._dirty, set()
+        deleted, self._deleted = self._deleted, set()
+        upserts = [self._sessions[uid].to_row() for uid in dirty]
+        deletes = [(uid,) for uid in deleted]
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._backend.write, upserts, deletes, cutoff)
+        except Exception:
+            # Ghi lỗi: trả lại cho lần flush sau, trừ user đã đổi trạng thái trong lúc chờ
+            # (session bị xóa thì không upsert lại, session tạo lại thì không xóa nữa)
+            self._dirty |= {uid for uid in dirty if uid in self._sessions}
+            self._deleted |= {uid for uid in deleted if uid not in self._sessions}
+            raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flush quiz session lỗi")
+
+    def start(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        self._executor.shutdown(wait=True)
+        self._backend.close()
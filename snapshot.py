@@ -0,0 +1,202 @@
+"""Snapshot nhị phân của catalog câu hỏi, mmap lúc khởi động thay vì đọc toàn bộ SQLite.
+
+Bố cục (little-endian, mọi offset tính từ đầu file):
+
+    header   magic, format, catalog_version, kích thước file, số câu, số tag, offset các phần
+    ids      u32 x số câu, tăng dần (bisect để tìm câu)
+    records  (blob_off u32, blob_len u32, num_options u8, correct_mask u8, 2 byte đệm) x số câu
+    tags     (name_off u32, name_len u32, ids_off u32, số id u32) x số tag, mỗi tag một mảng u32 ID
+    heap     blob từng câu: các field (u32 độ dài + UTF-8, NONE_LEN = NULL) theo thứ tự
+             question_text, image_url, correct_answers, explanation, option..., tag...
+
+ids và mảng ID của tag là memoryview trên mmap (không copy); một câu chỉ được decode khi có người
+hỏi tới. Các worker process mmap cùng file nên dùng chung page cache. Snapshot chỉ được dùng khi
+catalog_version khớp DB; export lại sau mỗi lần import: python snapshot.py
+"""
+import argparse
+import logging
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+
+from question_store import _catalog_rows, connect
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'quiz.snap'
+MAGIC = b'QZSN'
+# Tăng khi đổi bố cục hoặc cách tính một field: file cũ bị bỏ qua, bot đọc SQLite tới khi export lại
+FORMAT_VERSION = 3
+
+HEADER = struct.Struct('<4sHxxQQIIIII')  # magic, format, catalog_version, size, count, tag_count, ids, records, tags
+RECORD = struct.Struct('<IIBBxx')
+TAG = struct.Struct('<IIII')
+FIELD_LEN = struct.Struct('<I')
+NONE_LEN = 0xFFFFFFFF
+ROW_FIELDS = ('question_text', 'image_url', 'correct_answers', 'explanation')
+
+
+def _field(value):
+    if value is None:
+        return FIELD_LEN.pack(NONE_LEN)
+    data = value.encode('utf-8')
+    return FIELD_LEN.pack(len(data)) + data
+
+
+def build(version, rows, options, tags):
+    """Dữ liệu của _catalog_rows -> bytes của snapshot."""
+    rows = sorted(rows, key=lambda row: row['id'])
+    count = len(rows)
+    tag_ids = {}
+    for row in rows:
+        for tag in tags.get(row['id'], ()):
+            tag_ids.setdefault(tag, []).append(row['id'])
+    tag_names = sorted(tag_ids)
+
+    ids_off = HEADER.size
+    records_off = ids_off + 4 * count
+    tags_off = records_off + RECORD.size * count
+    # Sau bảng tag: mảng ID từng tag (căn 4 byte sẵn), rồi tới heap
+    arrays_off = tags_off + TAG.size * len(tag_names)
+    heap_off = arrays_off + 4 * sum(len(ids) for ids in tag_ids.values())
+
+    heap = bytearray()
+    records = bytearray()
+    for row in rows:
+        q_id = row['id']
+        num_options = row['num_options']
+        q_options = options.get(q_id, {})
+        blob = b''.join([_field(row[name]) for name in ROW_FIELDS] +
+                        [_field(q_options.get(i, '')) for i in range(num_options)] +
+                        [_field(tag) for tag in tags.get(q_id, ())])
+        records += RECORD.pack(heap_off + len(heap), len(blob), num_options, _correct_mask(row['correct_answers']))
+        heap += blob
+
+    tag_table = bytearray()
+    arrays = bytearray()
+    for name in tag_names:
+        encoded = name.encode('utf-8')
+        ids = tag_ids[name]
+        tag_table += TAG.pack(heap_off + len(heap), len(encoded), arrays_off + len(arrays), len(ids))
+        heap += encoded
+        arrays += struct.pack(f'<{len(ids)}I', *ids)
+
+    size = heap_off + len(heap)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, version, size, count, len(tag_names), ids_off, records_off, tags_off)
+    ids = struct.pack(f'<{count}I', *(row['id'] for row in rows))
+    return b''.join([header, ids, records, tag_table, arrays, heap])
+
+
+def _correct_mask(correct_str):
+    # Như catalog.letters_to_mask(get_correct(...)), không import catalog (kéo theo telegram):
+    # có dấu phẩy thì tách theo phẩy, không thì mỗi ký tự là một đáp án
+    stripped = (correct_str or '').upper().replace(' ', '')
+    letters = [opt.strip() for opt in stripped.split(',')] if ',' in stripped else stripped
+    mask = 0
+    for opt in letters:
+        if len(opt) == 1 and 'A' <= opt <= 'G':
+            mask |= 1 << (ord(opt) - ord('A'))
+    return mask
+
+
+def export(db_file, path=SNAPSHOT_FILE):
+    """Ghi snapshot từ DB; ghi ra file tạm rồi rename nên process đang mmap bản cũ không bị ảnh hưởng."""
+    conn = connect(db_file)
+    try:
+        version, rows, options, tags = _catalog_rows(conn)
+    finally:
+        conn.close()
+    data = build(version, rows, options, tags)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return version, len(rows), len(data)
+
+
+class Snapshot:
+    """Snapshot đã mmap (chỉ đọc). ids / tag_index là memoryview u32, row() decode một câu."""
+
+    def __init__(self, mm):
+        self._mm = mm
+        self._view = memoryview(mm)
+        magic, fmt, self.version, size, count, tag_count, ids_off, records_off, tags_off = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f'không phải snapshot format {FORMAT_VERSION}')
+        if size != len(mm):
+            raise ValueError(f'file dài {len(mm)} byte, header ghi {size}')
+        self.ids = self._view[ids_off:ids_off + 4 * count].cast('I')
+        self._records_off = records_off
+        self.tag_index = {}
+        for i in range(tag_count):
+            name_off, name_len, array_off, n = TAG.unpack_from(mm, tags_off + i * TAG.size)
+            name = str(self._view[name_off:name_off + name_len], 'utf-8')
+            self.tag_index[name] = self._view[array_off:array_off + 4 * n].cast('I')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _index(self, q_id):
+        i = bisect_left(self.ids, q_id)
+        return i if i < len(self.ids) and self.ids[i] == q_id else None
+
+    def correct_mask(self, q_id):
+        """Bitmask đáp án đúng đọc thẳng từ record, không decode câu; None nếu không có câu."""
+        i = self._index(q_id)
+        if i is None:
+            return None
+        return RECORD.unpack_from(self._mm, self._records_off + i * RECORD.size)[3]
+
+    def row(self, q_id):
+        """(row dict như sqlite3.Row, {vị trí: option}, tags, correct_mask) hoặc None nếu không có câu."""
+        i = self._index(q_id)
+        if i is None:
+            return None
+        blob_off, blob_len, num_options, correct_mask = RECORD.unpack_from(self._mm,
+                                                                           self._records_off + i * RECORD.size)
+        fields = []
+        pos, end = blob_off, blob_off + blob_len
+        while pos < end:
+            (n,) = FIELD_LEN.unpack_from(self._mm, pos)
+            pos += 4
+            if n == NONE_LEN:
+                fields.append(None)
+            else:
+                fields.append(str(self._view[pos:pos + n], 'utf-8'))
+                pos += n
+        row = dict(zip(ROW_FIELDS, fields))
+        row['id'] = q_id
+        row['num_options'] = num_options
+        options = dict(enumerate(fields[len(ROW_FIELDS):len(ROW_FIELDS) + num_options]))
+        return row, options, tuple(fields[len(ROW_FIELDS) + num_options:]), correct_mask
+
+
+def open_snapshot(path=SNAPSHOT_FILE):
+    """Snapshot hoặc None nếu chưa export / file hỏng / khác format."""
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # ValueError: file rỗng
+        return None
+    try:
+        return Snapshot(mm)
+    except (ValueError, struct.error) as exc:
+        logger.warning("Bỏ qua snapshot %s: %s", path, exc)
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export catalog câu hỏi ra snapshot nhị phân cho bot mmap lúc khởi động')
+    parser.add_argument('--db', default='quiz.db')
+    parser.add_argument('--out', default=SNAPSHOT_FILE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version, count, size = export(args.db, args.out)
+    print(f"Snapshot '{args.out}': {count} câu, catalog v{version}, {size / 1024:.1f} KB "
+          f"trong {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,166 @@
+"""Lịch sử trả lời (bảng attempts, chỉ append) và lịch ôn tập kiểu SM-2 cho /study.
+
+Mỗi lần chấm đề (end_quiz, live exam) ghi các câu đã trả lời vào hàng đợi; một thread ghi theo lô: executemany
+attempts + cập nhật review_state trong cùng transaction. Chọn câu đến hạn chỉ đọc
+review_state qua index (user_id, due_at), không đụng tới attempts dù bảng có hàng triệu dòng.
+Cùng lô đó cũng được cộng vào thống kê từng câu (question_stats.py). Bảng do migrations.py tạo.
+"""
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import DB_SECONDS
+from question_store import connect
+from question_stats import Difficulty, load_counts, write_stats
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+# Đáp án chỉ đúng/sai: quy về thang 0-5 của SM-2
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 1
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+
+INSERT_ATTEMPT_SQL = '''
+    INSERT INTO attempts (user_id, question_id, answer_mask, correct, answered_at) VALUES (?, ?, ?, ?, ?)
+'''
+# + danh sách question_id: một lần đọc theo khóa chính cho mọi câu của một user trong lô
+GET_STATES_SQL = 'SELECT question_id, repetitions, interval_days, ease FROM review_state WHERE user_id = ? AND question_id IN '
+UPSERT_STATE_SQL = '''
+    INSERT INTO review_state (user_id, question_id, repetitions, interval_days, ease, due_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, question_id) DO UPDATE SET
+        repetitions = excluded.repetitions, interval_days = excluded.interval_days,
+        ease = excluded.ease, due_at = excluded.due_at
+'''
+# Cả ba đi theo index (user_id, due_at) / khóa chính (user_id, question_id)
+DUE_SQL = 'SELECT question_id FROM review_state WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?'
+NEXT_DUE_SQL = 'SELECT min(due_at) FROM review_state WHERE user_id = ?'
+SEEN_SQL = 'SELECT question_id FROM review_state WHERE user_id = ?'
+
+
+def sm2(state, quality, now):
+    """state: (repetitions, interval_days, ease) hoặc None (câu mới) -> state mới + due_at."""
+    repetitions, interval, ease = state or (0, 0.0, DEFAULT_EASE)
+    if quality < 3:
+        repetitions, interval = 0, 1.0
+    else:
+        repetitions += 1
+        interval = 1.0 if repetitions == 1 else 6.0 if repetitions == 2 else interval * ease
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return repetitions, interval, ease, now + interval * DAY
+
+
+class SqliteStudyBackend:
+    def __init__(self, db_file):
+        self._conn = connect(db_file)
+
+    def write(self, attempts):
+        """attempts: [(user_id, question_id, answer_mask, correct, answered_at)] theo thứ tự trả lời."""
+        with DB_SECONDS.time(op='attempts_write'), self._conn:
+            self._conn.executemany(INSERT_ATTEMPT_SQL, attempts)
+            by_user = {}
+            for user_id, q_id, *_ in attempts:
+                by_user.setdefault(user_id, set()).add(q_id)
+            states = {}
+            for user_id, q_ids in by_user.items():
+                placeholders = f"({','.join('?' * len(q_ids))})"
+                for q_id, *state in self._conn.execute(GET_STATES_SQL + placeholders, (user_id, *q_ids)):
+                    states[(user_id, q_id)] = tuple(state)
+            # Theo thứ tự trả lời: câu gặp lại trong cùng lô dùng state vừa tính
+            for user_id, q_id, _, correct, answered_at in attempts:
+                key = (user_id, q_id)
+                state = states.get(key)
+                states[key] = sm2(state and state[:3], QUALITY_CORRECT if correct else QUALITY_WRONG, answered_at)
+            self._conn.executemany(UPSERT_STATE_SQL, [(*key, *state) for key, state in states.items()])
+            write_stats(self._conn, attempts)
+
+    def plan(self, user_id, now, limit):
+        """(id đến hạn sớm nhất trước, mọi id đã từng làm, due_at gần nhất)"""
+        with DB_SECONDS.time(op='study_plan'):
+            due = [row[0] for row in self._conn.execute(DUE_SQL, (user_id, now, limit))]
+            seen = {row[0] for row in self._conn.execute(SEEN_SQL, (user_id,))}
+            next_due = self._conn.execute(NEXT_DUE_SQL, (user_id,)).fetchone()[0]
+        return due, seen, next_due
+
+    def load_counts(self):
+        return load_counts(self._conn)
+
+    def close(self):
+        self._conn.close()
+
+
+def pick_new(ids, seen, k, rng=random):
+    """k câu chưa làm bao giờ, ngẫu nhiên từ index ID của catalog."""
+    fresh = [q_id for q_id in ids if q_id not in seen]
+    return rng.sample(fresh, min(k, len(fresh)))
+
+
+class StudyLog:
+    """Ghi attempts theo lô (write-behind như SessionStore) và lập danh sách ôn tập."""
+
+    def __init__(self, backend, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        self._backend = SqliteStudyBackend(backend) if isinstance(backend, str) else backend
+        self._pending = []
+        self.recorded = 0
+        # Độ khó từng câu cho đề /create_exam ... khó; nạp trong load()
+        self.difficulty = Difficulty()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='study-log')
+        self._flusher = None
+
+    def record_exam(self, user_id, question_ids, answers, correct):
+        """Một lượt chấm: answers là bitmask từng câu, correct là điểm STRICT (0/1) từng câu.
+
+        Câu bỏ trống (mask 0) không ghi: không phải lần trả lời sai, không tính vào SM-2 hay độ khó.
+        """
+        now = time.time()
+        answered = [(q_id, mask, ok) for q_id, mask, ok in zip(question_ids, answers, correct) if mask]
+        self._pending.extend((user_id, q_id, mask, int(ok), now) for q_id, mask, ok in answered)
+        for q_id, _, ok in answered:
+            self.difficulty.add(q_id, ok)
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        self.difficulty = Difficulty(await loop.run_in_executor(self._executor, self._backend.load_counts))
+
+    async def plan(self, user_id, limit):
+        """Trước khi lập kế hoạch ghi nốt attempts đang chờ để review_state là mới nhất."""
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._backend.plan, user_id, time.time(), limit)
+
+    async def flush(self):
+        attempts, self._pending = self._pending, []
+        if attempts:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self._backend.write, attempts)
+            except Exception:
+                # Lô ghi trong một transaction nên lỗi là chưa ghi gì: trả lại, đứng trước attempts mới
+                # để SM-2 vẫn tính theo thứ tự trả lời
+                self._pending[:0] = attempts
+                raise
+            self.recorded += len(attempts)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ghi attempts lỗi")
+
+    def start(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        self._executor.shutdown(wait=True)
+        self._backend.close()
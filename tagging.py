@@ -0,0 +1,42 @@
+"""Gắn chủ đề (tag) cho câu hỏi theo từ khóa trong đề bài, dùng lúc import / thêm câu / migrate.
+
+Chỉ xét đề bài: option hay nhắc dịch vụ khác làm đáp án nhiễu. Không khớp từ khóa nào thì
+câu không có tag (vẫn được bốc ở phần "còn lại" của blueprint).
+"""
+import re
+
+# tag -> từ khóa (regex, không phân biệt hoa thường)
+TAG_KEYWORDS = {
+    'lambda': r'\blambda\b',
+    'dynamodb': r'\bdynamo ?db\b',
+    's3': r'\bs3\b|simple storage service',
+    'elasticache': r'elasticache|memcached|\bredis\b',
+    'api-gateway': r'api gateway',
+    'cloudformation': r'cloudformation|\bsam\b|serverless application model',
+    'elastic-beanstalk': r'beanstalk',
+    'ecs': r'\becs\b|\becr\b|fargate|elastic container',
+    'ec2': r'\bec2\b|auto ?scaling|load balancer|\balb\b|\belb\b',
+    'sqs': r'\bsqs\b|simple queue service',
+    'sns': r'\bsns\b|simple notification service',
+    'kinesis': r'kinesis',
+    'cognito': r'cognito',
+    'iam': r'\biam\b|\bsts\b|assume ?role|cross-account',
+    'kms': r'\bkms\b|encrypt',
+    'cloudwatch': r'cloudwatch',
+    'x-ray': r'x-ray',
+    'ci-cd': r'codedeploy|codepipeline|codebuild|codecommit|codestar',
+    'step-functions': r'step functions',
+    'rds': r'\brds\b|aurora',
+    'cloudfront': r'cloudfront',
+}
+_PATTERNS = [(tag, re.compile(pattern, re.IGNORECASE)) for tag, pattern in TAG_KEYWORDS.items()]
+TAG_NAME_RE = re.compile(r'[^\w-]+')
+
+
+def normalize_tag(name):
+    """'API Gateway' -> 'api-gateway'; tên rỗng -> ''."""
+    return TAG_NAME_RE.sub('-', name.strip().lower()).strip('-')
+
+
+def auto_tags(question_text):
+    return [tag for tag, pattern in _PATTERNS if pattern.search(question_text)]
@@ -0,0 +1,99 @@
+"""ImageCache với LocalImageBackend: upload một lần, dùng lại file_id, upload lại khi file_id hết hạn."""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+from telegram.error import TimedOut
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from image_cache import SAVE_SQL, ImageCache, LocalImageBackend
+from migrations import migrate
+
+
+class ImageCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'quiz.db')
+        migrate(self.db_file)
+        self.path = os.path.join(self.tmp.name, 'question1.jpg')
+        with open(self.path, 'wb') as f:
+            f.write(b'\xff\xd8 fake jpeg')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def open_cache(self):
+        cache = ImageCache(self.db_file, LocalImageBackend())
+        await cache.load()
+        self.addCleanup(cache.close)
+        return cache
+
+    async def test_upload_once_then_reuse_file_id(self):
+        cache = await self.open_cache()
+        first = await cache.send(1, self.path)
+        second = await cache.send(2, self.path)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.backend.uploads, 1)
+        self.assertEqual((cache.uploads, cache.reuses), (1, 1))
+        self.assertEqual([file_id for _, file_id, _ in cache.backend.sent], [first, first])
+
+    async def test_concurrent_sends_upload_once(self):
+        cache = await self.open_cache()
+        file_ids = await asyncio.gather(*(cache.send(chat_id, self.path) for chat_id in range(20)))
+        self.assertEqual(len(set(file_ids)), 1)
+        self.assertEqual(cache.backend.uploads, 1)
+
+    async def test_file_id_survives_restart(self):
+        cache = await self.open_cache()
+        file_id = await cache.send(1, self.path)
+        restarted = await self.open_cache()
+        self.assertEqual(await restarted.send(1, self.path), file_id)
+        self.assertEqual(restarted.backend.uploads, 0)
+
+    async def test_stale_file_id_is_uploaded_again(self):
+        # file_id lưu từ trước (vd. bot cũ) mà Telegram không còn nhận
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            conn.execute(SAVE_SQL, (self.path, 'stale-file-id', 0))
+        conn.close()
+        cache = await self.open_cache()
+        cache.backend.expired.add('stale-file-id')
+        with self.assertLogs('image_cache', 'WARNING'):
+            file_id = await cache.send(1, self.path)
+        self.assertNotEqual(file_id, 'stale-file-id')
+        self.assertEqual(cache.backend.uploads, 1)
+        # file_id mới được lưu lại, lần sau (kể cả sau restart) không upload nữa
+        await cache.send(2, self.path)
+        restarted = await self.open_cache()
+        self.assertEqual(await restarted.send(3, self.path), file_id)
+        self.assertEqual((cache.backend.uploads, restarted.backend.uploads), (1, 0))
+
+    async def test_network_error_keeps_file_id(self):
+        cache = await self.open_cache()
+        file_id = await cache.send(1, self.path)
+
+        async def timed_out(chat_id, photo, caption=None):
+            raise TimedOut()
+        send_photo, cache.backend.send_photo = cache.backend.send_photo, timed_out
+        with self.assertRaises(TimedOut):
+            await cache.send(2, self.path)
+        cache.backend.send_photo = send_photo
+        # Lỗi mạng không phải file_id hết hạn: không quên, không upload lại
+        self.assertEqual(await cache.send(3, self.path), file_id)
+        self.assertEqual(cache.backend.uploads, 1)
+
+    async def test_missing_file_is_skipped(self):
+        cache = await self.open_cache()
+        missing = os.path.join(self.tmp.name, 'question2.jpg')
+        with self.assertLogs('image_cache', 'WARNING'):
+            self.assertIsNone(await cache.send(1, missing))
+        self.assertEqual((cache.backend.uploads, cache.backend.sent), (0, []))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
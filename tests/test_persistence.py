@@ -0,0 +1,93 @@
+"""BotPersistence với MemoryStateBackend: user_data và trạng thái hội thoại sống qua restart."""
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from persistence import BotPersistence, MemoryStateBackend
+
+
+class SlowBackend(MemoryStateBackend):
+    """Lần ghi đầu chờ tới khi test cho chạy tiếp; fail=True thì lần ghi đầu lỗi."""
+
+    def __init__(self, fail=False):
+        super().__init__()
+        self.release = threading.Event()
+        self.fail = fail
+        self.writes = 0
+
+    def write(self, changes):
+        self.writes += 1
+        if self.writes == 1:
+            self.release.wait(5)
+            if self.fail:
+                raise OSError('disk full')
+        super().write(changes)
+
+
+class BotPersistenceTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = MemoryStateBackend()
+
+    async def test_state_survives_restart(self):
+        persistence = BotPersistence(self.backend)
+        await persistence.update_user_data(7, {'question_text': 'Câu mới?', 'num_options': 4})
+        await persistence.update_conversation('add_question', (7, 7), 3)
+        await persistence.flush()
+
+        restarted = BotPersistence(self.backend)
+        self.assertEqual(await restarted.get_user_data(), {7: {'question_text': 'Câu mới?', 'num_options': 4}})
+        self.assertEqual(await restarted.get_conversations('add_question'), {(7, 7): 3})
+        await restarted.flush()
+
+    async def test_drop_and_end_remove_rows(self):
+        persistence = BotPersistence(self.backend)
+        await persistence.update_user_data(7, {'a': 1})
+        await persistence.update_conversation('add_question', (7, 7), 3)
+        await asyncio.sleep(0)
+        await persistence.drop_user_data(7)
+        await persistence.update_conversation('add_question', (7, 7), None)
+        await persistence.flush()
+        self.assertEqual(self.backend.rows, {})
+
+    async def test_load_only_own_shard(self):
+        persistence = BotPersistence(self.backend)
+        for user_id in range(4):
+            await persistence.update_user_data(user_id, {'n': user_id})
+        await persistence.flush()
+        shard = BotPersistence(self.backend, shard=(0, 2))
+        self.assertEqual(sorted(await shard.get_user_data()), [0, 2])
+        await shard.flush()
+
+    async def test_change_during_write_is_written_without_new_update(self):
+        backend = SlowBackend()
+        persistence = BotPersistence(backend)
+        await persistence.update_user_data(1, {'n': 1})
+        await asyncio.sleep(0.05)
+        # Lô đầu đang ghi: thay đổi này phải tự được ghi khi lô đầu xong
+        await persistence.update_user_data(2, {'n': 2})
+        backend.release.set()
+        await asyncio.wait_for(persistence._writer, 5)
+        self.assertEqual(persistence._pending, {})
+        self.assertEqual(set(backend.rows), {('user_data', '1'), ('user_data', '2')})
+        await persistence.flush()
+
+    async def test_failed_write_is_retried(self):
+        backend = SlowBackend(fail=True)
+        persistence = BotPersistence(backend)
+        await persistence.update_user_data(1, {'n': 1})
+        await persistence.update_user_data(2, {'n': 2})
+        await asyncio.sleep(0.05)
+        await persistence.update_user_data(2, {'n': 3})
+        backend.release.set()
+        with self.assertLogs('persistence', 'ERROR'):
+            await asyncio.wait_for(persistence._writer, 5)
+        await persistence.flush()
+        self.assertEqual(backend.rows, {('user_data', '1'): (1, '{"n": 1}'), ('user_data', '2'): (2, '{"n": 3}')})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""QuestionStore.add_question: câu trùng nội dung không thêm lần hai, không làm hỏng catalog."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate
+from question_store import QuestionStore
+
+
+class AddQuestionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'quiz.db')
+        migrate(self.db_file)
+        self.store = QuestionStore(self.db_file, pool_size=1)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def test_duplicate_returns_none(self):
+        q_id = await self.store.add_question('Thủ đô Việt Nam?', None, ['Hà Nội', 'Huế'], 'A')
+        self.assertIsNotNone(q_id)
+        version = await self.store.catalog_version()
+        # Khác khoảng trắng vẫn là cùng câu
+        self.assertIsNone(await self.store.add_question('Thủ đô  Việt Nam?', None, ['Hà Nội', ' Huế'], 'B'))
+        _, rows, options, _ = await self.store.catalog_rows()
+        self.assertEqual([row['id'] for row in rows], [q_id])
+        self.assertEqual(rows[0]['correct_answers'], 'A')
+        self.assertEqual(options[q_id], {0: 'Hà Nội', 1: 'Huế'})
+        self.assertEqual(await self.store.catalog_version(), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""SessionStore với MemorySessionBackend: ghi theo lô, khôi phục sau restart, xóa, hết hạn TTL, chia shard."""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from session_store import MemorySessionBackend, SessionStore
+
+
+class FailingBackend(MemorySessionBackend):
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+
+    def write(self, upserts, deletes, cutoff):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('database is locked')
+        super().write(upserts, deletes, cutoff)
+
+
+class SessionStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = MemorySessionBackend()
+
+    async def open_store(self, shard=None, ttl=3600):
+        store = SessionStore(self.backend, ttl=ttl)
+        await store.load(shard)
+        return store
+
+    async def test_flush_then_restore(self):
+        store = await self.open_store()
+        session = store.create(1, [5, 7, 9])
+        session.answers[0] = 0b10
+        session.cursor = 1
+        store.touch(session)
+        await store.stop()
+
+        restored = (await self.open_store()).get(1)
+        self.assertEqual(list(restored.question_ids), [5, 7, 9])
+        self.assertEqual(bytes(restored.answers), b'\x02\x00\x00')
+        self.assertEqual((restored.cursor, restored.nonce), (1, session.nonce))
+
+    async def test_deleted_session_does_not_come_back(self):
+        store = await self.open_store()
+        store.create(1, [5])
+        await store.flush()
+        store.delete(1)
+        await store.stop()
+        self.assertNotIn(1, await self.open_store())
+
+    async def test_expired_session_is_dropped(self):
+        store = await self.open_store(ttl=60)
+        store.create(1, [5]).updated_at = time.time() - 120
+        store.create(2, [6])
+        await store.stop()
+        self.assertEqual(list(self.backend.rows), [2])
+
+    async def test_load_only_own_shard(self):
+        store = await self.open_store()
+        for user_id in range(6):
+            store.create(user_id, [user_id])
+        await store.stop()
+        shard = await self.open_store(shard=(1, 3))
+        self.assertEqual(sorted(shard._sessions), [1, 4])
+
+    async def test_failed_flush_is_retried(self):
+        self.backend = FailingBackend()
+        store = await self.open_store()
+        store.create(1, [5])
+        store.create(2, [6])
+        await store.flush()
+        store.delete(1)
+        store.touch(store.get(2))
+        store.get(2).cursor = 1
+        self.backend.failures = 1
+        with self.assertRaises(OSError):
+            await store.flush()
+        await store.stop()
+        self.assertNotIn(1, self.backend.rows)
+        self.assertEqual(self.backend.rows[2][3], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
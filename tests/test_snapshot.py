@@ -0,0 +1,51 @@
+"""Snapshot: correct_mask đọc thẳng từ record khớp với mask QuestionRecord tính từ correct_answers."""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from catalog import Catalog
+from migrations import migrate
+from question_store import QuestionStore
+from snapshot import export
+
+ANSWERS = {1: 'B', 2: 'A, C', 3: 'AD', 4: ''}
+
+
+class SnapshotTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'quiz.db')
+        self.snapshot_file = os.path.join(self.tmp.name, 'quiz.snap')
+        migrate(self.db_file)
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            conn.executemany("INSERT INTO questions (id, question_text, num_options, correct_answers) "
+                             "VALUES (?, ?, 4, ?)", [(q_id, f'Câu {q_id}', key) for q_id, key in ANSWERS.items()])
+        conn.close()
+        export(self.db_file, self.snapshot_file)
+        self.store = QuestionStore(self.db_file, pool_size=1)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def test_scoring_masks_without_decoding(self):
+        catalog = Catalog(self.store, snapshot_file=self.snapshot_file)
+        await catalog.load()
+        masks = [catalog.correct_mask(q_id) for q_id in ANSWERS]
+        self.assertEqual(masks, [0b10, 0b101, 0b1001, 0])
+        self.assertEqual(catalog._records, {})
+        self.assertIsNone(catalog.correct_mask(99))
+
+        sqlite_catalog = Catalog(self.store)
+        await sqlite_catalog.load()
+        self.assertEqual([sqlite_catalog.correct_mask(q_id) for q_id in ANSWERS], masks)
+        self.assertEqual([catalog.get(q_id).correct_mask for q_id in ANSWERS], masks)
+
+
+if __name__ == '__main__':
+    unittest.main()
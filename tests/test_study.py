@@ -0,0 +1,61 @@
+"""StudyLog: attempts ghi theo lô, lô ghi lỗi được giữ lại cho lần flush sau."""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate
+from study import SqliteStudyBackend, StudyLog
+
+
+class FlakyBackend(SqliteStudyBackend):
+    def __init__(self, db_file):
+        super().__init__(db_file)
+        self.failures = 0
+
+    def write(self, attempts):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        super().write(attempts)
+
+
+class StudyLogTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'quiz.db')
+        migrate(self.db_file)
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            conn.executemany("INSERT INTO questions (id, question_text, num_options, correct_answers) "
+                             "VALUES (?, ?, 2, 'A')", [(q_id, f'Câu {q_id}') for q_id in (10, 11, 12)])
+        conn.close()
+        self.backend = FlakyBackend(self.db_file)
+        self.log = StudyLog(self.backend)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def attempts(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return conn.execute('SELECT user_id, question_id, correct FROM attempts ORDER BY id').fetchall()
+        finally:
+            conn.close()
+
+    async def test_failed_flush_keeps_attempts_in_order(self):
+        self.log.record_exam(1, [10, 11, 12], [0b1, 0, 0b10], [1, 0, 0])
+        self.backend.failures = 1
+        with self.assertRaises(sqlite3.OperationalError):
+            await self.log.flush()
+        self.log.record_exam(1, [10], [0b10], [0])
+        await self.log.stop()
+        self.assertEqual(self.attempts(), [(1, 10, 1), (1, 12, 0), (1, 10, 0)])
+        self.assertEqual(self.log.recorded, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
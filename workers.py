@@ -0,0 +1,180 @@
+"""Chạy bot với nhiều worker process; mỗi user luôn vào cùng một worker (user_id % số worker).
+Riêng live exam trong group đi theo chat_id để cả nhóm vào worker đang giữ trạng thái đề.
+
+Process chính (router) nhận update bằng webhook ingress hoặc long polling và chuyển
+nguyên dict qua multiprocessing.Queue của worker. Mỗi worker là một Application đầy đủ,
+chỉ nạp session/trạng thái hội thoại của user thuộc shard mình; mọi worker dùng chung
+file SQLite (WAL) cho câu hỏi, session và trạng thái hội thoại.
+
+Chạy: WORKERS=4 python bot.py
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import signal
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ExtBot
+
+from callback_data import LIVE_PREFIX
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 256
+
+
+def update_user_id(data):
+    """Lấy user ID từ update dict (message, callback_query...); không có user thì lấy chat ID."""
+    for value in data.values():
+        if isinstance(value, dict):
+            user = value.get('from') or value.get('user')
+            if user:
+                return user['id']
+            chat = value.get('chat')
+            if chat:
+                return chat['id']
+    return None
+
+
+def live_chat_id(data):
+    """Chat ID nếu update thuộc live exam trong group (/live..., bấm nút có LIVE_PREFIX)."""
+    query = data.get('callback_query')
+    if query:
+        message = query.get('message') or {}
+        chat_id = message.get('chat', {}).get('id')
+        return chat_id if (query.get('data') or '').startswith(LIVE_PREFIX) and chat_id and chat_id < 0 else None
+    message = data.get('message') or {}
+    chat_id = message.get('chat', {}).get('id')
+    return chat_id if (message.get('text') or '').startswith('/live') and chat_id and chat_id < 0 else None
+
+
+def shard_of(data, count):
+    key = live_chat_id(data)
+    if key is None:
+        key = update_user_id(data)
+    return (key if key is not None else data['update_id']) % count
+
+
+def _get_batch(queue):
+    batch = [queue.get()]
+    try:
+        while len(batch) < BATCH_SIZE:
+            batch.append(queue.get_nowait())
+    except queue_module.Empty:
+        pass
+    return batch
+
+
+async def _run_worker(index, count, queue, base_url):
+    import config
+    config.SHARD = (index, count)
+    import bot
+    from outbound import OutboundScheduler
+
+    # Giới hạn toàn bot chia đều cho các worker; giới hạn theo chat giữ nguyên vì user đã cố định worker
+    rate = config.OUTBOUND_GLOBAL_RATE / count
+    scheduler = OutboundScheduler(global_rate=rate, global_burst=max(1, int(rate)))
+    application = bot.build_application(base_url=base_url, rate_limiter=scheduler)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    logger.info("Worker %d/%d sẵn sàng", index, count)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            batch = await loop.run_in_executor(None, _get_batch, queue)
+            for data in batch:
+                if data is None:
+                    return
+                await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+
+
+def worker_main(index, count, queue, base_url=None):
+    # Ctrl+C gửi tới cả nhóm process: worker chờ router gửi tín hiệu dừng qua queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, count, queue, base_url))
+
+
+class ShardRouter:
+    def __init__(self, count, base_url=None):
+        context = multiprocessing.get_context('spawn')
+        self.count = count
+        self.queues = [context.Queue() for _ in range(count)]
+        self.processes = [
+            context.Process(target=worker_main, args=(i, count, q, base_url), name=f'quiz-worker-{i}')
+            for i, q in enumerate(self.queues)
+        ]
+        self.routed = [0] * count
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        return self
+
+    async def route(self, data):
+        index = shard_of(data, self.count)
+        self.queues[index].put(data)
+        self.routed[index] += 1
+
+    def stop(self, timeout=30):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("%s không dừng kịp, terminate", process.name)
+                process.terminate()
+        logger.info("Số update đã chia cho từng worker: %s", self.routed)
+
+
+async def _poll(bot, router, allowed_updates):
+    offset = 0
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, read_timeout=40,
+                                            allowed_updates=allowed_updates)
+        except TelegramError:
+            logger.exception("getUpdates lỗi, thử lại sau 1s")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await router.route(update.to_dict())
+            offset = update.update_id + 1
+
+
+async def _run_router(count, base_url):
+    import config
+    from ingress import WebhookIngress, stop_event
+
+    stop = stop_event()
+    router = ShardRouter(count, base_url).start()
+    kwargs = {'base_url': base_url} if base_url else {}
+    try:
+        async with ExtBot(os.environ['TOKEN'], **kwargs) as bot:
+            if config.BOT_MODE == 'webhook':
+                ingress = await WebhookIngress(router.route, config.WEBHOOK_PATH, config.WEBHOOK_SECRET,
+                                               config.WEBHOOK_LISTEN, config.WEBHOOK_PORT).start()
+                await bot.set_webhook(url=config.WEBHOOK_URL.rstrip('/') + config.WEBHOOK_PATH,
+                                      allowed_updates=config.ALLOWED_UPDATES, secret_token=config.WEBHOOK_SECRET,
+                                      max_connections=config.WEBHOOK_MAX_CONNECTIONS)
+                await stop.wait()
+                await ingress.stop()
+            else:
+                await bot.delete_webhook()
+                poller = asyncio.create_task(_poll(bot, router, config.ALLOWED_UPDATES))
+                await stop.wait()
+                poller.cancel()
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, router.stop)
+
+
+def run_sharded(count, base_url=None):
+    """Chạy router + `count` worker tới khi nhận SIGINT/SIGTERM."""
+    asyncio.run(_run_router(count, base_url))